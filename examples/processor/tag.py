@@ -31,6 +31,21 @@ class Tag(snap.Processor):
     'xyz-abc-qwerty'.
     """
 
+    def get_transform(self, config):
+        """Returns the transform applied to the metrics.
+
+        Adding a tag is a bulk transform of the metrics so it is declared
+        here, the framework then applies it to the metrics of a request in
+        place and :py:meth:`process` isn't called.
+
+        Args:
+            config (:obj:`snap_plugin.v1.ConfigMap`): config of the request
+
+        Returns:
+            :obj:`snap_plugin.v1.Transform`
+        """
+        return snap.Transform(add_tags={"instance-id": config["instance-id"]})
+
     def process(self, metrics, config):
         """Processes metrics.
 
@@ -39,7 +54,10 @@ class Tag(snap.Processor):
         include applying filtering, max, min, average functions as well as
         adding additional context to the metrics to name just a few.
 
-        In this example we are adding a tag called 'context' to every metric.
+        In this example we are adding a tag called 'instance-id' to every
+        metric.  The transform returned by :py:meth:`get_transform` does the
+        same without wrapping the metrics, this method is only called when no
+        transform is returned.
 
         Args:
             metrics (obj:`list` of `snap_plugin.v1.Metric`):
@@ -17,23 +17,43 @@
 # limitations under the License.
 
 import logging
-
-from google.protobuf import json_format
+import os
+import threading
 
 import snap_plugin.v1 as snap
 
 LOG = logging.getLogger(__name__)
 
 
+def _replace(src, dst):
+    """Renames src to dst, replacing dst if it exists"""
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+        return
+    # python 2's os.rename fails on Windows when dst exists
+    if os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+
 class File(snap.Publisher):
     """Example snap file publisher plugin.
 
-    The plugin requires a config option 'file' providing the path of the file
-    that metrics will be written to.  The `Metric` will be published to
-    the file in JSON.
+    The config option 'file' provides the path of the file that metrics will
+    be written to.  The `Metric` will be published to
+    the file in JSON, one metric per line, or in the binary format of
+    :py:class:`snap_plugin.v1.MetricEncoder` when the config option 'format'
+    is 'binary'.  When the config option 'max_bytes' is set the file is
+    rotated once it reaches that size, keeping 'backups' older files.
 
     """
 
+    def __init__(self, name, version, **kwargs):
+        super(File, self).__init__(name, version, **kwargs)
+        # open files and their encoders by path, kept across publish calls
+        self._files = {}
+        self._lock = threading.Lock()
+
     def publish(self, metrics, config):
         """Publishes metrics to a file in JSON format.
 
@@ -42,6 +62,8 @@ class File(snap.Publisher):
 
         In this example we are writing the metrics to a file in json format.
         We obtain the path to the file through the config (`ConfigMap`) arg.
+        The file stays open between calls and the metrics of a call are
+        written at once.
 
         Args:
             metrics (obj:`list` of :obj:`snap_plugin.v1.Metric`):
@@ -52,11 +74,44 @@ class File(snap.Publisher):
                 List of collected metrics.
         """
         if len(metrics) > 0:
-            with open(config["file"], 'a') as outfile:
-                for metric in metrics:
-                    outfile.write(
-                        json_format.MessageToJson(
-                            metric._pb, including_default_value_fields=True))
+            # the defaults of the config policy, used when snapd didn't apply
+            # them
+            path = config.get("file", "/tmp/snap-py.out")
+            with self._lock:
+                outfile, encoder = self._open(path, config.get("format", "json"))
+                outfile.writelines(encoder.encode_batch(metrics))
+                outfile.flush()
+                if 0 < config.get("max_bytes", 0) <= outfile.tell():
+                    self._rotate(path, config.get("backups", 3))
+
+    def _open(self, path, format):
+        """Returns the open file and the encoder of a path"""
+        if path not in self._files or self._files[path][1].format != format:
+            self._close(path)
+            self._files[path] = (open(path, "ab", 1 << 16), snap.MetricEncoder(format))
+        return self._files[path]
+
+    def _rotate(self, path, backups):
+        """Renames the file to path.1 shifting older files, path.`backups`
+        being removed"""
+        self._close(path)
+        for i in range(backups - 1, 0, -1):
+            if os.path.exists("{}.{}".format(path, i)):
+                _replace("{}.{}".format(path, i), "{}.{}".format(path, i + 1))
+        if backups > 0:
+            _replace(path, "{}.1".format(path))
+        else:
+            os.remove(path)
+
+    def _close(self, path):
+        if path in self._files:
+            self._files.pop(path)[0].close()
+
+    def stop_plugin(self):
+        super(File, self).stop_plugin()
+        with self._lock:
+            for path in list(self._files):
+                self._close(path)
 
     def get_config_policy(self):
         """As the name suggests this method returns the config policy for the
@@ -70,7 +125,8 @@ class File(snap.Publisher):
         In this example we returning a config policy that contains a `string`
         config item describing the location of the file that will be published
         to.  The 'file' config item has a default which the user may choose to
-        override.
+        override.  The other items choose the format of the file and when it
+        is rotated.
 
         Returns:
             `snap_plugin.v1.GetConfigPolicyReply`
@@ -84,7 +140,19 @@ class File(snap.Publisher):
                     (
                         "file",
                         snap.StringRule(default="/tmp/snap-py.out")
-                    )
+                    ),
+                    (
+                        "format",
+                        snap.StringRule(default="json")
+                    ),
+                    (
+                        "max_bytes",
+                        snap.IntegerRule(default=0, minimum=0)
+                    ),
+                    (
+                        "backups",
+                        snap.IntegerRule(default=3, minimum=0)
+                    ),
                 ]
             ],
         )
@@ -32,38 +32,35 @@ class RandomStream(snap.StreamCollector):
     """
 
     def stream(self, metrics):
-        LOG.debug("Metrics collection")
-        metrics_to_stream = []
-        metric = snap.Metric(
-            namespace=[
-                snap.NamespaceElement(value="intel"),
-                snap.NamespaceElement(value="streaming"),
-                snap.NamespaceElement(value="random"),
-                snap.NamespaceElement(value="int")
-            ],
-            version=1,
-            tags={"mtype": "counter"},
-            description="Random int",
-            data=random.randint(1, 100),
-            timestamp=time.time()
-        )
-        metrics_to_stream.append(metric)
-        metric = snap.Metric(
-            namespace=[
-                snap.NamespaceElement(value="intel"),
-                snap.NamespaceElement(value="streaming"),
-                snap.NamespaceElement(value="random"),
-                snap.NamespaceElement(value="float")
-            ],
-            version=1,
-            tags={"mtype": "counter"},
-            description="Random float",
-            data=random.random(),
-            timestamp=time.time()
-        )
-        metrics_to_stream.append(metric)
-        time.sleep(1)
-        return metrics_to_stream
+        LOG.debug("Metrics streaming started")
+        while True:
+            yield snap.Metric(
+                namespace=[
+                    snap.NamespaceElement(value="intel"),
+                    snap.NamespaceElement(value="streaming"),
+                    snap.NamespaceElement(value="random"),
+                    snap.NamespaceElement(value="int")
+                ],
+                version=1,
+                tags={"mtype": "counter"},
+                description="Random int",
+                data=random.randint(1, 100),
+                timestamp=time.time()
+            )
+            yield snap.Metric(
+                namespace=[
+                    snap.NamespaceElement(value="intel"),
+                    snap.NamespaceElement(value="streaming"),
+                    snap.NamespaceElement(value="random"),
+                    snap.NamespaceElement(value="float")
+                ],
+                version=1,
+                tags={"mtype": "counter"},
+                description="Random float",
+                data=random.random(),
+                timestamp=time.time()
+            )
+            time.sleep(1)
 
     def update_catalog(self, config):
         LOG.debug("GetMetricTypes called")
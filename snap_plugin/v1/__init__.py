@@ -25,9 +25,11 @@ https://intelsdi-x.github.io/snap-plugin-lib-py/.
 
 """
 
-__all__ = ['Collector', 'Processor', 'Publisher', 'StreamCollector', 'Metric', 'Namespace',
-           'NamespaceElement', 'ConfigMap', 'StringRule', 'IntegerRule',
-           'BoolRule', 'FloatRule', 'ConfigPolicy', 'FlagType']
+__all__ = ['Collector', 'Processor', 'Publisher', 'StreamCollector', 'Metric',
+           'MetricBatch', 'MetricEncoder', 'Namespace', 'NamespaceElement',
+           'NamespaceIndex', 'ConfigMap', 'Transform',
+           'StringRule', 'IntegerRule', 'BoolRule', 'FloatRule', 'ConfigPolicy',
+           'FlagType', 'OverflowPolicy']
 
 import logging
 import sys
@@ -37,15 +39,19 @@ from .processor import Processor
 from .publisher import Publisher
 from .stream_collector import StreamCollector
 from .metric import Metric
+from .metric_batch import MetricBatch
+from .metric_encoder import MetricEncoder
 from .namespace import Namespace
 from .namespace_element import NamespaceElement
+from .namespace_index import NamespaceIndex
 from .config_map import ConfigMap
+from .transform import Transform
 from .config_policy import ConfigPolicy
 from .string_policy import StringRule
 from .integer_policy import IntegerRule
 from .bool_policy import BoolRule
 from .float_policy import FloatRule
-from .plugin import FlagType
+from .plugin import FlagType, OverflowPolicy
 from ._version import get_versions
 
 LOG = logging.getLogger()
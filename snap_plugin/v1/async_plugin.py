@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Base classes for asyncio plugins.
+
+The plugins defined here implement `collect`, `process`, `publish` and
+`stream` as coroutines (``async def``) and are served by a :py:mod:`grpc.aio`
+server running on an event loop owned by the plugin.  This lets I/O bound
+plugins wait on many requests concurrently without tying up a worker thread
+per request.
+
+This module requires Python 3.6+ and grpcio 1.32+ and is therefore not
+imported by :py:mod:`snap_plugin.v1`.
+
+Example:
+::
+    from snap_plugin.v1.async_plugin import AsyncCollector
+
+    class Scraper(AsyncCollector):
+        async def collect(self, metrics):
+            ...
+"""
+
+import asyncio
+import logging
+import threading
+from abc import abstractmethod
+from concurrent import futures
+
+import grpc
+import grpc.aio
+
+from .async_proxy import (_AsyncCollectorProxy, _AsyncProcessorProxy,
+                          _AsyncPublisherProxy, _AsyncStreamCollectorProxy)
+from .collector import Collector
+from .plugin import _SerializedReplyServer
+from .processor import Processor
+from .publisher import Publisher
+from .stream_collector import StreamCollector
+
+LOG = logging.getLogger(__name__)
+
+
+class _AsyncServer(object):
+    """Exposes a :py:mod:`grpc.aio` server running on an event loop in another
+    thread through the subset of the :py:class:`grpc.Server` API used by
+    :py:class:`snap_plugin.v1.plugin.Plugin`"""
+
+    def __init__(self, loop, server):
+        self._loop = loop
+        self._server = server
+
+    def add_generic_rpc_handlers(self, handlers):
+        self._server.add_generic_rpc_handlers(handlers)
+
+    def add_insecure_port(self, address):
+        return self._server.add_insecure_port(address)
+
+    def start(self):
+        asyncio.run_coroutine_threadsafe(self._server.start(), self._loop).result()
+
+    def stop(self, grace):
+        stopped = threading.Event()
+        future = asyncio.run_coroutine_threadsafe(self._server.stop(grace), self._loop)
+        future.add_done_callback(lambda _: stopped.set())
+        return stopped
+
+
+class _AsyncPlugin(object):
+    """Mixin serving a plugin with a :py:mod:`grpc.aio` server"""
+
+    _loop = None
+
+    def _init_server(self):
+        self._server_options = max_workers, max_rpcs, limits = self._get_server_options()
+        if limits:
+            LOG.warning("RPC concurrency limits are not supported by asyncio plugins.")
+        if self._loop is None:
+            # a server replaced when the plugin starts keeps the loop
+            self._loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=self._loop.run_forever)
+            thread.daemon = True
+            thread.start()
+
+        async def create_server():
+            # the synchronous methods of the proxy (Ping, Kill, ...) are
+            # served by the migration thread pool
+            return grpc.aio.server(
+                migration_thread_pool=futures.ThreadPoolExecutor(max_workers=max_workers),
+                maximum_concurrent_rpcs=max_rpcs)
+
+        server = self._run(create_server())
+        LOG.debug("asyncio gRPC server using {} workers for synchronous calls".format(max_workers))
+        self.server = _AsyncServer(self._loop, server)
+        self._add_servicer(_SerializedReplyServer(self.server))
+
+    def _init_process_pool(self):
+        if self.meta.process_pool is not None:
+            LOG.warning("Process pool is not supported by asyncio plugins.")
+
+    def _run(self, coro):
+        """Runs a coroutine on the plugin's event loop and returns its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+class AsyncCollector(_AsyncPlugin, Collector):
+    """Abstract base class for asyncio 'collector' plugins.
+
+    Same as :py:class:`snap_plugin.v1.collector.Collector` except that
+    :py:meth:`collect` is a coroutine.
+    """
+
+    def __init__(self, name, version, **kwargs):
+        super(AsyncCollector, self).__init__(name, version, **kwargs)
+        self.proxy = _AsyncCollectorProxy(self)
+
+    def _collect_for_diagnostics(self, metrics):
+        return self._run(self.collect(metrics))
+
+    @abstractmethod
+    async def collect(self, metrics):
+        """Collect requested metrics.
+
+        See :py:meth:`snap_plugin.v1.collector.Collector.collect`.
+        """
+        pass
+
+
+class AsyncProcessor(_AsyncPlugin, Processor):
+    """Abstract base class for asyncio 'processor' plugins.
+
+    Same as :py:class:`snap_plugin.v1.processor.Processor` except that
+    :py:meth:`process` is a coroutine.
+    """
+
+    def __init__(self, name, version, **kwargs):
+        super(AsyncProcessor, self).__init__(name, version, **kwargs)
+        self.proxy = _AsyncProcessorProxy(self)
+
+    @abstractmethod
+    async def process(self, metrics, config):
+        """Process metrics.
+
+        See :py:meth:`snap_plugin.v1.processor.Processor.process`.
+        """
+        pass
+
+
+class AsyncPublisher(_AsyncPlugin, Publisher):
+    """Abstract base class for asyncio 'publisher' plugins.
+
+    Same as :py:class:`snap_plugin.v1.publisher.Publisher` except that
+    :py:meth:`publish` is a coroutine.  Meta `write_behind` isn't supported,
+    each request is published before it is acknowledged.
+    """
+
+    def __init__(self, name, version, **kwargs):
+        super(AsyncPublisher, self).__init__(name, version, **kwargs)
+        self.proxy = _AsyncPublisherProxy(self)
+
+    def _init_process_pool(self):
+        super(AsyncPublisher, self)._init_process_pool()
+        if self.meta.write_behind:
+            LOG.warning("Write-behind is not supported by asyncio publishers, "
+                        "publishing metrics as requests are received.")
+
+    @abstractmethod
+    async def publish(self, metrics, config):
+        """Publishes metrics.
+
+        See :py:meth:`snap_plugin.v1.publisher.Publisher.publish`.
+        """
+        pass
+
+
+class AsyncStreamCollector(_AsyncPlugin, StreamCollector):
+    """Abstract base class for asyncio 'stream_collector' plugins.
+
+    Same as :py:class:`snap_plugin.v1.stream_collector.StreamCollector` except
+    that :py:meth:`stream` is a coroutine or an async generator.
+    """
+
+    def __init__(self, name, version, **kwargs):
+        super(AsyncStreamCollector, self).__init__(name, version, **kwargs)
+        self.proxy = _AsyncStreamCollectorProxy(self)
+
+    @abstractmethod
+    async def stream(self, metrics):
+        """Streaming metrics.
+
+        See :py:meth:`snap_plugin.v1.stream_collector.StreamCollector.stream`.
+        """
+        pass
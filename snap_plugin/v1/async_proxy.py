@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Proxies dispatching requests to the coroutines of asyncio plugins.
+
+Only the methods that call the plugin's coroutines are overridden, the rest
+(`GetMetricTypes`, `GetConfigPolicy`, `Ping`, `Kill`) are served by the
+synchronous implementations in the gRPC server's migration thread pool.
+"""
+
+import asyncio
+import inspect
+import logging
+import queue
+import traceback
+
+from .collect_cache import _CollectCache, _Flight
+from .collector_proxy import _CollectorProxy
+from .config_map import ConfigMap
+from .metric import Metric
+from .metric_batch import _metrics_pb, _wrap_metrics
+from .metrics_buffer import _MetricsBuffer
+from .plugin_pb2 import ErrReply, MetricsArg, MetricsReply
+from .processor_proxy import _ProcessorProxy
+from .publisher_proxy import PublisherProxy
+from .stream_collector_proxy import _StreamCollectorProxy, _stream_key
+
+LOG = logging.getLogger(__name__)
+
+
+async def _put(returned_metrics, metrics_queue):
+    """Puts a metric or a list of metrics into the queue"""
+    if isinstance(returned_metrics, list):
+        for returned_metric in returned_metrics:
+            await metrics_queue.put(returned_metric)
+    else:
+        await metrics_queue.put(returned_metrics)
+
+
+class _AsyncCollectCache(_CollectCache):
+    """Collect cache of an asyncio collector, its requests wait for the calls
+    in flight on the event loop"""
+
+    def _new_flight(self):
+        flight = _Flight()
+        flight.done = asyncio.Event()
+        return flight
+
+    async def collect(self, metrics, ttl, collect):
+        """Returns the reply to a collect request, `collect` being a
+        coroutine function (see :py:meth:`_CollectCache.collect`)"""
+        keys, results, flights, owned, missing = self._lookup(metrics)
+        unattributed = []
+        if missing:
+            try:
+                reply, error = await collect(missing), None
+            except Exception as err:
+                reply, error = None, err
+            unattributed = self._complete(owned, ttl, reply, error)
+        for flight in flights.values():
+            await flight.done.wait()
+        return self._reply(keys, results, flights, unattributed)
+
+
+class _AsyncCollectorProxy(_CollectorProxy):
+    """Dispatches collector requests to the plugins coroutines"""
+
+    def __init__(self, collector):
+        super(_AsyncCollectorProxy, self).__init__(collector)
+        self.collect_cache = _AsyncCollectCache()
+
+    async def CollectMetrics(self, request, context):
+        """Dispatches the request to the plugins collect coroutine"""
+        LOG.debug("CollectMetrics called")
+        try:
+            self._apply_config_policy(request.metrics)
+            if self.plugin.meta.collect_cache:
+                return await self.collect_cache.collect(request.metrics, self._cache_ttl(),
+                                                        self._collect_metrics)
+            return await self._collect(request)
+        except Exception as err:
+            msg = "message: {}\n\nstack trace: {}".format(
+                err, traceback.format_exc())
+            return MetricsReply(metrics=[], error=msg)
+
+    async def _collect(self, request):
+        """Collects the metrics of a MetricsArg and returns a MetricsReply"""
+        metrics_collected = await self.plugin.collect(_wrap_metrics(request.metrics, self.plugin.meta.batch))
+        return MetricsReply(metrics=_metrics_pb(metrics_collected))
+
+    async def _collect_metrics(self, metrics):
+        return await self._collect(MetricsArg(metrics=metrics))
+
+
+class _AsyncProcessorProxy(_ProcessorProxy):
+    """Dispatches processor requests to the plugins coroutines"""
+
+    async def Process(self, request, context):
+        """Dispatches the request to the plugins process coroutine"""
+        LOG.debug("Process called")
+        try:
+            self._apply_config_policy(config=request.Config)
+            reply = self._transform(request)
+            if reply is not None:
+                return reply
+            metrics = await self.plugin.process(
+                _wrap_metrics(request.Metrics, self.plugin.meta.batch),
+                ConfigMap(pb=request.Config)
+            )
+            return MetricsReply(metrics=_metrics_pb(metrics))
+        except Exception as err:
+            msg = "message: {}\n\nstack trace: {}".format(
+                err, traceback.format_exc())
+            return MetricsReply(metrics=[], error=msg)
+
+
+class _AsyncPublisherProxy(PublisherProxy):
+    """Dispatches publisher requests to the plugins coroutines"""
+
+    async def Publish(self, request, context):
+        """Dispatches the request to the plugins publish coroutine"""
+        LOG.debug("Publish called")
+        try:
+            self._apply_config_policy(config=request.Config)
+            await self.plugin.publish(
+                _wrap_metrics(request.Metrics, self.plugin.meta.batch),
+                ConfigMap(pb=request.Config)
+            )
+            return ErrReply()
+        except Exception as err:
+            msg = "message: {}\n\nstack trace: {}".format(
+                err, traceback.format_exc())
+            return ErrReply(error=msg)
+
+
+class _AsyncMetricsBuffer(_MetricsBuffer):
+    """Buffer of an asyncio stream, filled and read on the event loop"""
+
+    def __init__(self, capacity, policy):
+        super(_AsyncMetricsBuffer, self).__init__(capacity, policy)
+        self._ready = asyncio.Event()
+
+    def _put(self, metric):
+        super(_AsyncMetricsBuffer, self)._put(metric)
+        self._ready.set()
+
+    async def get_async(self):
+        """Removes and returns the oldest metric, waiting for one"""
+        while True:
+            try:
+                return self.get(timeout=0)
+            except queue.Empty:
+                self._ready.clear()
+                await self._ready.wait()
+
+
+class _AsyncStreamProducer(object):
+    """Runs the plugin's stream coroutine for a set of requested metrics and
+    fans the streamed metrics out to the buffers of its subscribers, their
+    overflow policies being applied as by
+    :py:class:`~snap_plugin.v1.stream_collector_proxy._StreamProducer`"""
+
+    def __init__(self, key):
+        self.key = key
+        self.task = None
+        self.subscribers = []
+        # set when a subscriber's buffer makes room
+        self.room = asyncio.Event()
+
+    async def put(self, metric):
+        """Puts a metric into the buffers of the subscribers, waiting for room
+        in the full buffers with the `block` policy"""
+        pending = self.subscribers
+        while True:
+            self.room.clear()
+            pending = [q for q in pending if not q.put_nowait(metric)]
+            if not pending:
+                return
+            await self.room.wait()
+
+
+class _AsyncStreamCollectorProxy(_StreamCollectorProxy):
+    """Dispatches stream collector requests to the plugins coroutines"""
+
+    async def _stream_task(self, collect_args, metrics_queue):
+        requested_metrics = [Metric(pb=m) for m in collect_args.Metrics_Arg.metrics]
+        while True:
+            stream = self.plugin.stream(requested_metrics)
+            if inspect.isasyncgen(stream):
+                async for returned_metrics in stream:
+                    await _put(returned_metrics, metrics_queue)
+                    # a stream which doesn't await would starve the loop
+                    await asyncio.sleep(0)
+            else:
+                await _put(await stream, metrics_queue)
+                await asyncio.sleep(0)
+
+    def _subscribe(self, collect_args, metrics_queue):
+        # producers are only used from the event loop so no lock is needed
+        key = _stream_key(collect_args)
+        producer = self._producers.get(key)
+        if producer is None:
+            producer = _AsyncStreamProducer(key)
+            producer.task = asyncio.ensure_future(self._stream_task(collect_args, producer))
+            self._producers[key] = producer
+        metrics_queue.on_room = producer.room.set
+        producer.subscribers = producer.subscribers + [metrics_queue]
+        return producer
+
+    def _unsubscribe(self, producer, metrics_queue):
+        producer.subscribers = [s for s in producer.subscribers if s is not metrics_queue]
+        producer.room.set()
+        if not producer.subscribers:
+            del self._producers[producer.key]
+            producer.task.cancel()
+
+    async def StreamMetrics(self, request_iterator, context):
+        """Dispatches metrics streamed by collector"""
+        LOG.debug("StreamMetrics called")
+        collect_args = await request_iterator.__anext__()
+        error = self._check_config_policy(collect_args)
+        if error is not None:
+            yield error
+            return
+        max_collect_duration = self.max_collect_duration
+        max_metrics_buffer = self.max_metrics_buffer
+        if collect_args.MaxCollectDuration > 0:
+            max_collect_duration = collect_args.MaxCollectDuration
+        if collect_args.MaxMetricsBuffer > 0:
+            max_metrics_buffer = collect_args.MaxMetricsBuffer
+
+        metrics_queue = _AsyncMetricsBuffer(self._buffer_size(max_metrics_buffer),
+                                            self.plugin.meta.stream_overflow_policy)
+        producer = self._subscribe(collect_args, metrics_queue)
+        batch = self._new_batch(max_collect_duration, max_metrics_buffer)
+        dropped = 0
+        try:
+            while not producer.task.done():
+                try:
+                    # wait for new metrics until max collect duration timeout
+                    # or until the oldest buffered metric is too old
+                    flush = batch.add(await asyncio.wait_for(
+                        metrics_queue.get_async(), batch.timeout(max_collect_duration)))
+                except asyncio.TimeoutError:
+                    if not batch.metrics:
+                        LOG.debug("Max collect duration exceeded")
+                    flush = True
+                if flush:
+                    dropped = self._report_dropped(metrics_queue, dropped)
+                    yield batch.flush()
+            # surface errors raised by the plugin's stream coroutine
+            producer.task.result()
+        finally:
+            # the stream has been stopped or the plugin failed, the plugin's
+            # stream is cancelled once no other stream uses it
+            metrics_queue.close()
+            self._unsubscribe(producer, metrics_queue)
+            self._report_dropped(metrics_queue, dropped)
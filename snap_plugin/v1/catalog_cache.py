@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from .config_map import ConfigMap, _config_key
+from .plugin_pb2 import MetricsReply
+
+
+class _CatalogCache(object):
+    """Caches the serialized replies to GetMetricTypes by config.
+
+    Only successful replies are cached, they are kept `ttl` seconds or, if
+    `ttl` is 0, until the cache is invalidated.
+    """
+
+    def __init__(self):
+        self._replies = {}
+        # incremented on invalidation so replies built meanwhile are dropped
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def reply(self, config, ttl, update_catalog):
+        """Returns the reply to a GetMetricTypes request.
+
+        Args:
+            config (:obj:`plugin_pb2.ConfigMap`): config of the request
+            ttl (:obj:`float`): seconds cached replies are valid, `None`
+                disables caching
+            update_catalog (:obj:`callable`): returns the metrics of the
+                catalog given a :py:class:`snap_plugin.v1.ConfigMap`
+
+        Returns:
+            :obj:`plugin_pb2.MetricsReply` or :obj:`bytes`: The reply, the
+            serialized reply when caching is enabled
+        """
+        if ttl is None:
+            metrics = update_catalog(ConfigMap(pb=config))
+            return MetricsReply(metrics=[m.pb for m in metrics])
+        key = _config_key(config)
+        with self._lock:
+            entry = self._replies.get(key)
+            generation = self._generation
+        if entry is not None and (ttl == 0 or time.time() < entry[1] + ttl):
+            return entry[0]
+        metrics = update_catalog(ConfigMap(pb=config))
+        reply = MetricsReply(metrics=[m.pb for m in metrics]).SerializeToString()
+        with self._lock:
+            if generation == self._generation:
+                self._replies[key] = (reply, time.time())
+        return reply
+
+    def invalidate(self):
+        """Drops every cached reply"""
+        with self._lock:
+            self._generation += 1
+            self._replies.clear()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+
+from .config_map import _config_key
+from .namespace_index import NamespaceIndex
+from .plugin_pb2 import Metric as PbMetric, MetricsReply
+from .string_table import _namespace_key
+
+LOG = logging.getLogger(__name__)
+
+
+def _metric_key(pb):
+    """Returns the cache key of a requested metric (pb)"""
+    return _namespace_key(pb.Namespace), _config_key(pb.Config)
+
+
+class _Flight(object):
+    """A collect call other requests for the same metrics wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.metrics = None
+        self.error = None
+
+
+class _CollectCache(object):
+    """Caches collected metrics by requested namespace and config.
+
+    Requested metrics collected less than `ttl` seconds ago are served from
+    the cache, the other ones are collected in a single call.  Metrics
+    requested while a call collecting them is in flight wait for that call
+    instead of collecting them again.
+
+    The collected metrics are attributed to the requested metric whose
+    namespace, a '*' element matching any element, and config they match.
+    The results of a call returning metrics that match none of the requested
+    metrics, or returning an error, are not cached.
+
+    Attributes:
+        hits (:obj:`int`): Requested metrics served from the cache or by a
+            call in flight
+        misses (:obj:`int`): Requested metrics collected
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def collect(self, metrics, ttl, collect):
+        """Returns the reply to a collect request.
+
+        Args:
+            metrics (:obj:`list` of :obj:`plugin_pb2.Metric`): requested
+                metrics
+            ttl (:obj:`float`): seconds collected metrics are served from
+                the cache
+            collect (:obj:`callable`): collects a list of requested metrics
+                and returns a :obj:`plugin_pb2.MetricsReply`
+
+        Returns:
+            :obj:`plugin_pb2.MetricsReply`
+        """
+        keys, results, flights, owned, missing = self._lookup(metrics)
+        unattributed = []
+        if missing:
+            try:
+                reply, error = collect(missing), None
+            except Exception as err:
+                reply, error = None, err
+            unattributed = self._complete(owned, ttl, reply, error)
+        for flight in flights.values():
+            flight.done.wait()
+        return self._reply(keys, results, flights, unattributed)
+
+    def _new_flight(self):
+        return _Flight()
+
+    def _lookup(self, metrics):
+        """Serves the requested metrics from the cache, joins the flights
+        collecting them and starts flights for the missing ones.
+
+        Returns:
+            :obj:`tuple`: the keys of the requested metrics, the cached
+            metrics and the flights by key, the flights owned by the request
+            and the requested metrics (pb) it must collect
+        """
+        keys = [_metric_key(pb) for pb in metrics]
+        results = {}
+        flights = {}
+        owned = {}
+        missing = []
+        with self._lock:
+            now = time.time()
+            for key, pb in zip(keys, metrics):
+                if key in results or key in flights:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self.hits += 1
+                    results[key] = entry[1]
+                elif key in self._flights:
+                    self.hits += 1
+                    flights[key] = self._flights[key]
+                else:
+                    self.misses += 1
+                    flights[key] = owned[key] = self._flights[key] = self._new_flight()
+                    missing.append(pb)
+        return keys, results, flights, owned, missing
+
+    def _reply(self, keys, results, flights, unattributed):
+        """Returns the reply of completed flights and cached metrics"""
+        for key, flight in flights.items():
+            if isinstance(flight.error, Exception):
+                raise flight.error
+            if flight.error is not None:
+                return MetricsReply(metrics=[], error=flight.error)
+            results[key] = flight.metrics
+        LOG.debug("collect cache: {} hits, {} misses".format(self.hits, self.misses))
+        reply = MetricsReply()
+        for key in keys:
+            reply.metrics.extend(results[key])
+        reply.metrics.extend(unattributed)
+        return reply
+
+    def _complete(self, flights, ttl, reply, error):
+        """Caches the reply (pb) collecting the missing metrics, or the
+        exception it raised, and completes their flights.
+
+        Returns:
+            :obj:`list` of :obj:`plugin_pb2.Metric`: The collected metrics
+            matching none of the requested metrics
+        """
+        collected = dict((key, []) for key in flights)
+        unattributed = []
+        if error is None and reply.error:
+            error = reply.error
+        elif error is None:
+            try:
+                unattributed = self._attribute(reply.metrics, collected)
+            except Exception as err:
+                error = err
+        with self._lock:
+            now = time.time()
+            for key in flights:
+                del self._flights[key]
+                if error is None and not unattributed:
+                    self._entries[key] = (now + ttl, collected[key])
+            # drop expired entries
+            for key in [k for k, e in self._entries.items() if e[0] <= now]:
+                del self._entries[key]
+        for key, flight in flights.items():
+            flight.metrics = collected[key]
+            flight.error = error
+            flight.done.set()
+        return unattributed
+
+    def _attribute(self, metrics, collected):
+        """Attributes collected metrics to the requested metric whose
+        namespace and config they match and returns the ones matching none.
+
+        A collected metric whose config matches none of the requested metrics
+        matching its namespace is attributed to the most specific of them,
+        unless metrics with that namespace were requested with different
+        configs, in which case it can't be attributed."""
+        index = NamespaceIndex()
+        for key in collected:
+            index.add(key[0], key)
+        unattributed = []
+        for pb in metrics:
+            key = _attribution(index.match(_namespace_key(pb.Namespace)), pb)
+            if key is None:
+                unattributed.append(pb)
+            else:
+                metric = PbMetric()
+                metric.CopyFrom(pb)
+                collected[key].append(metric)
+        return unattributed
+
+
+def _attribution(keys, pb):
+    """Returns the key, among the requested keys matching the namespace of a
+    collected metric (pb), the metric is attributed to or None"""
+    if not keys:
+        return None
+    if len(keys) > 1:
+        config = _config_key(pb.Config)
+        for key in keys:
+            if key[1] == config:
+                return key
+        if keys[1][0] == keys[0][0]:
+            return None
+    return keys[0]
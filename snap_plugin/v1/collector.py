@@ -46,7 +46,9 @@ class Collector(Plugin):
         super(Collector, self).__init__()
         self.meta = Meta(PluginType.collector, name, version, **kwargs)
         self.proxy = _CollectorProxy(self)
-        add_CollectorServicer_to_server(self.proxy, self.server)
+
+    def _add_servicer(self, server):
+        add_CollectorServicer_to_server(self.proxy, server)
 
     @abstractmethod
     def collect(self, metrics):
@@ -58,16 +60,33 @@ class Collector(Plugin):
         This method is called by the Snap deamon during the collection phase
         of the execution of a Snap workflow.
 
+        When the plugin's :py:class:`~snap_plugin.v1.plugin.Meta` sets
+        `batch` the metrics are passed as a
+        :py:class:`~snap_plugin.v1.metric_batch.MetricBatch` which can be
+        updated in place and returned as is.
+
         Args:
-            metrics (:obj:`list` of :obj:`snap_plugin.v1.Metric`):
+            metrics (:obj:`list` of :obj:`snap_plugin.v1.Metric` or
+                :obj:`snap_plugin.v1.MetricBatch`):
                 List of metrics to be collected.
 
         Returns:
-            :obj:`list` of :obj:`snap_plugin.v1.Metric`:
+            :obj:`list` of :obj:`snap_plugin.v1.Metric` or
+                :obj:`snap_plugin.v1.MetricBatch`:
                 List of collected metrics.
         """
         pass
 
+    def invalidate_catalog(self):
+        """Drops the cached replies to GetMetricTypes.
+
+        Call it when the metrics provided by the plugin change so the next
+        catalog request calls
+        :py:meth:`~snap_plugin.v1.collector.Collector.update_catalog` again (see
+        Meta `catalog_cache_ttl`).
+        """
+        self.proxy.catalog_cache.invalidate()
+
     @abstractmethod
     def update_catalog(self, config):
         """Returns the metrics which the plugin provides.
@@ -18,41 +18,66 @@
 import logging
 import traceback
 
-from .metric import Metric
+from .catalog_cache import _CatalogCache
+from .collect_cache import _CollectCache
+from .metric_batch import _metrics_pb, _wrap_metrics
 
-from .plugin_pb2 import MetricsReply
+from .plugin_pb2 import MetricsArg, MetricsReply
 from .plugin_proxy import PluginProxy
-from .config_map import ConfigMap
 
 LOG = logging.getLogger(__name__)
 
+# seconds collected metrics are cached for when Meta doesn't set cache_ttl,
+# same as the framework's default
+_DEFAULT_CACHE_TTL = .5
+
 
 class _CollectorProxy(PluginProxy):
     """Dispatches collector requests to the plugins implementation"""
     def __init__(self, collector):
         super(_CollectorProxy, self).__init__(collector)
         self.plugin = collector
+        self.catalog_cache = _CatalogCache()
+        self.collect_cache = _CollectCache()
 
     def CollectMetrics(self, request, context):
         """Dispatches the request to the plugins collect method"""
         LOG.debug("CollectMetrics called")
         try:
-            metrics_to_collect = []
-            for metric in request.metrics:
-                metrics_to_collect.append(Metric(pb=metric))
-            metrics_collected = self.plugin.collect(metrics_to_collect)
-            return MetricsReply(metrics=[m.pb for m in metrics_collected])
+            self._apply_config_policy(request.metrics)
+            if self.plugin.meta.collect_cache:
+                return self.collect_cache.collect(request.metrics, self._cache_ttl(), self._collect_metrics)
+            return self._collect(request)
         except Exception as err:
             msg = "message: {}\n\nstack trace: {}".format(
                 err, traceback.format_exc())
             return MetricsReply(metrics=[], error=msg)
 
+    def _collect(self, request):
+        """Collects the metrics of a MetricsArg and returns a MetricsReply"""
+        if self.plugin._process_pool is not None:
+            return self.plugin._process_pool.collect(request)
+        metrics_to_collect = _wrap_metrics(request.metrics, self.plugin.meta.batch)
+        metrics_collected = self.plugin.collect(metrics_to_collect)
+        return MetricsReply(metrics=_metrics_pb(metrics_collected))
+
+    def _collect_metrics(self, metrics):
+        return self._collect(MetricsArg(metrics=metrics))
+
+    def _cache_ttl(self):
+        """Returns the seconds collected metrics are cached for, Meta
+        `cache_ttl` is in nanoseconds"""
+        if self.plugin.meta.cache_ttl is None:
+            return _DEFAULT_CACHE_TTL
+        return self.plugin.meta.cache_ttl / 1e9
+
     def GetMetricTypes(self, request, context):
         """Dispatches the request to the plugins update_catalog method"""
         LOG.debug("GetMetricTypes called")
         try:
-            metrics = self.plugin.update_catalog(ConfigMap(pb=request.config))
-            return MetricsReply(metrics=[m.pb for m in metrics])
+            reply = self.catalog_cache.reply(request.config, self.plugin.meta.catalog_cache_ttl,
+                                             self.plugin.update_catalog)
+            return self._reply(reply, MetricsReply)
         except Exception as err:
             msg = "message: {}\n\nstack trace: {}".format(
                 err, traceback.format_exc())
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Config policies compiled into a namespace index of rules.
+
+A plugin's :py:class:`~snap_plugin.v1.config_policy.ConfigPolicy` is compiled
+once into rules looked up by the namespace of a metric, the rules of a policy
+namespace applying to the metrics below it.  Applying them to the config of a
+request adds defaults, coerces values to the type of their rule and checks
+limits and required keys in a single pass.
+"""
+
+from builtins import int
+from past.builtins import basestring
+
+from .namespace_index import NamespaceIndex
+from .string_table import _namespace_key
+
+# number of namespaces whose rules are kept before the rules cache is cleared
+_MAX_NAMESPACES = 4096
+
+_BOOLS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def _to_int(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError("{!r} is not an integer".format(value))
+    return int(value)
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValueError("{!r} is not a float".format(value))
+    return float(value)
+
+
+def _to_bool(value):
+    if isinstance(value, basestring):
+        value = _BOOLS.get(value.lower(), value)
+    elif isinstance(value, int) and value in (0, 1):
+        value = bool(value)
+    if not isinstance(value, bool):
+        raise ValueError("{!r} is not a bool".format(value))
+    return value
+
+
+def _to_string(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+# config map field and coercion of the values of each rule type
+_TYPES = {
+    "integer": ("IntMap", _to_int),
+    "float": ("FloatMap", _to_float),
+    "string": ("StringMap", _to_string),
+    "bool": ("BoolMap", _to_bool),
+}
+_MAPS = ("IntMap", "FloatMap", "StringMap", "BoolMap")
+
+
+class _Rule(object):
+    """A config key's rule"""
+
+    __slots__ = ("key", "field", "coerce", "default", "minimum", "maximum", "required")
+
+    def __init__(self, key, key_type, pb):
+        self.key = key
+        self.field, self.coerce = _TYPES[key_type]
+        self.default = pb.default if pb.has_default else None
+        self.minimum = pb.minimum if getattr(pb, "has_min", False) else None
+        self.maximum = pb.maximum if getattr(pb, "has_max", False) else None
+        self.required = pb.required
+
+    def apply(self, pb):
+        """Applies the rule to a config map (pb) and returns an error message
+        or None"""
+        entries = getattr(pb, self.field)
+        if self.key in entries:
+            value = entries[self.key]
+        else:
+            for field in _MAPS:
+                other = getattr(pb, field)
+                if self.key in other:
+                    try:
+                        value = self.coerce(other[self.key])
+                    except ValueError as err:
+                        return "config key '{}': {}".format(self.key, err)
+                    del other[self.key]
+                    entries[self.key] = value
+                    break
+            else:
+                if self.default is not None:
+                    entries[self.key] = self.default
+                elif self.required:
+                    return "config key '{}' is required".format(self.key)
+                return None
+        if self.minimum is not None and value < self.minimum:
+            return "config key '{}': {} is less than the minimum {}".format(
+                self.key, value, self.minimum)
+        if self.maximum is not None and value > self.maximum:
+            return "config key '{}': {} is greater than the maximum {}".format(
+                self.key, value, self.maximum)
+        return None
+
+
+class _CompiledPolicy(object):
+    """Rules of a config policy indexed by namespace.
+
+    Args:
+        policy (:py:class:`~snap_plugin.v1.config_policy.ConfigPolicy`):
+            policy to compile
+
+    """
+
+    def __init__(self, policy):
+        self._index = NamespaceIndex()
+        for key_type, policies in policy.policies:
+            for namespace_policy in policies.values():
+                pattern = tuple(namespace_policy.key) + ("**",)
+                for key, rule in namespace_policy.rules.items():
+                    self._index.add(pattern, _Rule(key, key_type, rule))
+        self._rules = {}
+
+    def rules(self, namespace):
+        """Returns the rules applying to a namespace (tuple of strings), a
+        key's most specific rule hiding the others"""
+        rules = self._rules.get(namespace)
+        if rules is None:
+            keys = set()
+            rules = []
+            for rule in self._index.match(namespace):
+                if rule.key not in keys:
+                    keys.add(rule.key)
+                    rules.append(rule)
+            if len(self._rules) >= _MAX_NAMESPACES:
+                self._rules = {}
+            self._rules[namespace] = rules
+        return rules
+
+    def apply(self, metrics=(), config=None):
+        """Applies the policy to the configs of metrics and to a config.
+
+        Args:
+            metrics (:obj:`list` of :obj:`plugin_pb2.Metric`): metrics whose
+                config is checked against the rules of their namespace
+            config (:obj:`plugin_pb2.ConfigMap`): config checked against the
+                rules of the root namespace
+
+        Raises:
+            ValueError: A config doesn't satisfy the policy, the message lists
+                every error found
+        """
+        errors = []
+        for pb in metrics:
+            namespace = _namespace_key(pb.Namespace)
+            for rule in self.rules(namespace):
+                error = rule.apply(pb.Config)
+                if error is not None:
+                    errors.append("{}: {}".format("/".join(namespace), error))
+        if config is not None:
+            for rule in self.rules(()):
+                error = rule.apply(config)
+                if error is not None:
+                    errors.append(error)
+        if errors:
+            raise ValueError("\n".join(errors))
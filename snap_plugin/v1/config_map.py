@@ -18,12 +18,49 @@
 
 from builtins import int
 from collections import MutableMapping
-from itertools import chain
 from past.builtins import basestring
 
 from .plugin_pb2 import ConfigMap as PbConfigMap
 
 
+def _config_key(pb):
+    """Returns a hashable key identifying the entries of a config map (pb)"""
+    return (tuple(sorted(pb.IntMap.items())),
+            tuple(sorted(pb.StringMap.items())),
+            tuple(sorted(pb.FloatMap.items())),
+            tuple(sorted(pb.BoolMap.items())))
+
+
+def _entries(pb):
+    """Returns the entries of a config map (pb) merged in a dict, a key of
+    more than one map taking the value __getitem__ always returned for it"""
+    entries = dict(pb.IntMap.items())
+    for map in (pb.FloatMap, pb.StringMap, pb.BoolMap):
+        for k, v in map.items():
+            entries.setdefault(k, v)
+    return entries
+
+
+class _ConfigDecoder(object):
+    """Decodes the config maps of the metrics of a request, identical config
+    maps sharing the dict of their entries so they are decoded once"""
+
+    def __init__(self):
+        self._entries = {}
+
+    def config_map(self, pb):
+        """Returns a ConfigMap wrapping pb"""
+        # cheaper than sorting the maps, equal configs serialized differently
+        # are only decoded twice
+        key = pb.SerializeToString()
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = self._entries[key] = _entries(pb)
+        config = ConfigMap(pb=pb)
+        config._dict = entries
+        return config
+
+
 class ConfigMap(MutableMapping):
     """ConfigMap provides a map of config key value pairs.
 
@@ -37,11 +74,21 @@ class ConfigMap(MutableMapping):
         cfg0 = snap.ConfigMap(user="john", port=911)
         cfg1 = snap.ConfigMap(("user","john"),("port", 911))
 
+    Reads are served by a dict of the entries built on first read and
+    dropped on write.  It is also dropped when :py:attr:`pb`, or one of its
+    fields through the config map, is accessed as the message may then be
+    changed directly.
+
     Also see:
         - :py:class:`snap_plugin.v1.metric.Metric`
     """
 
+    __slots__ = ("_pb", "_dict")
+
     def __init__(self, *args, **kwargs):
+        # read-only dict of the entries, it may be shared with other config
+        # maps so writes replace it rather than update it
+        self._dict = None
         if "pb" in kwargs:
             self._pb = kwargs.get("pb")
         else:
@@ -55,13 +102,19 @@ class ConfigMap(MutableMapping):
 
 
     def __getattr__(self, attr):
-        if attr in self.__dict__:
-            # this object has it
-            return getattr(self, attr)
-        # proxy to the wrapped object
+        if attr in ("_pb", "_dict"):
+            raise AttributeError(attr)
+        # proxy to the wrapped object, which may be changed by the caller
+        self._dict = None
         return getattr(self._pb, attr)
 
+    def _entries(self):
+        if self._dict is None:
+            self._dict = _entries(self._pb)
+        return self._dict
+
     def __setitem__(self, key, item):
+        self._dict = None
         if isinstance(item, float):
             self._pb.FloatMap[key] = item
         elif isinstance(item, bool):
@@ -75,24 +128,17 @@ class ConfigMap(MutableMapping):
                             "or bool".format(type(item)))
 
     def __getitem__(self, key):
-        for dict in [self._pb.IntMap, self._pb.FloatMap, self._pb.StringMap,
-                     self._pb.BoolMap]:
-            if key in dict:
-                return dict[key]
-        raise KeyError(key)
+        return self._entries()[key]
 
     def __repr__(self):
-        return repr(dict(chain(self._pb.StringMap.items(),
-                               self._pb.IntMap.items(),
-                               self._pb.FloatMap.items(),
-                               self._pb.BoolMap.items())))
+        return repr(self._entries())
 
     def __len__(self):
-        return (len(self._pb.IntMap) + len(self._pb.StringMap) +
-                len(self._pb.FloatMap) + len(self._pb.BoolMap))
+        return len(self._entries())
 
     def __delitem__(self, key):
         if key in self:
+            self._dict = None
             for dict in [self._pb.IntMap, self._pb.FloatMap,
                          self._pb.StringMap, self._pb.BoolMap]:
                 try:
@@ -104,30 +150,17 @@ class ConfigMap(MutableMapping):
             raise KeyError(key)
 
     def __iter__(self):
-        for k in self._pb.IntMap:
-            yield k
-        for k in self._pb.FloatMap:
-            yield k
-        for k in self._pb.StringMap:
-            yield k
-        for k in self._pb.BoolMap:
-            yield k
+        return iter(self._entries())
 
     def __contains__(self, key):
-        for dict in [self._pb.IntMap, self._pb.FloatMap, self._pb.StringMap,
-                     self._pb.BoolMap]:
-            try:
-                if key in dict.keys():
-                    return True
-            except KeyError:
-                pass
-        return False
+        return key in self._entries()
 
     def __unicode__(self):
         return unicode(repr(self))
 
     def clear(self):
         "Removes all entries from the config map"
+        self._dict = None
         self._pb.IntMap.clear()
         self._pb.StringMap.clear()
         self._pb.FloatMap.clear()
@@ -158,39 +191,27 @@ class ConfigMap(MutableMapping):
 
     def keys(self):
         "Returns a list of ConfigMap keys."
-        return (list(self._pb.IntMap.keys()) + list(self._pb.StringMap.keys()) +
-                list(self._pb.FloatMap.keys()) + list(self._pb.BoolMap.keys()))
+        return list(self._entries().keys())
 
     def values(self):
         "Returns a list of ConfigMap values."
-        return (list(self._pb.IntMap.values()) + list(self._pb.StringMap.values()) +
-                list(self._pb.FloatMap.values()) + list(self._pb.BoolMap.values()))
+        return list(self._entries().values())
 
     def iteritems(self):
         "Returns an iterator over the items of ConfigMap."
-        return chain(self._pb.StringMap.items(),
-                     self._pb.IntMap.items(),
-                     self._pb.FloatMap.items(),
-                     self._pb.BoolMap.items())
+        return iter(self._entries().items())
 
     def itervalues(self):
         "Returns an iterator over the values of ConfigMap."
-        return chain(self._pb.StringMap.values(),
-                     self._pb.IntMap.values(),
-                     self._pb.FloatMap.values(),
-                     self._pb.BoolMap.values())
+        return iter(self._entries().values())
 
     def iterkeys(self):
         "Returns an iterator over the keys of ConfigMap."
-        return chain(self._pb.StringMap.keys(),
-                     self._pb.IntMap.keys(),
-                     self._pb.FloatMap.keys(),
-                     self._pb.BoolMap.keys())
+        return iter(self._entries().keys())
 
     def items(self):
         "Returns a list of (key, value) pairs as 2-tuples."
-        return (list(self._pb.IntMap.items()) + list(self._pb.StringMap.items()) +
-                list(self._pb.FloatMap.items()) + list(self._pb.BoolMap.items()))
+        return list(self._entries().items())
 
     def pop(self, key, default=None):
         """Remove specified key and return the corresponding value.
@@ -201,6 +222,7 @@ class ConfigMap(MutableMapping):
             if default is not None:
                 return default
             raise KeyError(key)
+        self._dict = None
         for map in [self._pb.IntMap, self._pb.FloatMap, self._pb.StringMap,
                     self._pb.BoolMap]:
             if key in map.keys():
@@ -218,4 +240,7 @@ class ConfigMap(MutableMapping):
 
     @property
     def pb(self):
+        # the message may be changed by the caller, the entries are decoded
+        # again on the next read
+        self._dict = None
         return self._pb
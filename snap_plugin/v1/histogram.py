@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import threading
+
+# upper bounds (in seconds) of the default latency buckets
+_DEFAULT_BOUNDS = (.001, .005, .01, .05, .1, .5, 1, 5, 10, 30, 60)
+
+
+class _Histogram(object):
+    """Cumulative histogram of observed values.
+
+    Args:
+        bounds (:obj:`tuple` of :obj:`float`): sorted upper bounds of the
+            buckets, values greater than the last bound are counted in an
+            overflow bucket
+
+    """
+
+    def __init__(self, bounds=_DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.count = 0
+        self.sum = 0.0
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{} count={} sum={:.6f}>".format(
+            self.__class__.__name__, self.count, self.sum)
+
+    def observe(self, value):
+        """Records a value"""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def buckets(self):
+        """Returns the cumulative count of each bucket.
+
+        Returns:
+            :obj:`list` of :obj:`tuple`: (upper bound, count) pairs, the
+            bound of the overflow bucket is `float('inf')`
+        """
+        with self._lock:
+            counts = list(self._counts)
+        result = []
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            total += count
+            result.append((bound, total))
+        return result
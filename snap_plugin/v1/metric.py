@@ -15,7 +15,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import time
 from builtins import int
 
 from past.builtins import basestring
@@ -23,7 +22,91 @@ from past.builtins import basestring
 from .config_map import ConfigMap
 from .namespace import Namespace
 from .plugin_pb2 import Metric as PbMetric
-from .timestamp import Timestamp
+from .string_table import _tags_key
+from .timestamp import Timestamp, _set_time, _set_time_ns, _time_ns
+
+
+# python type and name of the data held by each field of the 'data' oneof
+_DATA_FIELDS = {
+    "int32_data": (int, "integer"),
+    "int64_data": (int, "integer"),
+    "uint32_data": (int, "integer"),
+    "uint64_data": (int, "integer"),
+    "float32_data": (float, "float"),
+    "float64_data": (float, "float"),
+    "string_data": (str, "string"),
+    "bool_data": (bool, "bool"),
+    "bytes_data": (bytes, "unknown"),
+    None: (None, "unknown"),
+}
+
+# field of the 'data' oneof set for each dtype of the typed setters
+_DTYPE_FIELDS = {
+    "int32": "int32_data",
+    "int64": "int64_data",
+    "uint32": "uint32_data",
+    "uint64": "uint64_data",
+    "float32": "float32_data",
+    "float64": "float64_data",
+    "string": "string_data",
+    "bool": "bool_data",
+    "bytes": "bytes_data",
+}
+
+# field of the 'data' oneof set for each supported type, in order of
+# precedence (bool is an int and basestring matches bytes)
+_DATA_SETTERS = ((bool, "bool_data"),
+                 (int, "int64_data"),
+                 (float, "float64_data"),
+                 (basestring, "string_data"),
+                 (bytes, "bytes_data"))
+
+
+def _setters_by_type():
+    """Returns the field of the 'data' oneof set for each builtin type"""
+    setters = {}
+    for value in (False, 0, 0.0, "", b"", u""):
+        for data_type, field in _DATA_SETTERS:
+            if isinstance(value, data_type):
+                setters[type(value)] = field
+                break
+    return setters
+
+
+# the same for the builtin types, skipping the isinstance checks
+_DATA_SETTERS_BY_TYPE = _setters_by_type()
+
+
+def _set_data(pb, value):
+    """Sets the data of a Metric (pb) picking the field by the value's type"""
+    field = _DATA_SETTERS_BY_TYPE.get(type(value))
+    if field is None:
+        for data_type, data_field in _DATA_SETTERS:
+            if isinstance(value, data_type):
+                field = data_field
+                break
+        else:
+            raise TypeError("Unsupported data type '{}'.  (Supported: "
+                            "int, long, float, str and bool)".format(value))
+    setattr(pb, field, value)
+
+
+def _dtype_field(dtype):
+    """Returns the field of the 'data' oneof of a dtype"""
+    try:
+        return _DTYPE_FIELDS[dtype]
+    except KeyError:
+        raise ValueError("Unsupported dtype '{}'.  (Supported: {})".format(
+            dtype, ", ".join(sorted(_DTYPE_FIELDS))))
+
+
+def _wrap_metric(pb, configs):
+    """Wraps a received metric (pb) whose config is decoded by configs, a
+    :py:class:`~snap_plugin.v1.config_map._ConfigDecoder` shared by the
+    metrics of a request"""
+    metric = Metric(pb=pb)
+    metric._configs = configs
+    return metric
 
 
 class Metric(object):
@@ -39,7 +122,8 @@ class Metric(object):
         tags (:obj:`dict`): metric tags (key/value pairs)
         config (:py:class:`~snap_plugin.v1.config_map.ConfigMap`): config for
             metric (key/value pairs)
-        timestamp (:obj:`float`): metric timestamp (see time.time())
+        timestamp (:obj:`float`): metric timestamp (see time.time()),
+            defaults to the time the metric is created
         unit (:obj:`str`): metric unit
         description (:obj:`str`): metric description
 
@@ -51,36 +135,27 @@ class Metric(object):
         TypeError: Provided with arguments of wrong type, constructor will raise TypeError
 
     """
+    __slots__ = ("_pb", "_config_map", "_namespace_list", "_timestamp_time",
+                 "_configs")
+
     def __init__(self, namespace=[], version=None, tags={}, config={},
-                 timestamp=time.time(), unit="", description="", **kwargs):
+                 timestamp=None, unit="", description="", **kwargs):
+        # the config, namespace and timestamp wrappers are created when they
+        # are first accessed
+        self._config_map = None
+        self._namespace_list = None
+        self._timestamp_time = None
+        # decoder shared by the metrics of a request (see _wrap_metric)
+        self._configs = None
         if "pb" in kwargs:
+            # received metrics are wrapped as they are
             self._pb = kwargs.get("pb")
-            self._config = ConfigMap(pb=self._pb.Config)
-            self._namespace = Namespace(pb=self._pb.Namespace)
-            self._timestamp = Timestamp(pb=self._pb.Timestamp)
-            if self._pb.HasField("int32_data"):
-                self._data_type = int
-            elif self._pb.HasField("int64_data"):
-                self._data_type = int
-            elif self._pb.HasField("uint32_data"):
-                self._data_type = int
-            elif self._pb.HasField("uint64_data"):
-                self._data_type = int
-            elif self._pb.HasField("float64_data"):
-                self._data_type = float
-            elif self._pb.HasField("float32_data"):
-                self._data_type = float
-            elif self._pb.HasField("string_data"):
-                self._data_type = str
-            elif self._pb.HasField("bool_data"):
-                self._data_type = bool
-            elif self._pb.HasField("bytes_data"):
-                self._data_type = bytes
             return
         self._pb = PbMetric()
         # namespace
         if isinstance(namespace, (list, tuple)):
-            self._namespace = Namespace(self._pb.Namespace, *namespace)
+            if namespace:
+                Namespace(self._pb.Namespace, *namespace)
         else:
             raise TypeError("The 'namespace', kwarg requires a list or tuple "
                             "of :obj:`snap_plugin.v1.namespace_element.NamespaceElement.  (given: `{}`)"
@@ -102,21 +177,49 @@ class Metric(object):
             raise TypeError("The 'tags' kwarg requires a dict of strings. "
                             "(given: `{}`)".format(type(tags)))
         # configs
-        self._set_config(config)
+        if config:
+            self._set_config(config)
+        elif not isinstance(config, (list, tuple, dict, ConfigMap)):
+            raise TypeError("The 'config' kwarg requires a list, tuple or"
+                            " dict.  (given: `{}`)".format(type(config)))
 
         # timestamp
-        self._timestamp = Timestamp(pb=self._pb.Timestamp,
-                                    time=timestamp)
+        if timestamp is None:
+            _set_time_ns(self._pb.Timestamp, _time_ns())
+        else:
+            _set_time(self._pb.Timestamp, timestamp)
 
         # this was added as a stop gap until
         # https://github.com/intelsdi-x/snap/issues/1394 lands
-        self._last_advertised_time = Timestamp(pb=self._pb.LastAdvertisedTime,
-                                               time=timestamp)
+        self._pb.LastAdvertisedTime.CopyFrom(self._pb.Timestamp)
         # data
         if "data" in kwargs:
             self.data = kwargs.get("data")
-        else:
-            self._data_type = None
+
+    @property
+    def _namespace(self):
+        if self._namespace_list is None:
+            self._namespace_list = Namespace(self._pb.Namespace)
+        return self._namespace_list
+
+    @property
+    def _config(self):
+        if self._config_map is None:
+            if self._configs is None:
+                self._config_map = ConfigMap(pb=self._pb.Config)
+            else:
+                self._config_map = self._configs.config_map(self._pb.Config)
+        return self._config_map
+
+    @property
+    def _timestamp(self):
+        if self._timestamp_time is None:
+            self._timestamp_time = Timestamp._from_pb(self._pb.Timestamp)
+        return self._timestamp_time
+
+    @property
+    def _data_type(self):
+        return _DATA_FIELDS[self._pb.WhichOneof("data")][0]
 
     @property
     def namespace(self):
@@ -128,6 +231,21 @@ class Metric(object):
         """
         return self._namespace
 
+    @property
+    def namespace_key(self):
+        """Canonical key of the metric namespace.
+
+        The key is the tuple of the namespace element values.  The values and
+        the key are interned in a plugin wide table so the keys of equal
+        namespaces are the same object, across metrics and requests.  The key
+        is cached by :py:attr:`namespace` (see
+        :py:attr:`snap_plugin.v1.namespace.Namespace.key`).
+
+        Returns:
+            :obj:`tuple` of :obj:`str`
+        """
+        return self._namespace.key
+
     @property
     def version(self):
         """Metric version.
@@ -177,6 +295,25 @@ class Metric(object):
     def timestamp(self, value):
         self._timestamp.set(value)
 
+    @property
+    def timestamp_ns(self):
+        """Time in nanoseconds since Epoch.
+
+        Unlike :py:attr:`timestamp` it is exact.
+
+        Args:
+            value (:obj:`int`): time in nanoseconds since Epoch (see
+                time.time_ns())
+
+        Returns:
+            `int`: time in nanoseconds since Epoch
+        """
+        return self._timestamp.time_ns
+
+    @timestamp_ns.setter
+    def timestamp_ns(self, value):
+        self._timestamp.set_ns(value)
+
     @property
     def tags(self):
         """Metric tags.
@@ -195,6 +332,18 @@ class Metric(object):
         self._pb.Tags.clear()
         self._pb.Tags.update(value)
 
+    @property
+    def tags_key(self):
+        """Canonical key of the metric tags.
+
+        The key is the sorted tuple of the tag items whose keys and values are
+        interned like the elements of :py:attr:`namespace_key`.
+
+        Returns:
+            :obj:`tuple` of :obj:`tuple`: Example: (("tag-key", "tag-value"),)
+        """
+        return _tags_key(self._pb.Tags)
+
     @property
     def unit(self):
         """Metric unit
@@ -229,15 +378,7 @@ class Metric(object):
 
     @property
     def data_type(self):
-        if self._data_type == int:
-            return "integer"
-        if self._data_type == float:
-            return "float"
-        if self._data_type == str:
-            return "string"
-        if self._data_type == bool:
-            return "bool"
-        return "unknown"
+        return _DATA_FIELDS[self._pb.WhichOneof("data")][1]
 
     @property
     def data(self):
@@ -254,60 +395,84 @@ class Metric(object):
             :obj:`TypeError`
 
         """
-        if self._data_type == int:
-            if self._pb.HasField("int64_data"):
-                return self._pb.int64_data
-            if self._pb.HasField("int32_data"):
-                return self._pb.int32_data
-            if self._pb.HasField("uint64_data"):
-                return self._pb.uint64_data
-            if self._pb.HasField("uint32_data"):
-                return self._pb.uint32_data
-        elif self._data_type == float:
-            if self._pb.HasField("float32_data"):
-                return self._pb.float32_data
-            if self._pb.HasField("float64_data"):
-                return self._pb.float64_data
-        elif self._data_type == str:
-            return self._pb.string_data
-        elif self._data_type == bool:
-            return self._pb.bool_data
-        elif self._data_type == bytes:
-            return self._pb.bytes_data
-        return None
+        field = self._pb.WhichOneof("data")
+        if field is None:
+            return None
+        return getattr(self._pb, field)
 
     @data.setter
     def data(self, value):
-        if isinstance(value, bool):
-            self._data_type = bool
-            self._pb.bool_data = value
-        elif isinstance(value, int):
-            self._data_type = int
-            self._pb.int64_data = value
-        elif isinstance(value, float):
-            self._data_type = float
-            self._pb.float64_data = value
-        elif isinstance(value, basestring):
-            self._data_type = str
-            self._pb.string_data = value
-        elif isinstance(value, bytes):
-            self._data_type = bytes
-            self._pb.bytes_data = value
-        else:
-            raise TypeError("Unsupported data type '{}'.  (Supported: "
-                            "int, long, float, str and bool)".format(value))
+        _set_data(self._pb, value)
+
+    def set_data(self, value, dtype):
+        """Sets the data to a value of the given type.
+
+        Unlike the :py:attr:`data` setter the type isn't guessed from the
+        value, which allows sending 32-bit and unsigned values.
+
+        Args:
+            value: data
+            dtype (:obj:`str`): one of 'int32', 'int64', 'uint32', 'uint64',
+                'float32', 'float64', 'string', 'bool' or 'bytes'
+
+        Raises:
+            :obj:`ValueError`: Unknown dtype
+        """
+        setattr(self._pb, _dtype_field(dtype), value)
+
+    def set_int32(self, value):
+        """Sets the data to a 32-bit signed integer (int32_data)."""
+        self._pb.int32_data = value
+
+    def set_int64(self, value):
+        """Sets the data to a 64-bit signed integer (int64_data)."""
+        self._pb.int64_data = value
+
+    def set_uint32(self, value):
+        """Sets the data to a 32-bit unsigned integer (uint32_data)."""
+        self._pb.uint32_data = value
+
+    def set_uint64(self, value):
+        """Sets the data to a 64-bit unsigned integer (uint64_data)."""
+        self._pb.uint64_data = value
+
+    def set_float32(self, value):
+        """Sets the data to a single precision float (float32_data)."""
+        self._pb.float32_data = value
+
+    def set_float64(self, value):
+        """Sets the data to a double precision float (float64_data)."""
+        self._pb.float64_data = value
+
+    def set_string(self, value):
+        """Sets the data to a string (string_data)."""
+        self._pb.string_data = value
+
+    def set_bool(self, value):
+        """Sets the data to a boolean (bool_data)."""
+        self._pb.bool_data = value
+
+    def set_bytes(self, value):
+        """Sets the data to bytes (bytes_data)."""
+        self._pb.bytes_data = value
 
     @property
     def pb(self):
+        # the message may be changed by the caller, the cached namespace key
+        # is recomputed and the config entries decoded again
+        if self._namespace_list is not None:
+            self._namespace_list._changed()
+        if self._config_map is not None:
+            self._config_map._dict = None
         return self._pb
 
     def _set_config(self, config):
         if isinstance(config, (list, tuple)):
-            self._config = ConfigMap(pb=self._pb.Config, *config)
+            self._config_map = ConfigMap(pb=self._pb.Config, *config)
         elif isinstance(config, dict):
-            self._config = ConfigMap(pb=self._pb.Config, **config)
+            self._config_map = ConfigMap(pb=self._pb.Config, **config)
         elif isinstance(config, ConfigMap):
-            self._config = ConfigMap(config.items(), pb=self._pb.Config)
+            self._config_map = ConfigMap(config.items(), pb=self._pb.Config)
         else:
             raise TypeError("The 'config' kwarg requires a list, tuple or"
                             " dict.  (given: `{}`)".format(type(config)))
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import itertools
+from collections import namedtuple
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+from past.builtins import basestring
+
+from .config_map import _ConfigDecoder
+from .metric import (_DTYPE_FIELDS, Metric, _dtype_field, _set_data,
+                     _wrap_metric)
+from .namespace import Namespace
+from .plugin_pb2 import Metric as PbMetric, MetricsArg
+from .string_table import _namespace_key, _tags_key
+from .timestamp import _time_ns
+
+# typecode of 64-bit integer arrays, not available before python 3.3
+try:
+    array.array("q")
+    _INT64 = "q"
+except ValueError:
+    _INT64 = "l"
+
+Columns = namedtuple("Columns", ["value", "sec", "nsec", "namespace_id", "tags_id", "namespaces", "tags",
+                                 "meta_id", "metas"])
+Columns.__new__.__defaults__ = (None, None)
+Columns.__doc__ = """Columns of a :py:class:`MetricBatch`.
+
+Attributes:
+    value: data of each metric as float64, NaN for non numeric data
+    sec: seconds of the timestamp of each metric (int64)
+    nsec: nanoseconds of the timestamp of each metric (int64)
+    namespace_id: index of the namespace of each metric in `namespaces`
+        (int64)
+    tags_id: index of the tags of each metric in `tags` (int64)
+    namespaces (:obj:`list` of :obj:`tuple`): distinct namespaces, as
+        tuples of element values
+    tags (:obj:`list` of :obj:`dict`): distinct tags
+    meta_id: index of the metadata of each metric in `metas` (int64),
+        None for metrics initialised as by
+        :py:class:`~snap_plugin.v1.metric.Metric`
+    metas (:obj:`list` of :py:class:`~snap_plugin.v1.metric.Metric`):
+        distinct metadata of the metrics, their version, unit, description,
+        config and the names and descriptions of their namespace elements
+
+The columns are NumPy arrays when NumPy is installed, :obj:`array.array`
+otherwise.
+"""
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _wrap_metrics(pb, batch):
+    """Wraps a repeated field of protobuf metrics in a MetricBatch or a list
+    of metrics"""
+    if batch:
+        return MetricBatch(pb)
+    configs = _ConfigDecoder()
+    return [_wrap_metric(m, configs) for m in pb]
+
+
+class MetricBatch(Sequence):
+    """MetricBatch is a lazy, sequence-like view over a batch of metrics.
+
+    Instead of wrapping every metric of a request up front the batch wraps a
+    metric in a :py:class:`~snap_plugin.v1.metric.Metric` only when it is read.
+    Changes made through the returned wrappers are written directly to the
+    underlying protobuf so a plugin can return the batch it was given and the
+    reply is built from the same repeated field.
+
+    Args:
+        pb (:obj:`RepeatedCompositeFieldContainer`): repeated field of
+            protobuf metrics (e.g. `MetricsArg.metrics`)
+
+    Example:
+    ::
+        def collect(self, metrics):
+            for metric in metrics:
+                metric.data = 42
+            return metrics
+
+    Also see:
+        - :py:class:`snap_plugin.v1.plugin.Meta` its attribute `batch`
+    """
+
+    def __init__(self, pb):
+        self._pb = pb
+        # identical configs of the batch are decoded once
+        self._configs = _ConfigDecoder()
+
+    def __len__(self):
+        return len(self._pb)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [_wrap_metric(m, self._configs) for m in self._pb[index]]
+        return _wrap_metric(self._pb[index], self._configs)
+
+    def __iter__(self):
+        for m in self._pb:
+            yield _wrap_metric(m, self._configs)
+
+    def __repr__(self):
+        return "MetricBatch(len={})".format(len(self._pb))
+
+    def append(self, metric):
+        """Appends a copy of the given metric to the end of the batch.
+
+        Args:
+            metric (:py:class:`~snap_plugin.v1.metric.Metric`): metric
+        """
+        self._pb.add().CopyFrom(metric.pb)
+
+    def add(self):
+        """Adds an empty metric to the end of the batch and returns it.
+
+        Returns:
+            :py:class:`~snap_plugin.v1.metric.Metric`
+        """
+        return Metric(pb=self._pb.add())
+
+    def stamp(self, time_ns=None):
+        """Sets the timestamp of every metric of the batch to the same time.
+
+        Args:
+            time_ns (:obj:`int`): time in nanoseconds since Epoch, defaults to
+                a single read of the clock
+
+        Example:
+        ::
+            def collect(self, metrics):
+                metrics.assign(self.read_values())
+                metrics.stamp()
+                return metrics
+        """
+        if time_ns is None:
+            time_ns = _time_ns()
+        sec, nsec = divmod(time_ns, 10 ** 9)
+        for pb in self._pb:
+            pb.Timestamp.sec = sec
+            pb.Timestamp.nsec = nsec
+
+    def assign(self, values, dtype=None):
+        """Sets the data of the metrics of the batch in one pass.
+
+        Args:
+            values (:obj:`list` or :obj:`numpy.ndarray`): one value per
+                metric of the batch
+            dtype (:obj:`str`): type of the values, one of 'int32', 'int64',
+                'uint32', 'uint64', 'float32', 'float64', 'string', 'bool' or
+                'bytes'.  When not given the dtype of a NumPy array is used if
+                it is one of those, otherwise the type of each value is
+                guessed as by the :py:attr:`~snap_plugin.v1.metric.Metric.data`
+                setter.
+
+        Raises:
+            :obj:`ValueError`: The number of values doesn't match the number
+                of metrics or the dtype isn't supported
+        """
+        if len(values) != len(self._pb):
+            raise ValueError("Expected {} values (given={})".format(len(self._pb), len(values)))
+        if dtype is None:
+            name = getattr(getattr(values, "dtype", None), "name", None)
+            if name in _DTYPE_FIELDS:
+                dtype = name
+        # NumPy arrays are converted to python scalars in one call
+        if hasattr(values, "tolist"):
+            values = values.tolist()
+        if dtype is None:
+            for pb, value in zip(self._pb, values):
+                _set_data(pb, value)
+            return
+        field = _dtype_field(dtype)
+        for pb, value in zip(self._pb, values):
+            setattr(pb, field, value)
+
+    def to_columns(self):
+        """Returns the values, timestamps, namespaces and tags of the metrics
+        of the batch as columns.
+
+        Namespaces and tags are replaced by indexes in tables of their
+        distinct values so metrics can be grouped by comparing integers.
+
+        Returns:
+            :py:class:`Columns`
+
+        Example:
+        ::
+            def process(self, metrics, config):
+                columns = metrics.to_columns()
+                # average of each namespace (with NumPy)
+                sums = numpy.bincount(columns.namespace_id, weights=columns.value)
+                counts = numpy.bincount(columns.namespace_id)
+                ...
+        """
+        value = array.array("d")
+        sec = array.array(_INT64)
+        nsec = array.array(_INT64)
+        namespace_id = array.array(_INT64)
+        tags_id = array.array(_INT64)
+        meta_id = array.array(_INT64)
+        namespaces = {}
+        tags = {}
+        metas = {}
+        nan = float("nan")
+        for pb in self._pb:
+            field = pb.WhichOneof("data")
+            if field is None or field in ("string_data", "bytes_data"):
+                value.append(nan)
+            else:
+                value.append(getattr(pb, field))
+            sec.append(pb.Timestamp.sec)
+            nsec.append(pb.Timestamp.nsec)
+            namespace = _namespace_key(pb.Namespace)
+            namespace_id.append(namespaces.setdefault(namespace, len(namespaces)))
+            key = _tags_key(pb.Tags)
+            tags_id.append(tags.setdefault(key, len(tags)))
+            key = (pb.Version, pb.Unit, pb.Description, pb.Config.SerializeToString(),
+                   tuple((e.Name, e.Description) for e in pb.Namespace))
+            meta = metas.get(key)
+            if meta is None:
+                meta = metas[key] = (len(metas), _meta(pb))
+            meta_id.append(meta[0])
+        numpy = _numpy()
+        if numpy is not None:
+            value, sec, nsec, namespace_id, tags_id, meta_id = (
+                numpy.frombuffer(column, dtype=column.typecode) if len(column) else
+                numpy.array([], dtype=column.typecode)
+                for column in (value, sec, nsec, namespace_id, tags_id, meta_id))
+        return Columns(value, sec, nsec, namespace_id, tags_id,
+                       sorted(namespaces, key=namespaces.get),
+                       [dict(t) for t in sorted(tags, key=tags.get)],
+                       meta_id, [m for _, m in sorted(metas.values(), key=lambda m: m[0])])
+
+    @classmethod
+    def from_columns(cls, columns, dtype="float64"):
+        """Returns a batch of new metrics built from columns.
+
+        The metrics are initialised from their metadata in `metas` or, when
+        the columns have none, as by :py:class:`~snap_plugin.v1.metric.Metric`.
+
+        Args:
+            columns (:py:class:`Columns`): columns of the metrics, the
+                elements of `namespaces` can be strings or
+                :py:class:`~snap_plugin.v1.namespace_element.NamespaceElement`
+            dtype (:obj:`str`): type of the values (see :py:meth:`assign`)
+
+        Returns:
+            :py:class:`MetricBatch`
+        """
+        from snap_plugin.v1 import PLUGIN_VERSION
+        batch = cls(MetricsArg().metrics)
+        namespaces = columns.namespaces
+        tags = columns.tags
+        metas = columns.metas
+        meta_ids = columns.meta_id
+        if meta_ids is None:
+            meta_ids = itertools.repeat(None)
+        else:
+            meta_ids = _tolist(meta_ids)
+        for sec, nsec, namespace_id, tags_id, meta_id in zip(
+                _tolist(columns.sec), _tolist(columns.nsec),
+                _tolist(columns.namespace_id), _tolist(columns.tags_id), meta_ids):
+            pb = batch._pb.add()
+            namespace = namespaces[namespace_id]
+            if meta_id is None:
+                pb.Version = PLUGIN_VERSION
+                Namespace(pb.Namespace, *namespace)
+            else:
+                pb.CopyFrom(metas[meta_id].pb)
+                if len(pb.Namespace) == len(namespace) and all(
+                        isinstance(value, basestring) for value in namespace):
+                    # the names and descriptions of the elements are kept
+                    for element, value in zip(pb.Namespace, namespace):
+                        element.Value = value
+                else:
+                    del pb.Namespace[:]
+                    Namespace(pb.Namespace, *namespace)
+            pb.Tags.update(tags[tags_id])
+            pb.Timestamp.sec = sec
+            pb.Timestamp.nsec = nsec
+            pb.LastAdvertisedTime.CopyFrom(pb.Timestamp)
+        batch.assign(columns.value, dtype)
+        return batch
+
+    @property
+    def pb(self):
+        "Returns the wrapped repeated field of protobuf metrics."
+        return self._pb
+
+
+def _meta(pb):
+    """Returns a metric holding the metadata of a metric (pb)"""
+    meta = PbMetric(Version=pb.Version, Unit=pb.Unit, Description=pb.Description)
+    meta.Config.CopyFrom(pb.Config)
+    meta.Namespace.extend(pb.Namespace)
+    return Metric(pb=meta)
+
+
+def _tolist(column):
+    if hasattr(column, "tolist"):
+        return column.tolist()
+    return column
+
+
+def _metrics_pb(metrics):
+    """Returns protobuf metrics for a list of metrics or a MetricBatch"""
+    if isinstance(metrics, MetricBatch):
+        return metrics.pb
+    return [m.pb for m in metrics]
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import json
+import math
+
+from .metric import Metric
+from .metric_batch import MetricBatch
+from .plugin_pb2 import Metric as PbMetric
+from .string_table import _namespace_key, _tags_key
+
+# number of namespaces and tags whose encoding is kept
+_MAX_FRAGMENTS = 4096
+
+_quote = json.encoder.encode_basestring_ascii
+
+
+def _json_float(value):
+    # same as the protobuf JSON mapping for values JSON can't represent
+    if math.isnan(value):
+        return '"NaN"'
+    if math.isinf(value):
+        return '"Infinity"' if value > 0 else '"-Infinity"'
+    return repr(value)
+
+
+def _json_bytes(value):
+    return '"' + base64.b64encode(value).decode("ascii") + '"'
+
+
+def _json_bool(value):
+    return "true" if value else "false"
+
+
+def _json_int(value):
+    return str(value)
+
+
+def _json_string(value):
+    return _quote(value)
+
+
+# encoding of the values of each field of the data oneof
+_JSON_DATA = {
+    "float32_data": _json_float,
+    "float64_data": _json_float,
+    "int32_data": _json_int,
+    "int64_data": _json_int,
+    "uint32_data": _json_int,
+    "uint64_data": _json_int,
+    "bool_data": _json_bool,
+    "string_data": _json_string,
+    "bytes_data": _json_bytes,
+}
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+class MetricEncoder(object):
+    """Encodes metrics for publishers writing them to files or sockets.
+
+    Two formats are supported:
+
+        - json: one compact JSON object per line, e.g.
+          ``{"namespace":["intel","procfs","load"],"version":1,
+          "timestamp":1500000000123456789,"tags":{"host":"node1"},
+          "unit":"","description":"","data":0.5}`` where the timestamp is in
+          nanoseconds since Epoch and NaN, Infinity and bytes are encoded as
+          in the protobuf JSON mapping
+        - binary: the protobuf encoding of each metric prefixed by its length
+          (varint), which :py:meth:`decode` reads back
+
+    The encoding of namespaces and tags, which repeat over metrics and
+    requests, is cached.
+
+    Args:
+        format (:obj:`str`): 'json' or 'binary'
+
+    Example:
+    ::
+        encoder = MetricEncoder()
+
+        def publish(self, metrics, config):
+            self.file.writelines(encoder.encode_batch(metrics))
+
+    """
+
+    def __init__(self, format="json"):
+        if format == "json":
+            self._encode = self._encode_json
+        elif format == "binary":
+            self._encode = self._encode_binary
+        else:
+            raise ValueError("Unknown format '{}' (json or binary)".format(format))
+        self.format = format
+        self._namespaces = {}
+        self._tags = {}
+
+    def encode(self, metric):
+        """Returns the encoding of a metric.
+
+        Args:
+            metric (:py:class:`~snap_plugin.v1.metric.Metric` or
+                :obj:`plugin_pb2.Metric`): metric
+
+        Returns:
+            :obj:`bytes`
+        """
+        if isinstance(metric, Metric):
+            metric = metric.pb
+        return self._encode(metric)
+
+    def encode_batch(self, metrics):
+        """Returns the encodings of metrics, ready for `writelines`.
+
+        Args:
+            metrics (:obj:`list` of :py:class:`~snap_plugin.v1.metric.Metric`
+                or :py:class:`~snap_plugin.v1.metric_batch.MetricBatch`):
+                metrics
+
+        Returns:
+            :obj:`list` of :obj:`bytes`
+        """
+        if isinstance(metrics, MetricBatch):
+            return [self._encode(pb) for pb in metrics.pb]
+        encode = self._encode
+        return [encode(m.pb if isinstance(m, Metric) else m) for m in metrics]
+
+    def decode(self, data):
+        """Returns the metrics of binary encodings.
+
+        Args:
+            data (:obj:`bytes`): concatenated binary encodings
+
+        Returns:
+            :obj:`list` of :py:class:`~snap_plugin.v1.metric.Metric`
+
+        Raises:
+            ValueError: The encoder's format is not binary or the data is
+                truncated
+        """
+        if self.format != "binary":
+            raise ValueError("Only the binary format can be decoded")
+        data = bytearray(data)
+        metrics = []
+        pos = 0
+        while pos < len(data):
+            length = shift = 0
+            while True:
+                if pos >= len(data):
+                    raise ValueError("Truncated metric length")
+                byte = data[pos]
+                pos += 1
+                length |= (byte & 0x7f) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            if pos + length > len(data):
+                raise ValueError("Truncated metric")
+            metrics.append(Metric(pb=PbMetric.FromString(bytes(data[pos:pos + length]))))
+            pos += length
+        return metrics
+
+    def _encode_binary(self, pb):
+        data = pb.SerializeToString()
+        return _varint(len(data)) + data
+
+    def _encode_json(self, pb):
+        field = pb.WhichOneof("data")
+        if field is None:
+            data = "null"
+        else:
+            data = _JSON_DATA[field](getattr(pb, field))
+        return "".join((
+            '{"namespace":', self._namespace(pb.Namespace),
+            ',"version":', str(pb.Version),
+            ',"timestamp":', str(pb.Timestamp.sec * 10 ** 9 + pb.Timestamp.nsec),
+            ',"tags":', self._tags_json(pb.Tags),
+            ',"unit":', _quote(pb.Unit),
+            ',"description":', _quote(pb.Description),
+            ',"data":', data, '}\n')).encode("ascii")
+
+    def _namespace(self, pb):
+        key = _namespace_key(pb)
+        encoded = self._namespaces.get(key)
+        if encoded is None:
+            encoded = "[" + ",".join(_quote(v) for v in key) + "]"
+            if len(self._namespaces) >= _MAX_FRAGMENTS:
+                self._namespaces = {}
+            self._namespaces[key] = encoded
+        return encoded
+
+    def _tags_json(self, pb):
+        if not pb:
+            return "{}"
+        key = _tags_key(pb)
+        encoded = self._tags.get(key)
+        if encoded is None:
+            encoded = "{" + ",".join(_quote(k) + ":" + _quote(v) for k, v in key) + "}"
+            if len(self._tags) >= _MAX_FRAGMENTS:
+                self._tags = {}
+            self._tags[key] = encoded
+        return encoded
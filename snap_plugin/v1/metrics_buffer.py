@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import random
+import threading
+import time
+# It is needed to prevent ImportError in python 3.x, caused by renaming package Queue to queue
+try:
+    import Queue as queue
+except ImportError:
+    import queue as queue
+
+from .plugin import OverflowPolicy
+
+
+class _MetricsBuffer(object):
+    """Bounded buffer of metrics between a stream collector and the stream.
+
+    When the buffer is full the overflow policy decides what happens to a new
+    metric:
+
+        - block: the producer waits until there is room in the buffer
+        - drop_oldest: the oldest buffered metric is dropped
+        - drop_newest: the new metric is dropped
+        - sample: the new metric replaces a random buffered metric so the
+          buffer holds a uniform sample of the metrics offered while it was
+          full
+
+    Args:
+        capacity (:obj:`int`): maximum number of buffered metrics
+        policy (:py:class:`snap_plugin.v1.plugin.OverflowPolicy`): overflow
+            policy
+    Attributes:
+        on_room (:obj:`callable`): called when a metric is removed from the
+            buffer or the buffer is closed
+
+    """
+
+    def __init__(self, capacity, policy=OverflowPolicy.block):
+        if capacity < 1:
+            raise ValueError("Buffer capacity should be at least 1 (given={})".format(capacity))
+        self.capacity = capacity
+        self.policy = policy
+        self.dropped = 0
+        self._items = collections.deque()
+        self._closed = False
+        # metrics offered since the buffer became full, used for sampling
+        self._offered = 0
+        self.on_room = None
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, metric):
+        """Adds a metric to the buffer applying the overflow policy when full.
+
+        Metrics added after the buffer is closed are dropped.
+        """
+        with self._cond:
+            if self.policy == OverflowPolicy.block:
+                while len(self._items) >= self.capacity and not self._closed:
+                    self._cond.wait()
+            self._put(metric)
+
+    def put_nowait(self, metric):
+        """Adds a metric to the buffer without waiting for room.
+
+        Returns:
+            :obj:`bool`: False when the buffer is full and its policy is
+            `block`, the metric being neither added nor dropped
+        """
+        with self._cond:
+            if (self.policy == OverflowPolicy.block and not self._closed and
+                    len(self._items) >= self.capacity):
+                return False
+            self._put(metric)
+            return True
+
+    def _put(self, metric):
+        """Adds a metric applying the overflow policy, the lock being held"""
+        if self._closed:
+            self.dropped += 1
+            return
+        if len(self._items) < self.capacity:
+            self._offered = 0
+            self._items.append(metric)
+        elif self.policy == OverflowPolicy.drop_oldest:
+            self._items.popleft()
+            self._items.append(metric)
+            self.dropped += 1
+        elif self.policy == OverflowPolicy.drop_newest:
+            self.dropped += 1
+        else:
+            self._offered += 1
+            index = random.randrange(self.capacity + self._offered)
+            if index < self.capacity:
+                self._items[index] = metric
+            self.dropped += 1
+        self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest metric in the buffer.
+
+        Args:
+            timeout (:obj:`float`): seconds to wait for a metric, None waits
+                until a metric is available
+
+        Raises:
+            :obj:`queue.Empty`: No metric was available within the timeout
+        """
+        with self._cond:
+            if timeout is not None:
+                end = time.time() + timeout
+            while not self._items:
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._cond.wait(remaining)
+            metric = self._items.popleft()
+            self._cond.notify_all()
+        if self.on_room is not None:
+            self.on_room()
+        return metric
+
+    def close(self):
+        """Closes the buffer releasing blocked producers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self.on_room is not None:
+            self.on_room()
+
+    @property
+    def closed(self):
+        return self._closed
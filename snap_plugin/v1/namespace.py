@@ -19,6 +19,9 @@
 from past.builtins import basestring
 
 from .namespace_element import NamespaceElement
+from .string_table import _namespace_key
+
+_SEPARATORS = ["/", "|", "%", ":", "-", ";", "_", "^", ">", "<", "+", "=", "&", "㊽", "Ä", "大", "小", "ᵹ", "☍", "ヒ"]
 
 
 class Namespace(object):
@@ -30,10 +33,22 @@ class Namespace(object):
             or :obj:`list` of `strings`):
             namespace elements
 
+    Namespaces compare and hash by their :py:attr:`key`, which is cached
+    along with the rendered namespace and recomputed after the namespace or
+    one of its elements is changed through this object or after the message
+    of its metric is accessed (see
+    :py:attr:`snap_plugin.v1.metric.Metric.pb`).  Changes made to a message
+    wrapped by a Namespace through any other reference are not seen by the
+    cache and must not be made.
+
     """
 
+    __slots__ = ("_pb", "_key", "_str")
+
     def __init__(self, pb, *elements):
         self._pb = pb
+        self._key = None
+        self._str = None
         for nse in elements:
             if isinstance(nse, basestring):
                 self.add_static_element(nse)
@@ -42,31 +57,75 @@ class Namespace(object):
                     self.add(nse)
 
     def __getitem__(self, index):
-        return NamespaceElement(pb=self._pb.__getitem__(index))
+        element = NamespaceElement(pb=self._pb.__getitem__(index))
+        element._owner = self
+        return element
 
     def __delitem__(self, index):
+        self._changed()
         return self._pb.__delitem__(index)
 
     def __len__(self):
         return len(self._pb)
 
     def __repr__(self):
-        separators = ["/", "|", "%", ":", "-", ";", "_", "^", ">", "<", "+", "=", "&", "㊽", "Ä", "大", "小", "ᵹ", "☍", "ヒ"]
+        if self._str is None:
+            self._str = self.join()
+        return self._str
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        if isinstance(other, Namespace):
+            return self.key == other.key
+        if isinstance(other, tuple):
+            return self.key == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    @property
+    def key(self):
+        """Canonical key of the namespace, the tuple of its element values
+        interned like :py:attr:`snap_plugin.v1.metric.Metric.namespace_key`.
+
+        Returns:
+            :obj:`tuple` of :obj:`str`
+        """
+        if self._key is None:
+            self._key = _namespace_key(self._pb)
+        return self._key
+
+    def join(self, separator=None):
+        """Returns the namespace rendered as a string.
+
+        Args:
+            separator (:obj:`str`): separator of the elements, defaults to the
+                first of the usual separators not found in any element, the
+                rendering is then prefixed with the separator (see repr)
+
+        Returns:
+            :obj:`str`
+        """
+        key = self.key
+        if not key:
+            return ""
+        if separator is not None:
+            return separator.join(key)
+        # the separators are single characters so looking them up in the
+        # concatenated values is the same as looking them up in every value
+        values = "".join(key)
         separator = "\U0001f422"
-        for sep in separators:
-            found = False
-            for n in self:
-                if sep in n.value:
-                    found = True
-                    break
-            if not found:
+        for sep in _SEPARATORS:
+            if sep not in values:
                 separator = sep
                 break
-
-        result = separator
-        for n in self:
-            result += n.value + separator
-        return result[:-1]
+        return separator + separator.join(key)
 
     def add_dynamic_element(self, name, description):
         """Adds a dynamic namespace element to the end of the Namespace.
@@ -86,6 +145,7 @@ class Namespace(object):
         Returns:
             :py:class:`snap_plugin.v1.namespace.Namespace`
         """
+        self._changed()
         self._pb.add(Name=name, Description=description, Value="*")
         return self
 
@@ -104,6 +164,7 @@ class Namespace(object):
         Returns:
             :py:class:`snap_plugin.v1.namespace.Namespace`
         """
+        self._changed()
         self._pb.add(Value=value)
         return self
 
@@ -117,9 +178,15 @@ class Namespace(object):
         Args:
             **kwargs (optional): key=-1
         """
+        self._changed()
         return self._pb.pop(key)
 
     def add(self, namespace_element):
+        self._changed()
         self._pb.add(Value=namespace_element.value,
                      Name=namespace_element.name,
                      Description=namespace_element.description)
+
+    def _changed(self):
+        self._key = None
+        self._str = None
@@ -42,7 +42,11 @@ class NamespaceElement(object):
 
     """
 
+    __slots__ = ("_pb", "_owner")
+
     def __init__(self, name="", description="", value="", **kwargs):
+        # namespace whose cached key is reset when the value changes
+        self._owner = None
         if "pb" in kwargs:
             self._pb = kwargs.get("pb")
         else:
@@ -57,9 +61,8 @@ class NamespaceElement(object):
                 self._pb.Value = "*"
 
     def __getattr__(self, attr):
-        if attr in self.__dict__:
-            # this object has it
-            return getattr(self, attr)
+        if attr in ("_pb", "_owner"):
+            raise AttributeError(attr)
         # proxy to the wrapped object
         return getattr(self._pb, attr)
 
@@ -70,6 +73,8 @@ class NamespaceElement(object):
     @value.setter
     def value(self, value):
         self._pb.Value = value
+        if self._owner is not None:
+            self._owner._changed()
 
     @property
     def description(self):
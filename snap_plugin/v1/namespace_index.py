@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from past.builtins import basestring
+
+from .namespace import Namespace
+
+_STATIC, _DYNAMIC, _ANY = 0, 1, 2
+
+
+class _Node(object):
+    __slots__ = ("children", "dynamic", "any", "values")
+
+    def __init__(self):
+        self.children = {}
+        self.dynamic = None
+        self.any = None
+        self.values = []
+
+
+def _elements(namespace):
+    if isinstance(namespace, Namespace):
+        return namespace.key
+    return tuple(e if isinstance(e, basestring) else e.value for e in namespace)
+
+
+class NamespaceIndex(object):
+    """Index of values (handlers, config defaults, policies, ...) by namespace
+    pattern.
+
+    The elements of a pattern are either static, matching an equal element,
+    '*', matching any one element (dynamic element), or '**', matching any
+    number of elements including none.  Looking a namespace up walks a trie
+    of the patterns so its cost depends on the depth of the namespace rather
+    than on the number of patterns.
+
+    Example:
+    ::
+        index = NamespaceIndex()
+        index.add(("intel", "procfs", "**"), procfs_defaults)
+        index.add(("intel", "procfs", "*", "load"), load_handler)
+        index.lookup(metric.namespace)
+
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, pattern, value):
+        """Adds a value for a namespace pattern.
+
+        Args:
+            pattern (:obj:`tuple` of :obj:`str`,
+                :py:class:`~snap_plugin.v1.namespace.Namespace` or :obj:`list`
+                of :py:class:`~snap_plugin.v1.namespace_element.NamespaceElement`):
+                namespace pattern
+            value: the value returned for the namespaces matching the pattern
+        """
+        node = self._root
+        for element in _elements(pattern):
+            if element == "*":
+                if node.dynamic is None:
+                    node.dynamic = _Node()
+                node = node.dynamic
+            elif element == "**":
+                if node.any is None:
+                    node.any = _Node()
+                node = node.any
+            else:
+                node = node.children.setdefault(element, _Node())
+        node.values.append((self._len, value))
+        self._len += 1
+
+    def match(self, namespace):
+        """Returns the values of the patterns matching a namespace.
+
+        The values are ordered from the most specific pattern to the least
+        specific one, a static element being more specific than '*' which is
+        more specific than '**'.  Values of equally specific patterns are
+        returned in the order they were added.
+
+        Args:
+            namespace (:obj:`tuple` of :obj:`str`,
+                :py:class:`~snap_plugin.v1.namespace.Namespace` or :obj:`list`
+                of :py:class:`~snap_plugin.v1.namespace_element.NamespaceElement`):
+                namespace
+
+        Returns:
+            :obj:`list`
+        """
+        found = {}
+        self._match(self._root, _elements(namespace), 0, (), found)
+        return [value for _, _, value in sorted(
+            (rank, seq, value) for seq, (rank, value) in found.items())]
+
+    def lookup(self, namespace, default=None):
+        """Returns the value of the most specific pattern matching a namespace
+        or default when no pattern matches (see :py:meth:`match`)"""
+        values = self.match(namespace)
+        return values[0] if values else default
+
+    def _match(self, node, key, pos, rank, found):
+        if pos == len(key):
+            for seq, value in node.values:
+                # patterns with several '**' can match in more than one way
+                if seq not in found or rank < found[seq][0]:
+                    found[seq] = (rank, value)
+        else:
+            child = node.children.get(key[pos])
+            if child is not None:
+                self._match(child, key, pos + 1, rank + (_STATIC,), found)
+            if node.dynamic is not None:
+                self._match(node.dynamic, key, pos + 1, rank + (_DYNAMIC,), found)
+        if node.any is not None:
+            for end in range(pos, len(key) + 1):
+                self._match(node.any, key, end, rank + (_ANY,), found)
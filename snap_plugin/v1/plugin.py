@@ -18,6 +18,7 @@
 import argparse
 import json
 import logging
+import multiprocessing
 import platform
 import sys
 import time
@@ -28,16 +29,22 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 from past.builtins import basestring
 from socket import error as socket_error
 from timeit import default_timer as timer
-from threading import Thread
+from threading import BoundedSemaphore, Thread
 
 import grpc
 import six
 
-from .plugin_pb2 import GetConfigPolicyReply
+from .plugin_pb2 import GetConfigPolicyReply, MetricsArg
 from .config_map import ConfigMap
+from .metric_batch import MetricBatch
+from .namespace_index import NamespaceIndex
+from .process_pool import _ProcessPool
 
 LOG = logging.getLogger(__name__)
 
+# size of the gRPC worker pool used when neither Meta nor flags provide one
+_DEFAULT_MAX_WORKERS = 10
+
 
 class _Timer(object):
     """Timer for diagnostic timing"""
@@ -59,6 +66,118 @@ class _Timer(object):
         return "{:.3f} {}".format(float(elapsed), unit)
 
 
+class _SerializedReplyServer(object):
+    """Registers the handlers of a servicer on a gRPC server allowing them to
+    reply with messages serialized beforehand (:obj:`bytes`).
+
+    The methods replying with bytes are listed by
+    :py:meth:`snap_plugin.v1.plugin_proxy.PluginProxy._reply`, they reply with
+    messages when grpc's method handlers can't be rewritten.
+    """
+
+    def __init__(self, server):
+        self._server = server
+
+    def add_generic_rpc_handlers(self, handlers):
+        self._server.add_generic_rpc_handlers(
+            tuple(_SerializedReplyHandler(handler) for handler in handlers))
+
+
+class _SerializedReplyHandler(grpc.GenericRpcHandler):
+    """Wraps the response serializers of a handler to pass bytes through"""
+
+    def __init__(self, handler):
+        self._handler = handler
+
+    def service(self, handler_call_details):
+        method_handler = self._handler.service(handler_call_details)
+        if (method_handler is None or method_handler.response_serializer is None or
+                not hasattr(method_handler, "_replace")):
+            # the proxies reply with messages if _replace isn't available
+            return method_handler
+        serializer = method_handler.response_serializer
+
+        def serialize(message):
+            if isinstance(message, bytes):
+                return message
+            return serializer(message)
+        return method_handler._replace(response_serializer=serialize)
+
+
+class _LimitedRpcServer(object):
+    """Registers the handlers of a servicer on a gRPC server limiting the
+    number of concurrent calls of some of their methods.
+
+    A call made while its method is at its limit is rejected with
+    RESOURCE_EXHAUSTED, as gRPC rejects calls once the server's
+    `maximum_concurrent_rpcs` is reached.
+
+    Args:
+        server: gRPC server
+        limits (:obj:`tuple`): pairs of RPC name (e.g. 'CollectMetrics') and
+            maximum number of concurrent calls
+    """
+
+    def __init__(self, server, limits):
+        self._server = server
+        self._limits = limits
+
+    def add_generic_rpc_handlers(self, handlers):
+        self._server.add_generic_rpc_handlers(
+            tuple(_LimitedRpcHandler(handler, self._limits) for handler in handlers))
+
+
+class _LimitedRpcHandler(grpc.GenericRpcHandler):
+    """Wraps the behaviors of the limited methods of a handler"""
+
+    def __init__(self, handler, limits):
+        self._handler = handler
+        self._semaphores = dict((name, BoundedSemaphore(limit)) for name, limit in limits)
+
+    def service(self, handler_call_details):
+        method_handler = self._handler.service(handler_call_details)
+        # e.g. /rpc.Collector/CollectMetrics
+        semaphore = self._semaphores.get(handler_call_details.method.rsplit("/", 1)[-1])
+        if method_handler is None or semaphore is None or not hasattr(method_handler, "_replace"):
+            return method_handler
+        for kind in ("unary_unary", "unary_stream", "stream_unary", "stream_stream"):
+            behavior = getattr(method_handler, kind)
+            if behavior is not None:
+                limit = _limit_stream if method_handler.response_streaming else _limit
+                return method_handler._replace(**{kind: limit(behavior, semaphore)})
+        return method_handler
+
+
+def _acquire(semaphore, context):
+    if not semaphore.acquire(False):
+        context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Concurrent RPC limit exceeded!")
+
+
+def _limit(behavior, semaphore):
+    """Returns the behavior of a method rejecting calls once the calls in
+    progress hold every unit of `semaphore`"""
+    def limited(request, context):
+        _acquire(semaphore, context)
+        try:
+            return behavior(request, context)
+        finally:
+            semaphore.release()
+    return limited
+
+
+def _limit_stream(behavior, semaphore):
+    """Same as :py:func:`_limit` for a method streaming its replies, the call
+    is in progress until its stream ends"""
+    def limited(request, context):
+        _acquire(semaphore, context)
+        try:
+            for reply in behavior(request, context):
+                yield reply
+        finally:
+            semaphore.release()
+    return limited
+
+
 def _make_standalone_handler(preamble):
     """Class factory used so that preamble can be passed to :py:class:`_StandaloneHandler`
      without use of static members"""
@@ -163,6 +282,26 @@ class RoutingStrategy(Enum):
     config = 2
 
 
+class OverflowPolicy(Enum):
+    """Stream collector buffer overflow policies
+
+    Decide what happens to a metric streamed while the buffer between the
+    stream collector and the stream is full.
+
+    - block (default): The stream collector waits until there is room in the
+        buffer, in the buffers of all the streams sharing it.
+    - drop_oldest: The oldest buffered metric is dropped.
+    - drop_newest: The new metric is dropped.
+    - sample: The buffer keeps a uniform random sample of the metrics streamed
+        while it is full.
+
+    """
+    block = 0
+    drop_oldest = 1
+    drop_newest = 2
+    sample = 3
+
+
 class PluginType(Enum):
     """Plugin types """
     collector = 0
@@ -227,6 +366,100 @@ class Meta(object):
         rpc_type (:py:class:`RPCType`)> RPC type
         rpc_version (:obj:`int`): RPC version
         unsecure (:obj:`bool`): Unsecure
+        batch (:obj:`bool`): Pass metrics to the plugin as a lazy
+            :py:class:`~snap_plugin.v1.metric_batch.MetricBatch` instead of a
+            list of :py:class:`~snap_plugin.v1.metric.Metric` (default=False).
+        max_workers (:obj:`int` or :obj:`str`): Size of the gRPC worker pool.
+            'auto' sizes the pool by the number of CPU cores.  The pool is
+            never smaller than `concurrency_count` (default=10).  Can be
+            overridden by the '--max-workers' flag.
+        max_concurrent_rpcs (:obj:`int`): Maximum number of RPCs served
+            concurrently before new calls are rejected with
+            RESOURCE_EXHAUSTED.  `None` means no limit (default=None).  Can
+            be overridden by the '--max-concurrent-rpcs' flag.
+        rpc_concurrency_limits (:obj:`dict`): Maximum number of concurrent
+            calls of single RPCs by name, e.g. {'CollectMetrics': 4}, calls
+            beyond are rejected with RESOURCE_EXHAUSTED.  Not supported by
+            asyncio plugins (default=None).  Can be overridden by the
+            '--rpc-concurrency-limits' flag, e.g. 'CollectMetrics=4,Ping=1'.
+        process_pool (:obj:`int` or :obj:`str`): Number of worker processes
+            that collect (Collector) or process (Processor) calls are fanned
+            out to, 'auto' uses one per CPU core.  Requests are split in
+            chunks so the plugin must not rely on seeing all metrics of a
+            request in a single call.  `None` runs calls in the gRPC worker
+            threads (default=None).  Can be overridden by the
+            '--process-pool' flag.
+        stream_buffer_size (:obj:`int`): Number of metrics a stream collector
+            can buffer before `stream_overflow_policy` applies.  `None` uses
+            the MaxMetricsBuffer requested by the framework or 1000 if that
+            is not set (default=None).  Can be overridden by the
+            '--stream-buffer-size' flag.
+        stream_overflow_policy (:py:class:`OverflowPolicy`): What happens to
+            metrics streamed while the buffer is full (default=block).  Can be
+            overridden by the '--stream-overflow-policy' flag.
+        stream_max_latency (:obj:`float`): Maximum number of seconds a
+            streamed metric waits in a partial batch before the batch is
+            sent.  `None` uses the MaxCollectDuration requested by the
+            framework (default=None).  Can be overridden by the
+            '--stream-max-latency' flag.
+        stream_max_bytes (:obj:`int`): Serialized size in bytes at which a
+            batch of streamed metrics is sent even if it holds fewer than
+            MaxMetricsBuffer metrics.  `None` disables the threshold
+            (default=None).  Can be overridden by the '--stream-max-bytes'
+            flag.
+        catalog_cache_ttl (:obj:`float`): Number of seconds the replies to
+            GetMetricTypes are cached for, by config, so update_catalog is
+            not called again for the same config.  0 caches replies until
+            `invalidate_catalog` is called and `None` disables the cache
+            (default=None).  Used by Collector and StreamCollector plugins.
+        collect_cache (:obj:`bool`): Cache collected metrics by namespace and
+            config for `cache_ttl` so requests for the same metrics within
+            the TTL, or while they are being collected, don't call collect
+            again (default=False).  Used by Collector and AsyncCollector
+            plugins.
+        apply_config_policy (:obj:`bool`): Apply the plugin's config policy
+            to the configs received with requests: defaults are added, values
+            are converted to the type of their rule and limits and required
+            keys are checked, a request failing the checks is answered with
+            an error listing them.  The policy is compiled once so
+            `get_config_policy` must not change (default=False).
+        config_policy_cache (:obj:`bool`): Serialize the reply to
+            GetConfigPolicy once and return it to later requests instead of
+            calling `get_config_policy` again.  Plugins whose policy changes
+            call `invalidate_config_policy` or disable the cache
+            (default=True).
+        write_behind (:obj:`bool`): Acknowledge Publish requests once their
+            metrics are buffered and publish them from a background thread,
+            consecutive requests with the same config being coalesced in a
+            single `publish` call.  A flush failing after its retries is
+            dropped, which is logged and counted by the `dropped` attribute
+            of the proxy's `write_behind` buffer.
+            Not supported by asyncio publishers (default=False).
+        write_behind_buffer (:obj:`int`): Maximum number of buffered metrics,
+            Publish requests wait while the buffer is full (default=10000).
+        write_behind_flush_size (:obj:`int`): Number of buffered metrics
+            triggering a flush and maximum number of metrics coalesced in a
+            `publish` call (default=1000).
+        write_behind_flush_interval (:obj:`float`): Maximum number of seconds
+            metrics are buffered before they are flushed (default=1).
+        write_behind_retries (:obj:`int`): Number of times a failed flush is
+            retried (default=3).
+        write_behind_backoff (:obj:`float`): Seconds before the first retry
+            of a failed flush, doubled for every other retry (default=0.5).
+        write_behind_flush_timeout (:obj:`float`): Seconds the plugin waits
+            for the buffered metrics to be published when it is stopped,
+            the ones left are then spilled or dropped, `None` waits until
+            they are published (default=10).
+        write_behind_spill_dir (:obj:`str`): Directory of an on-disk queue
+            the write-behind buffer spills to: requests arriving while the
+            buffer is full, and the ones following them, are appended to it
+            instead of waiting and failed flushes are appended to it instead
+            of being dropped.  Spilled requests are replayed in order, until
+            the sink accepts them, and are kept across restarts.  `None`
+            disables spilling (default=None).
+        write_behind_spill_size (:obj:`int`): Maximum size in bytes of the
+            spill queue's files, once reached the write-behind buffer waits
+            and drops as without spilling (default=1GiB).
     """
     def __init__(self,
                  type,
@@ -238,7 +471,29 @@ class Meta(object):
                  cache_ttl=None,
                  rpc_type=RPCType.grpc,
                  rpc_version=1,
-                 unsecure=True):
+                 unsecure=True,
+                 batch=False,
+                 max_workers=None,
+                 max_concurrent_rpcs=None,
+                 rpc_concurrency_limits=None,
+                 process_pool=None,
+                 stream_buffer_size=None,
+                 stream_overflow_policy=OverflowPolicy.block,
+                 stream_max_latency=None,
+                 stream_max_bytes=None,
+                 catalog_cache_ttl=None,
+                 collect_cache=False,
+                 apply_config_policy=False,
+                 config_policy_cache=True,
+                 write_behind=False,
+                 write_behind_buffer=10000,
+                 write_behind_flush_size=1000,
+                 write_behind_flush_interval=1.0,
+                 write_behind_retries=3,
+                 write_behind_backoff=.5,
+                 write_behind_flush_timeout=10,
+                 write_behind_spill_dir=None,
+                 write_behind_spill_size=1 << 30):
         self.name = name
         self.version = version
         setattr(sys.modules["snap_plugin.v1"], "PLUGIN_VERSION", version)
@@ -250,6 +505,28 @@ class Meta(object):
         self.rpc_type = rpc_type
         self.rpc_version = rpc_version
         self.unsecure = unsecure
+        self.batch = batch
+        self.max_workers = max_workers
+        self.max_concurrent_rpcs = max_concurrent_rpcs
+        self.rpc_concurrency_limits = rpc_concurrency_limits
+        self.process_pool = process_pool
+        self.stream_buffer_size = stream_buffer_size
+        self.stream_overflow_policy = stream_overflow_policy
+        self.stream_max_latency = stream_max_latency
+        self.stream_max_bytes = stream_max_bytes
+        self.catalog_cache_ttl = catalog_cache_ttl
+        self.collect_cache = collect_cache
+        self.apply_config_policy = apply_config_policy
+        self.config_policy_cache = config_policy_cache
+        self.write_behind = write_behind
+        self.write_behind_buffer = write_behind_buffer
+        self.write_behind_flush_size = write_behind_flush_size
+        self.write_behind_flush_interval = write_behind_flush_interval
+        self.write_behind_retries = write_behind_retries
+        self.write_behind_backoff = write_behind_backoff
+        self.write_behind_flush_timeout = write_behind_flush_timeout
+        self.write_behind_spill_dir = write_behind_spill_dir
+        self.write_behind_spill_size = write_behind_spill_size
 
 
 @six.add_metaclass(ABCMeta)
@@ -265,7 +542,11 @@ class Plugin(object):
     def __init__(self):
         self.meta = None
         self.proxy = None
-        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        # the server is created once Meta and command line flags are known
+        # (see server)
+        self._server = None
+        self._server_options = None
+        self._process_pool = None
         self._port = 0
         self._last_ping = time.time()
         self._shutting_down = False
@@ -286,7 +567,11 @@ class Plugin(object):
             ("config", FlagType.value, "JSON Snap global config"),
             ("stand-alone", FlagType.toggle, "enable stand alone mode"),
             ("stand-alone-port", FlagType.value, "http port for stand alone mode", 8181),
-            ("log-level", FlagType.value, "logging level 0:panic - 5:debug", 3)
+            ("log-level", FlagType.value, "logging level 0:panic - 5:debug", 3),
+            ("max-workers", FlagType.value, "number of gRPC worker threads or 'auto'"),
+            ("max-concurrent-rpcs", FlagType.value, "maximum number of concurrent RPCs"),
+            ("rpc-concurrency-limits", FlagType.value, "maximum number of concurrent calls by RPC, e.g. 'Ping=1'"),
+            ("process-pool", FlagType.value, "number of worker processes or 'auto'"),
         ]
         self._flags.add_multiple(flags)
 
@@ -298,13 +583,26 @@ class Plugin(object):
         """
         self._last_ping = time.time()
 
+    def invalidate_config_policy(self):
+        """Drops the cached config policy.
+
+        Call it when the policy returned by
+        :py:meth:`~snap_plugin.v1.plugin.Plugin.get_config_policy` changes so
+        the next request calls it again (see Meta `config_policy_cache` and
+        `apply_config_policy`).
+        """
+        self.proxy.invalidate_config_policy()
+
     def stop_plugin(self):
         """Stops the plugin"""
         LOG.debug("plugin stopping")
         self._shutting_down = True
-        _stop_event = self.server.stop(0)
-        while not _stop_event.is_set():
-            time.sleep(.1)
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+        if self._server is not None:
+            _stop_event = self._server.stop(0)
+            while not _stop_event.is_set():
+                time.sleep(.1)
         LOG.debug("plugin stopped")
 
     def start_plugin(self):
@@ -431,7 +729,24 @@ class Plugin(object):
                 LOG.warning("Invalid config provided: expected JSON (provided={}).".format(self._args.config))
                 self._config = {}
 
+        if self._args.max_workers is not None:
+            self.meta.max_workers = self._args.max_workers
+        if self._args.max_concurrent_rpcs is not None:
+            self.meta.max_concurrent_rpcs = self._args.max_concurrent_rpcs
+        if self._args.rpc_concurrency_limits is not None:
+            self.meta.rpc_concurrency_limits = self._args.rpc_concurrency_limits
+        if self._args.process_pool is not None:
+            self.meta.process_pool = self._args.process_pool
+
         self._set_log_level()
+        if self._mode != PluginMode.diagnostics:
+            # the pool server is forked before the gRPC server starts any
+            # threads, workers are never forked from the plugin's process
+            self._init_process_pool()
+        if self._server is None or self._server_options != self._get_server_options():
+            # a server accessed before the flags were parsed is replaced when
+            # the flags change its options, it was never started
+            self._init_server()
         self._monitor = Thread(
             target=_monitor,
             args=(self.last_ping,
@@ -439,6 +754,149 @@ class Plugin(object):
                   self._is_shutting_down),
             kwargs={"timeout": self._get_ping_timeout_duration()})
 
+    @property
+    def server(self):
+        """The gRPC server.
+
+        The server is created when the plugin is started, once the flags
+        sizing it are parsed.  Accessing it before creates it from Meta, it
+        is then replaced when the plugin starts if the flags change the size
+        of its worker pool or its number of concurrent RPCs.  Plugins using
+        Meta `process_pool` should not access it before, their pool would be
+        forked after the server was created.
+        """
+        if self._server is None:
+            self._init_server()
+        return self._server
+
+    @server.setter
+    def server(self, server):
+        self._server = server
+
+    def _get_server_options(self):
+        """Returns the size of the worker pool, the number of concurrent RPCs
+        and the concurrency limits of single RPCs of the gRPC server"""
+        return self._get_max_workers(), self._get_max_concurrent_rpcs(), self._get_rpc_concurrency_limits()
+
+    def _init_server(self):
+        """Creates the gRPC server and registers the plugin's proxy with it.
+
+        The size of the worker pool is taken from Meta `max_workers`, the
+        number of concurrent RPCs is limited by Meta `max_concurrent_rpcs` and
+        the number of concurrent calls of single RPCs by Meta
+        `rpc_concurrency_limits`.
+        """
+        self._server_options = max_workers, max_rpcs, limits = self._get_server_options()
+        LOG.debug("gRPC server using {} workers (max concurrent RPCs: {})".format(max_workers, max_rpcs))
+        executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        if max_rpcs is None:
+            self.server = grpc.server(executor)
+        else:
+            try:
+                self.server = grpc.server(executor, maximum_concurrent_rpcs=max_rpcs)
+            except TypeError:
+                # older grpcio releases can't limit concurrent RPCs
+                LOG.warning("Max concurrent RPCs (given={}) is not supported by "
+                            "the installed grpcio, ignoring it.".format(max_rpcs))
+                self.server = grpc.server(executor)
+        server = self.server
+        if limits:
+            if hasattr(grpc.ServicerContext, "abort"):
+                server = _LimitedRpcServer(server, limits)
+            else:
+                # calls can't be rejected before grpcio 1.13
+                LOG.warning("RPC concurrency limits (given={}) are not supported by "
+                            "the installed grpcio, ignoring them.".format(dict(limits)))
+        self._add_servicer(_SerializedReplyServer(server))
+
+    def _get_max_workers(self):
+        """Returns the size of the gRPC worker pool.
+
+        The pool is sized by Meta `max_workers`, which is either a number of
+        workers or 'auto' to size the pool by the number of CPU cores.  The pool
+        is never smaller than Meta `concurrency_count` so the framework's
+        concurrent calls don't queue up behind the pool.
+        """
+        max_workers = self.meta.max_workers
+        if max_workers is None:
+            max_workers = _DEFAULT_MAX_WORKERS
+        elif max_workers == "auto":
+            # same sizing as used by the standard library for I/O bound pools
+            try:
+                cpus = multiprocessing.cpu_count()
+            except NotImplementedError:
+                cpus = 1
+            max_workers = min(32, cpus + 4)
+        else:
+            try:
+                max_workers = int(max_workers)
+            except ValueError:
+                LOG.warning("Invalid max workers (given={}), using default {}."
+                            .format(max_workers, _DEFAULT_MAX_WORKERS))
+                max_workers = _DEFAULT_MAX_WORKERS
+        return max(max_workers, self.meta.concurrency_count, 1)
+
+    def _get_max_concurrent_rpcs(self):
+        """Returns the maximum number of concurrent RPCs or None if not limited"""
+        max_rpcs = self.meta.max_concurrent_rpcs
+        if max_rpcs is None:
+            return None
+        try:
+            return int(max_rpcs)
+        except ValueError:
+            LOG.warning("Invalid max concurrent RPCs (given={}), not limiting RPCs.".format(max_rpcs))
+            return None
+
+    def _get_rpc_concurrency_limits(self):
+        """Returns the (RPC name, maximum concurrent calls) pairs of the RPCs
+        limited by Meta `rpc_concurrency_limits`, sorted by name.
+
+        The limits are either a dict or a string as given by the
+        '--rpc-concurrency-limits' flag, e.g. 'CollectMetrics=4,Ping=1'.
+        """
+        limits = self.meta.rpc_concurrency_limits
+        if not limits:
+            return ()
+        try:
+            if isinstance(limits, basestring):
+                limits = dict(limit.split("=", 1) for limit in limits.split(","))
+            limits = tuple(sorted((name.strip(), int(limit)) for name, limit in limits.items()))
+            if any(limit < 0 for _, limit in limits):
+                raise ValueError(limits)
+            return limits
+        except (AttributeError, ValueError):
+            LOG.warning("Invalid RPC concurrency limits (given={}), not limiting RPCs.".format(
+                self.meta.rpc_concurrency_limits))
+            return ()
+
+    def _init_process_pool(self):
+        """Starts the worker processes requested by Meta `process_pool`"""
+        workers = self.meta.process_pool
+        if workers is None:
+            return
+        if self.meta.type not in (PluginType.collector, PluginType.processor):
+            LOG.warning("Process pool is supported only by Collector and Processor plugins.")
+            return
+        if workers == "auto":
+            try:
+                workers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                workers = 1
+        try:
+            workers = int(workers)
+        except ValueError:
+            LOG.warning("Invalid process pool size (given={}), not using a process pool.".format(workers))
+            return
+        if workers < 1:
+            return
+        self._process_pool = _ProcessPool(self, workers)
+        self._process_pool.start()
+
+    @abstractmethod
+    def _add_servicer(self, server):
+        """Registers the plugin's proxy with the gRPC server"""
+        pass
+
     def _set_log_level(self):
         """Sets the log level provided by the framework.
 
@@ -539,19 +997,17 @@ class Plugin(object):
             sys.stdout.write("Printing metric catalog took {}\n\n".format(print_timer.elapsed()))
             sys.stdout.flush()
 
-            # apply config to metrics for collection
+            # apply config to metrics for collection, the defaults of a
+            # policy namespace apply to the metrics below it
+            defaults_index = NamespaceIndex()
+            for (ns, default) in defaults:
+                defaults_index.add(ns + ("**",), default)
             for metric in metrics:
                 metric_config = self._config.copy()
-                # search for default values matching metric's namespace
-                for (ns, default) in defaults:
-                    match = True
-                    for i in range(len(ns)):
-                        if ns[i] != metric.namespace[i].value:
-                            match = False
-                            break
-                    # apply default value if no config entry is present
-                    if match and default[0] not in metric_config:
-                        metric_config[default[0]] = default[1]
+                # apply the most specific default value if no config entry
+                # is present
+                for (key, value) in defaults_index.match(metric.namespace):
+                    metric_config.setdefault(key, value)
 
                 metric.config = metric_config
 
@@ -559,7 +1015,10 @@ class Plugin(object):
             with print_timer:
                 sys.stdout.write("Metrics that can be collected right now are:\n")
                 metrics_table = []
-                metrics = self.collect(metrics)
+                if self.meta.batch:
+                    # wrapped the same way as the metrics of a collect request
+                    metrics = MetricBatch(MetricsArg(metrics=[m.pb for m in metrics]).metrics)
+                metrics = self._collect_for_diagnostics(metrics)
                 for metric in metrics:
                     metrics_table.append([metric.namespace, metric.data_type, metric.data])
 
@@ -580,6 +1039,10 @@ class Plugin(object):
         sys.stdout.write("Printing diagnostic took {}\n\n".format(diagnostics_timer.elapsed()))
         sys.stdout.flush()
 
+    def _collect_for_diagnostics(self, metrics):
+        """Collects metrics printed by diagnostics"""
+        return self.collect(metrics)
+
     def _parse_policy_namespaces(self, policy, key_type):
         """Returns list of keys with their info from all namespaces present in a given policy"""
         entries = []
@@ -613,6 +1076,9 @@ class Plugin(object):
         (Float, String and Bool) and rules which includes default values and
         min and max constraints for Float and Integery value types.
 
+        The policy is cached once returned (see Meta `config_policy_cache`
+        and :py:meth:`invalidate_config_policy`).
+
         Args:
             None
 
@@ -17,18 +17,33 @@
 
 
 import logging
+import threading
 import traceback
 
+import grpc
+
+from .compiled_policy import _CompiledPolicy
 from .plugin_pb2 import ErrReply, GetConfigPolicyReply
 
 LOG = logging.getLogger(__name__)
 
+# whether the response serializers of grpc's method handlers can be replaced
+# to pass replies serialized beforehand through (see
+# snap_plugin.v1.plugin._SerializedReplyHandler)
+_SERIALIZED_REPLIES = hasattr(grpc.unary_unary_rpc_method_handler(None), "_replace")
+
 
 class PluginProxy(object):
     """Dispatches requests to the plugins implementation"""
 
     def __init__(self, plugin):
         self.plugin = plugin
+        self._compiled_policy = None
+        # serialized reply to GetConfigPolicy and the generation it was built
+        # in so a reply built while the policy is invalidated isn't kept
+        self._config_policy_reply = None
+        self._config_policy_generation = 0
+        self._config_policy_lock = threading.Lock()
 
     def Ping(self, request, context):
         """Responds to ping request"""
@@ -43,9 +58,48 @@ class PluginProxy(object):
     def GetConfigPolicy(self, request, context):
         """Dispatches the request to the plugins get_config_policy method"""
         try:
-            policy = self.plugin.get_config_policy()
-            return policy._pb
+            if not self.plugin.meta.config_policy_cache:
+                return self.plugin.get_config_policy()._pb
+            reply = self._config_policy_reply
+            if reply is None:
+                generation = self._config_policy_generation
+                reply = self.plugin.get_config_policy()._pb.SerializeToString()
+                with self._config_policy_lock:
+                    if generation == self._config_policy_generation:
+                        self._config_policy_reply = reply
+            return self._reply(reply, GetConfigPolicyReply)
         except Exception as err:
             msg = "message: {}\n\nstack trace: {}".format(
-                err.message, traceback.format_exc())
+                err, traceback.format_exc())
             return GetConfigPolicyReply(error=msg)
+
+    def _reply(self, reply, reply_type):
+        """Returns the reply of a request, parsing replies serialized
+        beforehand (:obj:`bytes`) when the gRPC server can't send them.
+
+        The following methods may reply with bytes:
+
+            - GetConfigPolicy when Meta `config_policy_cache` is set
+            - GetMetricTypes of collectors and stream collectors when Meta
+              `catalog_cache_ttl` is set
+        """
+        if isinstance(reply, bytes) and not _SERIALIZED_REPLIES:
+            return reply_type.FromString(reply)
+        return reply
+
+    def invalidate_config_policy(self):
+        """Drops the cached GetConfigPolicy reply and compiled policy"""
+        with self._config_policy_lock:
+            self._config_policy_generation += 1
+            self._config_policy_reply = None
+            self._compiled_policy = None
+
+    def _apply_config_policy(self, metrics=(), config=None):
+        """Applies the plugin's config policy to the configs of a request
+        when Meta `apply_config_policy` is set, the policy being compiled on
+        first use (see :py:class:`snap_plugin.v1.compiled_policy._CompiledPolicy`)"""
+        if not self.plugin.meta.apply_config_policy:
+            return
+        if self._compiled_policy is None:
+            self._compiled_policy = _CompiledPolicy(self.plugin.get_config_policy())
+        self._compiled_policy.apply(metrics, config)
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+import logging
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+from concurrent import futures
+
+try:
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    # the futures backport on python 2 doesn't define it
+    BrokenProcessPool = RuntimeError
+
+from .config_map import ConfigMap
+from .metric_batch import _metrics_pb, _wrap_metrics
+from .plugin_pb2 import MetricsArg, MetricsReply, PubProcArg
+
+LOG = logging.getLogger(__name__)
+
+# seconds between checks for a broken pool
+_POLL_INTERVAL = .1
+
+# plugin used by the worker processes, inherited from the parent when the
+# workers are forked
+_PLUGIN = None
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+def _collect(data):
+    """Runs the plugin's collect method on serialized MetricsArg"""
+    request = MetricsArg.FromString(data)
+    metrics = _PLUGIN.collect(_wrap_metrics(request.metrics, _PLUGIN.meta.batch))
+    return MetricsReply(metrics=_metrics_pb(metrics)).SerializeToString()
+
+
+def _process(data):
+    """Runs the plugin's process method on serialized PubProcArg"""
+    request = PubProcArg.FromString(data)
+    metrics = _PLUGIN.process(_wrap_metrics(request.Metrics, _PLUGIN.meta.batch),
+                              ConfigMap(pb=request.Config))
+    return MetricsReply(metrics=_metrics_pb(metrics)).SerializeToString()
+
+
+def _chunks(metrics, count):
+    """Splits metrics into at most `count` chunks of similar size"""
+    size = max(1, -(-len(metrics) // count))
+    for start in range(0, len(metrics), size):
+        yield metrics[start:start + size]
+
+
+def _context():
+    """Returns the multiprocessing context forking processes, None when
+    ProcessPoolExecutor doesn't take one (python < 3.7) and its default
+    context, forking on Linux, is used"""
+    if sys.version_info < (3, 7):
+        return None
+    try:
+        return multiprocessing.get_context("fork")
+    except (AttributeError, ValueError):
+        return None
+
+
+class _WorkerDied(BrokenProcessPool):
+    """A worker process died serving a request even after the pool was
+    restarted"""
+
+
+class _PoolServer(object):
+    """Owns the worker processes of a pool, running in a process forked by
+    the pool's supervisor before any thread is started.
+
+    Requests are received on a connection to the plugin's process and each
+    served by a thread.  When a worker dies the pool is broken: the server
+    stops reading requests, hands the requests to retry over to the
+    supervisor and exits.  The supervisor then forks a new server which
+    retries them once in a new pool, so that processes are never forked
+    from a process running threads.
+    """
+
+    def __init__(self, conn, handoff, workers):
+        self._conn = conn
+        self._handoff = handoff
+        self._workers = workers
+        self._executor = None
+        self._broken = False
+        self._retries = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def _start(self):
+        context = _context()
+        if context is not None:
+            self._executor = futures.ProcessPoolExecutor(max_workers=self._workers,
+                                                         mp_context=context)
+        else:
+            self._executor = futures.ProcessPoolExecutor(max_workers=self._workers)
+        return set(self._executor.map(_warm_up, range(self._workers)))
+
+    def serve(self, retries=None):
+        """Serves requests until the plugin's process stops the pool or the
+        pool is broken
+
+        Args:
+            retries (:obj:`list`): requests of the previous server to retry,
+                None for the first server of the pool
+        """
+        pids = self._start()
+        if retries is None:
+            self._send(None, pids)
+        else:
+            LOG.debug("process pool restarted with workers {}".format(sorted(pids)))
+            for request in retries:
+                self._spawn(request + (True,))
+        stopped = False
+        try:
+            while not self._broken:
+                try:
+                    # polled so that a broken pool stops the server
+                    if not self._conn.poll(_POLL_INTERVAL):
+                        continue
+                    message = self._conn.recv()
+                except (EOFError, OSError):
+                    message = None
+                if message is None:
+                    stopped = True
+                    break
+                self._spawn(message)
+            for thread in self._threads:
+                thread.join()
+        finally:
+            # waiting lets the workers receive their stop sentinel before the
+            # server exits
+            self._executor.shutdown(wait=not self._broken)
+        if self._broken and not stopped:
+            self._handoff.send(self._retries)
+
+    def _spawn(self, request):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        thread = threading.Thread(target=self._serve_request, args=request)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _serve_request(self, request_id, func, chunks, retried=False):
+        try:
+            result = _map(self._executor, func, chunks)
+        except BrokenProcessPool:
+            with self._lock:
+                if not self._broken:
+                    LOG.warning("Worker process died, restarting process pool")
+                    self._broken = True
+                if not retried:
+                    self._retries.append((request_id, func, chunks))
+                    return
+            result = _WorkerDied("Worker process died serving the request")
+        except Exception as err:
+            result = err
+        self._send(request_id, result)
+
+    def _send(self, request_id, result):
+        """Sends the result of a request, replaced by an error when it can't
+        be sent so that the request is always completed"""
+        with self._send_lock:
+            try:
+                self._conn.send((request_id, _sendable(result)))
+            except (EOFError, OSError):
+                raise
+            except Exception as err:
+                self._conn.send((request_id, RuntimeError(
+                    "Result of the request could not be sent: {}".format(err))))
+
+
+def _sendable(result):
+    """Returns the result of a request or, for an exception which can't be
+    unpickled in the plugin's process, an error describing it"""
+    if isinstance(result, Exception):
+        try:
+            pickle.loads(pickle.dumps(result))
+        except Exception:
+            return RuntimeError("{}: {}".format(type(result).__name__, result))
+    return result
+
+
+def _serve_pool(conn, handoff, workers, retries):
+    _PoolServer(conn, handoff, workers).serve(retries)
+
+
+def _serve(conn, parent_conn, workers):
+    """Supervises the pool servers, forking a new server with the requests
+    to retry each time the pool of the previous one is broken.  The
+    supervisor never starts a thread, so it can safely fork."""
+    # the server stops when the plugin's end of the connection is closed
+    parent_conn.close()
+    context = _context() or multiprocessing
+    retries = None
+    while True:
+        handoff, child_handoff = context.Pipe(duplex=False)
+        server = context.Process(target=_serve_pool, args=(conn, child_handoff, workers, retries))
+        server.start()
+        child_handoff.close()
+        try:
+            retries = handoff.recv()
+        except EOFError:
+            # the server stopped
+            retries = None
+        handoff.close()
+        server.join()
+        if retries is None:
+            break
+
+
+class _Call(object):
+    """A request waiting for the reply of the pool server"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class _ProcessPool(object):
+    """Runs collect and process calls of a plugin in worker processes.
+
+    Requests are split into chunks, one per worker, which are sent to the
+    workers as serialized protobuf.  The replies of the workers are merged
+    into a single :obj:`MetricsReply`.  The workers are owned by a server
+    process forked, through a supervisor process, when the pool is started
+    before the plugin starts any thread, so they are warm by the time the
+    first request arrives.  If a worker dies the supervisor forks a new
+    server which retries the request once, the plugin's process is never
+    forked again.
+
+    Args:
+        plugin (:py:class:`snap_plugin.v1.plugin.Plugin`): plugin
+        workers (:obj:`int`): number of worker processes
+    """
+
+    def __init__(self, plugin, workers):
+        self.plugin = plugin
+        self.workers = workers
+        self.pids = ()
+        self._server = None
+        self._reader = None
+        self._conn = None
+        self._calls = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Forks the pool supervisor and waits for the workers to be ready"""
+        global _PLUGIN
+        _PLUGIN = self.plugin
+        context = _context() or multiprocessing
+        self._conn, child_conn = context.Pipe()
+        # the supervisor can't be a daemon process as it forks the server, it
+        # is stopped at exit or when the plugin's process dies
+        self._server = context.Process(target=_serve, args=(child_conn, self._conn, self.workers))
+        self._server.start()
+        child_conn.close()
+        atexit.register(self.shutdown)
+        self.pids = sorted(self._conn.recv()[1])
+        LOG.debug("process pool started with workers {}".format(self.pids))
+        self._reader = threading.Thread(target=self._read)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def shutdown(self):
+        """Stops the worker processes"""
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._conn.send(None)
+                except (EOFError, OSError):
+                    pass
+                self._server.join(1)
+                self._server = None
+
+    def collect(self, request):
+        """Collects metrics of a MetricsArg in the worker processes
+
+        Returns:
+            :obj:`MetricsReply`
+        """
+        return self._run(_collect, [MetricsArg(metrics=chunk).SerializeToString()
+                                    for chunk in _chunks(request.metrics, self.workers)])
+
+    def process(self, request):
+        """Processes metrics of a PubProcArg in the worker processes
+
+        Returns:
+            :obj:`MetricsReply`
+        """
+        return self._run(_process, [PubProcArg(Metrics=chunk, Config=request.Config).SerializeToString()
+                                    for chunk in _chunks(request.Metrics, self.workers)])
+
+    def _run(self, func, chunks):
+        call = _Call()
+        with self._lock:
+            if self._server is None:
+                raise RuntimeError("Process pool is shut down")
+            request_id = self._next_id
+            self._next_id += 1
+            self._calls[request_id] = call
+            self._conn.send((request_id, func, chunks))
+        while not call.done.wait(_POLL_INTERVAL):
+            # the calls are failed when the reader stops, unless it crashed
+            if not self._reader.is_alive():
+                with self._lock:
+                    self._calls.pop(request_id, None)
+                raise RuntimeError("Process pool server stopped")
+        if isinstance(call.result, Exception):
+            raise call.result
+        reply = MetricsReply()
+        for result in call.result:
+            reply.MergeFromString(result)
+        return reply
+
+    def _read(self):
+        """Completes the calls with the replies of the pool server"""
+        while True:
+            try:
+                request_id, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            except Exception:
+                LOG.exception("Invalid reply of the process pool server")
+                break
+            with self._lock:
+                call = self._calls.pop(request_id)
+            call.result = result
+            call.done.set()
+        # the server is gone, fail the calls still waiting
+        with self._lock:
+            calls, self._calls = self._calls, {}
+        for call in calls.values():
+            call.result = RuntimeError("Process pool server stopped")
+            call.done.set()
+
+
+def _map(executor, func, chunks):
+    return [f.result() for f in [executor.submit(func, chunk) for chunk in chunks]]
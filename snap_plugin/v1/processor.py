@@ -45,7 +45,28 @@ class Processor(Plugin):
         super(Processor, self).__init__()
         self.meta = Meta(PluginType.processor, name, version, **kwargs)
         self.proxy = _ProcessorProxy(self)
-        add_ProcessorServicer_to_server(self.proxy, self.server)
+
+    def _add_servicer(self, server):
+        add_ProcessorServicer_to_server(self.proxy, server)
+
+    def get_transform(self, config):
+        """Returns the transform applied to the metrics instead of
+        :py:meth:`process`.
+
+        Processors that only filter metrics by namespace, rename namespaces
+        or add and remove tags can declare it with a
+        :py:class:`~snap_plugin.v1.transform.Transform`.  The transform is
+        applied to the metrics of the request in place so the metrics aren't
+        wrapped.  The default
+        implementation returns None, :py:meth:`process` being called.
+
+        Args:
+            config (:obj:`snap_plugin.v1.ConfigMap`): config of the request
+
+        Returns:
+            :py:class:`~snap_plugin.v1.transform.Transform` or None
+        """
+        return None
 
     @abstractmethod
     def process(self, metrics, config):
@@ -59,12 +80,21 @@ class Processor(Plugin):
         include applying filtering, max, min, average functions as well as
         adding additional context to the metrics to name just a few.
 
+        When the plugin's :py:class:`~snap_plugin.v1.plugin.Meta` sets
+        `batch` the metrics are passed as a
+        :py:class:`~snap_plugin.v1.metric_batch.MetricBatch`, whose
+        :py:meth:`~snap_plugin.v1.metric_batch.MetricBatch.to_columns` and
+        :py:meth:`~snap_plugin.v1.metric_batch.MetricBatch.from_columns`
+        allow vectorized processing.
+
         Args:
-            metrics (obj:`list` of :obj:`snap_plugin.v1.Metric`):
+            metrics (obj:`list` of :obj:`snap_plugin.v1.Metric` or
+                :obj:`snap_plugin.v1.MetricBatch`):
                 List of metrics to be processed.
 
         Returns:
-            :obj:`list` of :obj:`snap_plugin.v1.Metric`:
+            :obj:`list` of :obj:`snap_plugin.v1.Metric` or
+                :obj:`snap_plugin.v1.MetricBatch`:
                 List of processed metrics.
         """
         pass
@@ -20,7 +20,7 @@ import logging
 import traceback
 
 from .config_map import ConfigMap
-from .metric import Metric
+from .metric_batch import _metrics_pb, _wrap_metrics
 from .plugin_pb2 import MetricsReply
 from .plugin_proxy import PluginProxy
 
@@ -37,12 +37,27 @@ class _ProcessorProxy(PluginProxy):
         """Dispatches the request to the plugins process method"""
         LOG.debug("Process called")
         try:
+            self._apply_config_policy(config=request.Config)
+            reply = self._transform(request)
+            if reply is not None:
+                return reply
+            if self.plugin._process_pool is not None:
+                return self.plugin._process_pool.process(request)
             metrics = self.plugin.process(
-                [Metric(pb=m) for m in request.Metrics],
+                _wrap_metrics(request.Metrics, self.plugin.meta.batch),
                 ConfigMap(pb=request.Config)
             )
-            return MetricsReply(metrics=[m.pb for m in metrics])
+            return MetricsReply(metrics=_metrics_pb(metrics))
         except Exception as err:
             msg = "message: {}\n\nstack trace: {}".format(
                 err, traceback.format_exc())
             return MetricsReply(metrics=[], error=msg)
+
+    def _transform(self, request):
+        """Applies the transform declared by the plugin to the request's
+        metrics in place and returns the reply, None when the plugin doesn't
+        declare a transform"""
+        transform = self.plugin.get_transform(ConfigMap(pb=request.Config))
+        if transform is None:
+            return None
+        return MetricsReply(metrics=transform._apply(request.Metrics))
@@ -45,7 +45,15 @@ class Publisher(Plugin):
         super(Publisher, self).__init__()
         self.meta = Meta(PluginType.publisher, name, version, **kwargs)
         self.proxy = PublisherProxy(self)
-        add_PublisherServicer_to_server(self.proxy, self.server)
+
+    def _add_servicer(self, server):
+        add_PublisherServicer_to_server(self.proxy, server)
+
+    def stop_plugin(self):
+        """Stops the plugin once the metrics buffered for write-behind are
+        published (see Meta `write_behind`)"""
+        self.proxy.close(self.meta.write_behind_flush_timeout)
+        super(Publisher, self).stop_plugin()
 
     @abstractmethod
     def publish(self, metrics, config):
@@ -57,8 +65,17 @@ class Publisher(Plugin):
         This method is called by the Snap deamon during the publish phase
         of a Snap workflow.
 
+        When the plugin's :py:class:`~snap_plugin.v1.plugin.Meta` sets
+        `batch` the metrics are passed as a
+        :py:class:`~snap_plugin.v1.metric_batch.MetricBatch`.
+
+        When it sets `write_behind` the method is called from a single
+        background thread with the metrics of one or more Publish requests
+        sharing the same config.
+
         Args:
-            metrics (:obj:`list` of `snap_plugin.v1.Metric`):
+            metrics (:obj:`list` of `snap_plugin.v1.Metric` or
+                :obj:`snap_plugin.v1.MetricBatch`):
                 List of metrics to be published.
             config (`snap_plugin.v1.ConfigMap`):
                 Dict of config values.
@@ -16,12 +16,15 @@
 # limitations under the License.
 
 import logging
+import threading
 import traceback
 
 from .plugin_pb2 import ErrReply
 from .config_map import ConfigMap
-from .metric import Metric
+from .metric_batch import _wrap_metrics
 from .plugin_proxy import PluginProxy
+from .spill_queue import _SpillQueue
+from .write_behind import _WriteBehind
 
 LOG = logging.getLogger(__name__)
 
@@ -31,17 +34,49 @@ class PublisherProxy(PluginProxy):
     def __init__(self, publisher):
         super(PublisherProxy, self).__init__(publisher)
         self.plugin = publisher
+        # created on the first request when Meta `write_behind` is set
+        self.write_behind = None
+        self._write_behind_lock = threading.Lock()
 
     def Publish(self, request, context):
         """Dispatches the request to the plugins publish method"""
         LOG.debug("Publish called")
         try:
-            self.plugin.publish(
-                [Metric(pb=m) for m in request.Metrics],
-                ConfigMap(pb=request.Config)
-            )
+            self._apply_config_policy(config=request.Config)
+            if self.plugin.meta.write_behind:
+                # acknowledged once buffered, metrics dropped by a failed
+                # flush are logged and counted by the write-behind buffer
+                self._write_behind().put(request)
+                return ErrReply()
+            self._publish(request.Metrics, request.Config)
             return ErrReply()
         except Exception as err:
             msg = "message: {}\n\nstack trace: {}".format(
                 err, traceback.format_exc())
             return ErrReply(error=msg)
+
+    def _publish(self, metrics, config):
+        """Calls the plugins publish method with a repeated field of metrics
+        and a config map (pb)"""
+        self.plugin.publish(
+            _wrap_metrics(metrics, self.plugin.meta.batch),
+            ConfigMap(pb=config)
+        )
+
+    def _write_behind(self):
+        with self._write_behind_lock:
+            if self.write_behind is None:
+                meta = self.plugin.meta
+                spill = None
+                if meta.write_behind_spill_dir is not None:
+                    spill = _SpillQueue(meta.write_behind_spill_dir, meta.write_behind_spill_size)
+                self.write_behind = _WriteBehind(
+                    self._publish, meta.write_behind_buffer, meta.write_behind_flush_size,
+                    meta.write_behind_flush_interval, meta.write_behind_retries,
+                    meta.write_behind_backoff, spill)
+            return self.write_behind
+
+    def close(self, timeout=None):
+        """Flushes the metrics buffered for write-behind"""
+        if self.write_behind is not None:
+            self.write_behind.close(timeout)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Append-only queue of records spilled to memory-mapped segment files.
+
+A segment file starts with a header holding the offset of its first unread
+record, followed by records made of their length plus one (4 bytes, little
+endian) and their bytes.  A zero marks the end of the written records, an
+empty record being stored with a length field of one.
+Segments are created with a fixed size and are deleted once all their
+records have been read, the queue surviving restarts of the plugin.
+
+Records put in front of the queue are written in the read space of the first
+segment or, if it is too small, in a segment numbered before it.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+
+LOG = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+_SUFFIX = ".seg"
+
+# default size of a segment file, larger records get a segment of their own
+_SEGMENT_SIZE = 16 << 20
+
+# number of the first segment of a new queue, the lower numbers are left to
+# the segments of records put in front of the queue
+_FIRST_SEGMENT = 1 << 32
+
+
+def _length(buf, offset):
+    """Returns the length of the record at offset, -1 at the end of the
+    written records"""
+    return _LENGTH.unpack_from(buf, offset)[0] - 1
+
+
+class _Segment(object):
+    """A memory-mapped segment file"""
+
+    def __init__(self, path, size=None):
+        self.path = path
+        create = size is not None
+        with open(path, "a+b") as f:
+            if create:
+                f.truncate(size)
+            self._map = mmap.mmap(f.fileno(), 0)
+        if create:
+            self.read = self.write = _HEADER.size
+            _HEADER.pack_into(self._map, 0, self.read)
+        else:
+            # a zero header is left by a crash before it was first written
+            self.read = max(_HEADER.unpack_from(self._map, 0)[0], _HEADER.size)
+            # find the end of the written records
+            self.write = self.read
+            while self.write + _LENGTH.size <= len(self._map):
+                length = _length(self._map, self.write)
+                if length < 0:
+                    break
+                self.write += _LENGTH.size + length
+        self.records = self._count()
+
+    def _count(self):
+        count, offset = 0, self.read
+        while offset < self.write:
+            offset += _LENGTH.size + _length(self._map, offset)
+            count += 1
+        return count
+
+    @property
+    def size(self):
+        return len(self._map)
+
+    def append(self, data):
+        """Appends a record, returns False when the segment is full"""
+        end = self.write + _LENGTH.size + len(data)
+        if end > len(self._map):
+            return False
+        self._map[self.write + _LENGTH.size:end] = data
+        # the length is written last so a partially written record is never
+        # read back after a crash
+        _LENGTH.pack_into(self._map, self.write, len(data) + 1)
+        self.write = end
+        self.records += 1
+        return True
+
+    def prepend(self, data):
+        """Writes a record before the first unread one, returns False when
+        the read space is too small"""
+        start = self.read - _LENGTH.size - len(data)
+        if start < _HEADER.size:
+            return False
+        self._map[start + _LENGTH.size:self.read] = data
+        _LENGTH.pack_into(self._map, start, len(data) + 1)
+        # the header is written last so the record is only read back after
+        # a crash once complete
+        _HEADER.pack_into(self._map, 0, start)
+        self.read = start
+        self.records += 1
+        return True
+
+    def peek(self):
+        length = _length(self._map, self.read)
+        start = self.read + _LENGTH.size
+        return self._map[start:start + length]
+
+    def pop(self):
+        self.read += _LENGTH.size + _length(self._map, self.read)
+        _HEADER.pack_into(self._map, 0, self.read)
+        self.records -= 1
+
+    def close(self, delete=False):
+        self._map.close()
+        if delete:
+            os.remove(self.path)
+
+
+class _SpillQueue(object):
+    """FIFO queue of byte records stored in segment files.
+
+    Args:
+        directory (:obj:`str`): directory of the segment files, created if
+            needed, records left by a previous run are kept
+        max_size (:obj:`int`): maximum number of bytes of segment files
+        segment_size (:obj:`int`): size of a segment file
+
+    """
+
+    def __init__(self, directory, max_size=1 << 30, segment_size=_SEGMENT_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._segments = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            if os.path.getsize(path) < _HEADER.size + _LENGTH.size:
+                # left by a crash between the creation of the file and its
+                # truncation to the segment size
+                LOG.warning("Removing incomplete segment file {}".format(path))
+                os.remove(path)
+                continue
+            self._segments.append(_Segment(path))
+        self._next = _FIRST_SEGMENT
+        if self._segments:
+            self._next = int(os.path.basename(self._segments[-1].path)[:-len(_SUFFIX)]) + 1
+        self._records = sum(s.records for s in self._segments)
+        if self._records:
+            LOG.info("{} spilled records found in {}".format(self._records, directory))
+
+    def __len__(self):
+        return self._records
+
+    @property
+    def size(self):
+        """Number of bytes of the segment files"""
+        return sum(s.size for s in self._segments)
+
+    def put(self, data):
+        """Appends a record.
+
+        Returns:
+            :obj:`bool`: False when the queue is full and the record was not
+            added
+        """
+        with self._lock:
+            return self._put(data)
+
+    def _put(self, data):
+        if not self._segments or not self._segments[-1].append(data):
+            size = max(self.segment_size, _HEADER.size + _LENGTH.size * 2 + len(data))
+            if self.size + size > self.max_size:
+                return False
+            self._segments.append(_Segment(self._path(self._next), size))
+            self._next += 1
+            self._segments[-1].append(data)
+        self._records += 1
+        return True
+
+    def put_front(self, data):
+        """Inserts a record before the oldest one.
+
+        Returns:
+            :obj:`bool`: False when the queue is full and the record was not
+            added
+        """
+        with self._lock:
+            head = self._head()
+            if head is None:
+                return self._put(data)
+            if not head.prepend(data):
+                number = int(os.path.basename(head.path)[:-len(_SUFFIX)]) - 1
+                size = _HEADER.size + _LENGTH.size * 2 + len(data)
+                if number < 0 or self.size + size > self.max_size:
+                    return False
+                self._segments.insert(0, _Segment(self._path(number), size))
+                self._segments[0].append(data)
+            self._records += 1
+            return True
+
+    def _path(self, number):
+        return os.path.join(self.directory, "{:020d}{}".format(number, _SUFFIX))
+
+    def peek(self):
+        """Returns the oldest record or None when the queue is empty"""
+        with self._lock:
+            if not self._records:
+                return None
+            return self._head().peek()
+
+    def pop(self):
+        """Removes the oldest record"""
+        with self._lock:
+            self._head().pop()
+            self._records -= 1
+            self._head()
+
+    def _head(self):
+        """Returns the segment of the oldest record, deleting read segments"""
+        while self._segments and self._segments[0].records == 0 and (
+                len(self._segments) > 1 or self._records == 0):
+            self._segments.pop(0).close(delete=True)
+        return self._segments[0] if self._segments else None
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
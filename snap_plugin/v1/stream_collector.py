@@ -22,7 +22,7 @@ from abc import ABCMeta, abstractmethod
 import six
 
 from .stream_collector_proxy import _StreamCollectorProxy
-from .plugin import Meta, Plugin, PluginType, RPCType
+from .plugin import FlagType, Meta, OverflowPolicy, Plugin, PluginType, RPCType
 from .plugin_pb2 import add_StreamCollectorServicer_to_server
 
 LOG = logging.getLogger(__name__)
@@ -46,7 +46,50 @@ class StreamCollector(Plugin):
         super(StreamCollector, self).__init__()
         self.meta = Meta(PluginType.stream_collector, name, version, rpc_type=RPCType.grpc_stream, **kwargs)
         self.proxy = _StreamCollectorProxy(self)
-        add_StreamCollectorServicer_to_server(self.proxy, self.server)
+        self._flags.add_multiple([
+            ("stream-buffer-size", FlagType.value, "number of metrics buffered before overflow policy applies"),
+            ("stream-overflow-policy", FlagType.value,
+             "what happens to metrics when the buffer is full: {}".format(
+                 ", ".join(p.name for p in OverflowPolicy))),
+            ("stream-max-latency", FlagType.value, "max seconds a metric waits before a partial batch is sent"),
+            ("stream-max-bytes", FlagType.value, "serialized size in bytes at which a batch is sent"),
+        ])
+
+    def _add_servicer(self, server):
+        add_StreamCollectorServicer_to_server(self.proxy, server)
+
+    @property
+    def flush_latency(self):
+        """Histogram of the seconds the first metric of each batch sent on the
+        stream waited (:py:class:`snap_plugin.v1.histogram._Histogram`)"""
+        return self.proxy.flush_latency
+
+    @property
+    def dropped_metrics(self):
+        """Number of metrics dropped as the buffer of a stream was full (see
+        Meta `stream_overflow_policy`)"""
+        return self.proxy.dropped_metrics
+
+    def _parse_args(self):
+        super(StreamCollector, self)._parse_args()
+        if self._args.stream_max_latency is not None:
+            try:
+                self.meta.stream_max_latency = float(self._args.stream_max_latency)
+            except ValueError:
+                LOG.warning("Invalid stream max latency (given={}).".format(self._args.stream_max_latency))
+        if self._args.stream_max_bytes is not None:
+            try:
+                self.meta.stream_max_bytes = int(self._args.stream_max_bytes)
+            except ValueError:
+                LOG.warning("Invalid stream max bytes (given={}).".format(self._args.stream_max_bytes))
+        if self._args.stream_buffer_size is not None:
+            self.meta.stream_buffer_size = self._args.stream_buffer_size
+        if self._args.stream_overflow_policy is not None:
+            try:
+                self.meta.stream_overflow_policy = OverflowPolicy[self._args.stream_overflow_policy]
+            except KeyError:
+                LOG.warning("Invalid stream overflow policy (given={}), using {}."
+                            .format(self._args.stream_overflow_policy, self.meta.stream_overflow_policy.name))
 
     @abstractmethod
     def stream(self, metrics):
@@ -58,6 +101,12 @@ class StreamCollector(Plugin):
 
         It is running by _stream_wrapper method in separate thread.
 
+        The method can either return a metric or a list of metrics, in which
+        case it is called again to get the next ones, or be a generator
+        yielding metrics (or lists of metrics) as they become available.  A
+        generator is consumed lazily and closed when the stream is stopped;
+        it is called again if it is exhausted.
+
         Args:
             metrics (:obj:`list` of :obj:`snap_plugin.v1.Metric`):
                 List of metrics to stream.
@@ -65,9 +114,23 @@ class StreamCollector(Plugin):
         Returns:
             :obj:`list` of :obj:`snap_plugin.v1.Metric`:
 
+        Yields:
+            :obj:`snap_plugin.v1.Metric` or :obj:`list` of
+            :obj:`snap_plugin.v1.Metric`:
+
         """
         pass
 
+    def invalidate_catalog(self):
+        """Drops the cached replies to GetMetricTypes.
+
+        Call it when the metrics provided by the plugin change so the next
+        catalog request calls
+        :py:meth:`~snap_plugin.v1.stream_collector.StreamCollector.update_catalog` again (see
+        Meta `catalog_cache_ttl`).
+        """
+        self.proxy.catalog_cache.invalidate()
+
     @abstractmethod
     def update_catalog(self, config):
         """Returns the metrics which the plugin provides.
@@ -15,6 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import inspect
 import logging
 import threading
 import traceback
@@ -25,78 +26,352 @@ try:
 except ImportError:
     import queue as queue
 
+from .histogram import _Histogram
 from .metric import Metric
-from .plugin_pb2 import MetricsReply, CollectReply
+from .metrics_buffer import _MetricsBuffer
+from .plugin_pb2 import CollectReply, ErrReply, MetricsReply
 from .plugin_proxy import PluginProxy
-from .config_map import ConfigMap
+from .catalog_cache import _CatalogCache
+from .config_map import _config_key
+from .string_table import _namespace_key
 
 LOG = logging.getLogger(__name__)
 
+# size of the stream buffer used when neither Meta nor the framework set one
+_DEFAULT_BUFFER_SIZE = 1000
+
+
+def _isasyncgen(obj):
+    # async generators are available since python 3.6
+    isasyncgen = getattr(inspect, "isasyncgen", None)
+    return isasyncgen is not None and isasyncgen(obj)
+
+
+def _put(returned_metrics, metrics_queue):
+    """Puts a metric or a list of metrics into the buffer"""
+    if isinstance(returned_metrics, list):
+        for returned_metric in returned_metrics:
+            metrics_queue.put(returned_metric)
+    else:
+        metrics_queue.put(returned_metrics)
+
+
+def _stream_key(collect_args):
+    """Returns a key identifying the set of metrics requested by a stream"""
+    key = []
+    for metric in collect_args.Metrics_Arg.metrics:
+        key.append((
+            _namespace_key(metric.Namespace),
+            metric.Version,
+            _config_key(metric.Config),
+        ))
+    return tuple(sorted(key))
+
+
+class _StreamProducer(object):
+    """Runs the plugin's stream for a set of requested metrics and fans the
+    streamed metrics out to the buffers of its subscribers.
+
+    Each buffer applies its own overflow policy: the producer waits until
+    every buffer with the `block` policy has room for the metric, so a slow
+    stream with that policy holds the others back, while the buffers with a
+    drop or sample policy never make it wait.
+
+    The producer is closed, which stops the plugin's stream, once its last
+    subscriber is removed.
+
+    Args:
+        key (:obj:`tuple`): key of the requested metrics
+            (see :py:func:`_stream_key`)
+
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._subscribers = []
+        self._closed = False
+        self._lock = threading.Lock()
+        # set when a subscriber's buffer makes room
+        self._room = threading.Event()
+
+    def subscribe(self, metrics_queue):
+        """Adds a subscriber buffer"""
+        metrics_queue.on_room = self._room.set
+        with self._lock:
+            self._subscribers = self._subscribers + [metrics_queue]
+
+    def unsubscribe(self, metrics_queue):
+        """Removes a subscriber and returns True if it was the last one"""
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not metrics_queue]
+            if not self._subscribers:
+                self._closed = True
+            self._room.set()
+            return self._closed
+
+    def put(self, metric):
+        """Puts a metric into the buffers of the subscribers, waiting for room
+        in the full buffers with the `block` policy"""
+        # the list of subscribers is replaced, never modified, so it can be
+        # iterated without holding the lock
+        pending = self._subscribers
+        while True:
+            self._room.clear()
+            pending = [q for q in pending if not q.put_nowait(metric)]
+            if not pending:
+                return
+            # closed buffers accept and drop the metric so the wait ends when
+            # a subscriber is removed
+            self._room.wait()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class _StreamBatch(object):
+    """Metrics waiting to be sent on a stream.
+
+    The batch is due to be flushed as soon as one of the following happens:
+
+        - it holds `max_metrics` metrics (0 flushes every metric)
+        - `max_latency` seconds passed since its first metric was added
+        - the metrics take at least `max_bytes` bytes once serialized (0
+          disables the byte-size threshold)
+
+    Args:
+        max_metrics (:obj:`int`): maximum number of metrics
+        max_latency (:obj:`float`): maximum seconds a metric waits
+        max_bytes (:obj:`int`): maximum serialized size in bytes
+        latency (:py:class:`snap_plugin.v1.histogram._Histogram`): records
+            the age of the first metric of each flushed batch
+
+    """
+
+    def __init__(self, max_metrics, max_latency, max_bytes, latency):
+        self.max_metrics = max_metrics
+        self.max_latency = max_latency
+        self.max_bytes = max_bytes
+        self.latency = latency
+        self.metrics = []
+        self.size = 0
+        self.started = None
+
+    def add(self, metric):
+        """Adds a metric and returns True if the batch should be flushed"""
+        if not self.metrics:
+            self.started = time.time()
+        self.metrics.append(metric)
+        if self.max_bytes > 0:
+            self.size += metric.pb.ByteSize()
+        return (self.max_metrics == 0 or
+                len(self.metrics) >= self.max_metrics or
+                0 < self.max_bytes <= self.size)
+
+    def timeout(self, idle_timeout):
+        """Returns the seconds to wait for a metric before flushing.
+
+        An empty batch waits `idle_timeout`.
+        """
+        if not self.metrics:
+            return idle_timeout
+        return max(self.started + self.max_latency - time.time(), 0)
+
+    def flush(self):
+        """Returns a reply with the metrics of the batch and empties it"""
+        if self.metrics:
+            self.latency.observe(time.time() - self.started)
+        reply = CollectReply(Metrics_Reply=MetricsReply(metrics=[m.pb for m in self.metrics]))
+        self.metrics = []
+        self.size = 0
+        self.started = None
+        return reply
+
 
 class _StreamCollectorProxy(PluginProxy):
     """Dispatches collector requests to the plugins implementation"""
     def __init__(self, stream_collector):
         super(_StreamCollectorProxy, self).__init__(stream_collector)
         self.plugin = stream_collector
-        self.metrics_queue = queue.Queue(maxsize=0)
-        self.done_queue = queue.Queue(maxsize=1)
         self.max_metrics_buffer = 0
         self.max_collect_duration = 10
+        # producers of the streams currently open, by requested metrics
+        self._producers = {}
+        self._producers_lock = threading.Lock()
+        self.catalog_cache = _CatalogCache()
+        # seconds the first metric of each flushed batch waited
+        self.flush_latency = _Histogram()
+        # metrics dropped by the buffers of all the streams
+        self.dropped_metrics = 0
+        self._dropped_lock = threading.Lock()
 
-    def _stream_wrapper(self, metrics):
+    def _stream_wrapper(self, metrics, metrics_queue):
         requested_metrics = []
         for metric in metrics.Metrics_Arg.metrics:
             requested_metrics.append(Metric(pb=metric))
-        while self.done_queue.empty():
+        # the producer is closed when its last stream has been stopped
+        while not metrics_queue.closed:
             returned_metrics = self.plugin.stream(requested_metrics)
-            if isinstance(returned_metrics, list):
-                for returned_metric in returned_metrics:
-                    self.metrics_queue.put(returned_metric)
+            if inspect.isgenerator(returned_metrics):
+                self._consume(returned_metrics, metrics_queue)
+            elif _isasyncgen(returned_metrics):
+                self._consume_async(returned_metrics, metrics_queue)
             else:
-                self.metrics_queue.put(returned_metrics)
+                _put(returned_metrics, metrics_queue)
+
+    def _subscribe(self, collect_args, metrics_queue):
+        """Subscribes a buffer to the producer of the requested metrics,
+        starting one if there is none yet, and returns the producer"""
+        key = _stream_key(collect_args)
+        with self._producers_lock:
+            producer = self._producers.get(key)
+            start = producer is None
+            if start:
+                producer = _StreamProducer(key)
+                self._producers[key] = producer
+            producer.subscribe(metrics_queue)
+        if start:
+            thread = threading.Thread(target=self._produce, args=(collect_args, producer),)
+            thread.daemon = True
+            thread.start()
+        return producer
+
+    def _produce(self, collect_args, producer):
+        try:
+            self._stream_wrapper(collect_args, producer)
+        except Exception as err:
+            LOG.error("Stream collector failed: {}\n\nstack trace: {}".format(err, traceback.format_exc()))
+            # new streams start a new producer
+            with self._producers_lock:
+                if self._producers.get(producer.key) is producer:
+                    del self._producers[producer.key]
+
+    def _unsubscribe(self, producer, metrics_queue):
+        """Unsubscribes a buffer, stopping the producer after its last
+        subscriber is gone"""
+        with self._producers_lock:
+            if producer.unsubscribe(metrics_queue):
+                del self._producers[producer.key]
+
+    def _consume(self, generator, metrics_queue):
+        """Puts metrics yielded by a generator into the buffer until the
+        generator is exhausted or the stream is stopped"""
+        try:
+            for returned_metrics in generator:
+                _put(returned_metrics, metrics_queue)
+                if metrics_queue.closed:
+                    break
+        finally:
+            generator.close()
+
+    def _consume_async(self, generator, metrics_queue):
+        """Puts metrics yielded by an async generator into the buffer until
+        the generator is exhausted or the stream is stopped"""
+        import asyncio
+        loop = asyncio.new_event_loop()
+        try:
+            while not metrics_queue.closed:
+                try:
+                    returned_metrics = loop.run_until_complete(generator.__anext__())
+                except StopAsyncIteration:
+                    break
+                _put(returned_metrics, metrics_queue)
+        finally:
+            loop.run_until_complete(generator.aclose())
+            loop.close()
+
+    def _buffer_size(self, max_metrics_buffer):
+        """Returns the size of the buffer between the plugin and the stream"""
+        size = self.plugin.meta.stream_buffer_size
+        if size is not None:
+            try:
+                return max(int(size), 1)
+            except ValueError:
+                LOG.warning("Invalid stream buffer size (given={}).".format(size))
+        if max_metrics_buffer > 0:
+            return max_metrics_buffer
+        return _DEFAULT_BUFFER_SIZE
+
+    def _new_batch(self, max_collect_duration, max_metrics_buffer):
+        """Returns an empty batch applying the plugin's flush thresholds"""
+        max_latency = self.plugin.meta.stream_max_latency
+        if max_latency is None:
+            max_latency = max_collect_duration
+        return _StreamBatch(max_metrics_buffer, float(max_latency),
+                            int(self.plugin.meta.stream_max_bytes or 0),
+                            self.flush_latency)
+
+    def _report_dropped(self, metrics_queue, reported):
+        """Logs and counts the metrics dropped since `reported` and returns
+        the number of metrics dropped by the stream in total"""
+        dropped = metrics_queue.dropped
+        if dropped > reported:
+            LOG.warning("Stream buffer full, {} metrics dropped ({} in total)"
+                        .format(dropped - reported, dropped))
+            with self._dropped_lock:
+                self.dropped_metrics += dropped - reported
+        return dropped
+
+    def _check_config_policy(self, collect_args):
+        """Applies the config policy to the requested metrics and returns the
+        reply reporting the errors found or None"""
+        try:
+            self._apply_config_policy(collect_args.Metrics_Arg.metrics)
+        except Exception as err:
+            msg = "message: {}\n\nstack trace: {}".format(
+                err, traceback.format_exc())
+            return CollectReply(Error=ErrReply(error=msg))
+        return None
 
     def StreamMetrics(self, request_iterator, context):
         """Dispatches metrics streamed by collector"""
         LOG.debug("StreamMetrics called")
         collect_args = (next(request_iterator))
+        error = self._check_config_policy(collect_args)
+        if error is not None:
+            yield error
+            return
+        max_collect_duration = self.max_collect_duration
+        max_metrics_buffer = self.max_metrics_buffer
         try:
             if collect_args.MaxCollectDuration > 0:
-                self.max_collect_duration = collect_args.MaxCollectDuration
+                max_collect_duration = collect_args.MaxCollectDuration
             if collect_args.MaxMetricsBuffer > 0:
-                self.max_metrics_buffer = collect_args.MaxMetricsBuffer
+                max_metrics_buffer = collect_args.MaxMetricsBuffer
         except Exception as ex:
             LOG.debug("Unable to get schedule parameters: {}".format(ex))
 
-        thread = threading.Thread(target=self._stream_wrapper, args=(collect_args,),)
-        thread.daemon = True
-        thread.start()
-
-        metrics = []
-        while context.is_active():
-            try:
-                # wait for new metrics until max collect duration timeout
-                metrics.append(self.metrics_queue.get(block=True, timeout=self.max_collect_duration))
-            except queue.Empty:
-                LOG.debug("Max collect duration exceeded")
-                metrics_col = CollectReply(Metrics_Reply=MetricsReply(metrics=[m.pb for m in metrics]))
-                metrics = []
-                yield metrics_col
-            else:
-                # stream metrics if max_metrics_buffer is 0 or enough metrics has been collected
-                if self.max_metrics_buffer == 0 or len(metrics) == self.max_metrics_buffer:
-                    metrics_col = CollectReply(Metrics_Reply=MetricsReply(metrics=[m.pb for m in metrics]))
-                    metrics = []
-                    yield metrics_col
-
-        # sent notification if stream has been stopped
-        self.done_queue.put(True)
+        metrics_queue = _MetricsBuffer(self._buffer_size(max_metrics_buffer), self.plugin.meta.stream_overflow_policy)
+        producer = self._subscribe(collect_args, metrics_queue)
+        batch = self._new_batch(max_collect_duration, max_metrics_buffer)
+        dropped = 0
+        try:
+            while context.is_active():
+                try:
+                    # wait for new metrics until max collect duration timeout
+                    # or until the oldest buffered metric is too old
+                    flush = batch.add(metrics_queue.get(timeout=batch.timeout(max_collect_duration)))
+                except queue.Empty:
+                    if not batch.metrics:
+                        LOG.debug("Max collect duration exceeded")
+                    flush = True
+                if flush:
+                    dropped = self._report_dropped(metrics_queue, dropped)
+                    yield batch.flush()
+        finally:
+            # release the stream collector if it waits for room in the buffer
+            # and stop it if no other stream uses it
+            metrics_queue.close()
+            self._unsubscribe(producer, metrics_queue)
+            self._report_dropped(metrics_queue, dropped)
 
     def GetMetricTypes(self, request, context):
         """Dispatches the request to the plugins update_catalog method"""
         LOG.debug("GetMetricTypes called")
         try:
-            metrics = self.plugin.update_catalog(ConfigMap(pb=request.config))
-            return MetricsReply(metrics=[m.pb for m in metrics])
+            reply = self.catalog_cache.reply(request.config, self.plugin.meta.catalog_cache_ttl,
+                                             self.plugin.update_catalog)
+            return self._reply(reply, MetricsReply)
         except Exception as err:
             msg = "message: {}\n\nstack trace: {}".format(
                 err, traceback.format_exc())
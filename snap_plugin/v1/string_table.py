@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Plugin wide table of shared namespace and tag strings.
+
+The strings of the metrics received by a plugin are decoded again by every
+request although they hardly change between requests (`intel/procfs/...`).
+Interning them, and the keys built from them, makes equal values share one
+object which saves memory and lets dict lookups succeed on identity.
+"""
+
+import threading
+
+# bound on the number of interned values, dynamic namespace elements and tag
+# values (ids, pids, ...) would otherwise grow the table forever
+_MAX_SIZE = 1 << 16
+
+
+class _StringTable(object):
+    """Table of interned strings and tuples of strings.
+
+    Args:
+        max_size (:obj:`int`): number of values after which the table is
+            cleared
+
+    """
+
+    def __init__(self, max_size=_MAX_SIZE):
+        self.max_size = max_size
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern(self, value):
+        """Returns the shared object equal to value"""
+        try:
+            return self._values[value]
+        except KeyError:
+            with self._lock:
+                if len(self._values) >= self.max_size:
+                    self._values = {}
+                return self._values.setdefault(value, value)
+
+    def key(self, values):
+        """Returns the shared tuple of the interned values"""
+        intern = self.intern
+        return intern(tuple(intern(value) for value in values))
+
+    def items_key(self, mapping):
+        """Returns the shared tuple of the interned and sorted items of a
+        mapping"""
+        intern = self.intern
+        return intern(tuple(sorted(
+            (intern(k), intern(v)) for k, v in mapping.items())))
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+
+_STRINGS = _StringTable()
+
+
+def _namespace_key(pb):
+    """Returns the canonical key of a namespace (pb), the tuple of its
+    interned element values"""
+    return _STRINGS.key(element.Value for element in pb)
+
+
+def _tags_key(pb):
+    """Returns the canonical key of tags (pb), the tuple of their interned
+    and sorted items"""
+    return _STRINGS.items_key(pb)
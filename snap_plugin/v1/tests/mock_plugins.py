@@ -224,3 +224,30 @@ class MockStreamCollector(snap.StreamCollector, threading.Thread):
     def stop(self):
         self._stopper.set()
         self.stop_plugin()
+
+
+class MockGeneratorStreamCollector(MockStreamCollector):
+    """Mock streaming plugin yielding metrics """
+
+    def __init__(self, name, ver):
+        super(MockGeneratorStreamCollector, self).__init__(name, ver)
+        self.closed = threading.Event()
+
+    def stream(self, requested_metrics):
+        try:
+            count = 0
+            while True:
+                count += 1
+                yield snap.Metric(
+                    namespace=[
+                        snap.NamespaceElement(value="intel"),
+                        snap.NamespaceElement(value="streaming"),
+                        snap.NamespaceElement(value="random"),
+                        snap.NamespaceElement(value="int")
+                    ],
+                    version=1,
+                    data=count
+                )
+                time.sleep(.1)
+        finally:
+            self.closed.set()
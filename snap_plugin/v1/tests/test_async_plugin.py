@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import sys
+import threading
+import time
+
+import grpc
+import pytest
+
+pytest.importorskip("grpc.aio")
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1 import OverflowPolicy
+from snap_plugin.v1.async_plugin import (AsyncCollector, AsyncProcessor,
+                                         AsyncPublisher, AsyncStreamCollector)
+from snap_plugin.v1.async_proxy import (_AsyncCollectCache, _AsyncMetricsBuffer,
+                                        _AsyncStreamProducer)
+from snap_plugin.v1.collect_arg import CollectArg
+from snap_plugin.v1.metrics_arg import MetricsArg
+from snap_plugin.v1.plugin_pb2 import (CollectorStub, Empty, MetricsReply,
+                                       ProcessorStub, PublisherStub,
+                                       StreamCollectorStub)
+from snap_plugin.v1.pub_proc_arg import _ProcessArg, _PublishArg
+
+from . import ThreadPrinter
+
+
+class MockAsyncCollector(AsyncCollector, threading.Thread):
+    """Mock asyncio collector plugin """
+
+    def __init__(self, name, ver):
+        super(MockAsyncCollector, self).__init__(name, ver)
+        threading.Thread.__init__(self, group=None, target=None, name=None)
+
+    async def collect(self, metrics):
+        await asyncio.sleep(.5)
+        for metric in metrics:
+            metric.data = 42
+        return metrics
+
+    def update_catalog(self, config):
+        return [snap.Metric(namespace=("acme", "async"))]
+
+    def get_config_policy(self):
+        return snap.ConfigPolicy()
+
+    def run(self):
+        self.start_plugin()
+
+
+class MockAsyncProcessor(AsyncProcessor, threading.Thread):
+    """Mock asyncio processor plugin """
+
+    def __init__(self, name, ver):
+        super(MockAsyncProcessor, self).__init__(name, ver)
+        threading.Thread.__init__(self, group=None, target=None, name=None)
+
+    async def process(self, metrics, config):
+        for metric in metrics:
+            metric.tags["processed"] = "async"
+        return metrics
+
+    def get_config_policy(self):
+        return snap.ConfigPolicy()
+
+    def run(self):
+        self.start_plugin()
+
+
+class MockAsyncPublisher(AsyncPublisher, threading.Thread):
+    """Mock asyncio publisher plugin """
+
+    def __init__(self, name, ver):
+        super(MockAsyncPublisher, self).__init__(name, ver)
+        threading.Thread.__init__(self, group=None, target=None, name=None)
+        self.published = []
+
+    async def publish(self, metrics, config):
+        self.published.extend(metrics)
+
+    def get_config_policy(self):
+        return snap.ConfigPolicy()
+
+    def run(self):
+        self.start_plugin()
+
+
+class MockAsyncStreamCollector(AsyncStreamCollector, threading.Thread):
+    """Mock asyncio stream collector plugin """
+
+    def __init__(self, name, ver):
+        super(MockAsyncStreamCollector, self).__init__(name, ver)
+        threading.Thread.__init__(self, group=None, target=None, name=None)
+
+    async def stream(self, metrics):
+        await asyncio.sleep(.1)
+        return [snap.Metric(namespace=("acme", "async"), data=i) for i in range(2)]
+
+    def update_catalog(self, config):
+        return [snap.Metric(namespace=("acme", "async"))]
+
+    def get_config_policy(self):
+        return snap.ConfigPolicy()
+
+    def run(self):
+        self.start_plugin()
+
+
+class MockAsyncGeneratorStreamCollector(MockAsyncStreamCollector):
+    """Mock asyncio stream collector plugin yielding metrics """
+
+    async def stream(self, metrics):
+        for i in range(2):
+            await asyncio.sleep(.1)
+            yield snap.Metric(namespace=("acme", "async"), data=i)
+
+
+class MockBusyStreamCollector(MockAsyncStreamCollector):
+    """Mock asyncio stream collector plugin which never awaits"""
+
+    async def stream(self, metrics):
+        return [snap.Metric(namespace=("acme", "async"), data=1)]
+
+
+def _start(plugin_cls, stub_cls):
+    sys.stdout = ThreadPrinter()
+    sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
+    plugin = plugin_cls("MyAsyncPlugin", 1)
+    plugin.start()
+    t_end = time.time() + 5
+    # wait for our plugin to print its preamble
+    while len(sys.stdout.lines) == 0 and time.time() < t_end:
+        time.sleep(.1)
+    resp = json.loads(sys.stdout.lines[0])
+    return plugin, stub_cls(grpc.insecure_channel(resp["ListenAddress"]))
+
+
+def test_collect():
+    col, client = _start(MockAsyncCollector, CollectorStub)
+    metric = snap.Metric(namespace=("acme", "async"))
+    # concurrent collect calls share the event loop
+    futures = [client.CollectMetrics.future(MetricsArg(metric).pb) for _ in range(20)]
+    start = time.time()
+    replies = [f.result() for f in futures]
+    assert time.time() - start < 2
+    for reply in replies:
+        assert reply.error == ''
+        assert reply.metrics[0].int64_data == 42
+    assert client.Ping(Empty()).error == ''
+    col.stop_plugin()
+
+
+def test_collect_cache():
+    calls = []
+
+    async def collect(metrics):
+        calls.append(len(metrics))
+        await asyncio.sleep(.1)
+        return MetricsReply(metrics=metrics)
+
+    async def run():
+        cache = _AsyncCollectCache()
+        metrics = [snap.Metric(namespace=("acme", "async")).pb]
+        # concurrent requests wait for the call in flight
+        replies = await asyncio.gather(*[cache.collect(metrics, 60, collect) for _ in range(3)])
+        assert [len(reply.metrics) for reply in replies] == [1, 1, 1]
+        reply = await cache.collect(metrics, 60, collect)
+        assert len(reply.metrics) == 1
+        assert calls == [1]
+        assert (cache.hits, cache.misses) == (3, 1)
+    asyncio.new_event_loop().run_until_complete(run())
+
+
+def test_process():
+    proc, client = _start(MockAsyncProcessor, ProcessorStub)
+    reply = client.Process(_ProcessArg(metrics=[snap.Metric(namespace=("acme", "async"))]).pb)
+    assert reply.error == ''
+    assert reply.metrics[0].Tags["processed"] == "async"
+    proc.stop_plugin()
+
+
+def test_publish():
+    pub, client = _start(MockAsyncPublisher, PublisherStub)
+    reply = client.Publish(_PublishArg(metrics=[snap.Metric(namespace=("acme", "async"))]).pb)
+    assert reply.error == ''
+    assert len(pub.published) == 1
+    pub.stop_plugin()
+
+
+
+def test_publish_write_behind_unsupported(caplog):
+    sys.argv = ["", '{}']
+    pub = MockAsyncPublisher("MyAsyncPlugin", 1)
+    pub.meta.write_behind = True
+    pub._parse_args()
+    assert any("Write-behind is not supported" in r.getMessage()
+               for r in caplog.records)
+
+def test_stream():
+    col, client = _start(MockAsyncStreamCollector, StreamCollectorStub)
+    metrics = client.StreamMetrics(iter([CollectArg(snap.Metric(namespace=("acme", "async"))).pb]))
+    assert next(metrics).Metrics_Reply.metrics[0].int64_data == 0
+    assert next(metrics).Metrics_Reply.metrics[0].int64_data == 1
+    metrics.cancel()
+    col.stop_plugin()
+
+
+def test_stream_async_generator():
+    col, client = _start(MockAsyncGeneratorStreamCollector, StreamCollectorStub)
+    metrics = client.StreamMetrics(iter([CollectArg(snap.Metric(namespace=("acme", "async"))).pb]))
+    assert [next(metrics).Metrics_Reply.metrics[0].int64_data for _ in range(4)] == [0, 1, 0, 1]
+    metrics.cancel()
+    col.stop_plugin()
+
+
+def test_stream_no_await():
+    col = MockBusyStreamCollector("MyAsyncPlugin", 1)
+    loop = asyncio.new_event_loop()
+    other = threading.Event()
+
+    async def run():
+        producer = _AsyncStreamProducer(())
+        buf = _AsyncMetricsBuffer(2, OverflowPolicy.drop_oldest)
+        producer.subscribers = [buf]
+        task = asyncio.ensure_future(col.proxy._stream_task(
+            CollectArg(snap.Metric(namespace=("acme", "async"))).pb, producer))
+        # the other coroutines of the loop run while the stream is busy
+        await asyncio.sleep(.1)
+        other.set()
+        task.cancel()
+    thread = threading.Thread(target=loop.run_until_complete, args=(run(),))
+    thread.daemon = True
+    thread.start()
+    assert other.wait(5)
+    thread.join(5)
+
+def test_stream_overflow():
+    async def run():
+        producer = _AsyncStreamProducer(())
+        buf = _AsyncMetricsBuffer(2, OverflowPolicy.drop_oldest)
+        producer.subscribers = [buf]
+        for i in range(5):
+            await producer.put(i)
+        assert [await buf.get_async() for _ in range(2)] == [3, 4]
+        assert buf.dropped == 3
+        # the block policy waits for room in the buffer
+        buf = _AsyncMetricsBuffer(1, OverflowPolicy.block)
+        buf.on_room = producer.room.set
+        producer.subscribers = [buf]
+        await producer.put(0)
+        put = asyncio.ensure_future(producer.put(1))
+        await asyncio.sleep(.1)
+        assert not put.done()
+        assert await buf.get_async() == 0
+        await asyncio.wait_for(put, 1)
+        assert await buf.get_async() == 1
+        assert buf.dropped == 0
+    asyncio.new_event_loop().run_until_complete(run())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import timeit
+
+import pytest
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.config_map import _ConfigDecoder, _entries
+from snap_plugin.v1.plugin_pb2 import MetricsArg
+
+# the benchmarks only report their results, run them with
+# SNAP_PLUGIN_BENCHMARKS=1 py.test -s snap_plugin/v1/tests/test_benchmarks.py
+benchmark = pytest.mark.skipif(not os.environ.get("SNAP_PLUGIN_BENCHMARKS"),
+                               reason="SNAP_PLUGIN_BENCHMARKS is not set")
+
+COUNT = 10000
+
+
+def _footprint(build):
+    """Returns the bytes allocated per metric by build(i) and the results"""
+    tracemalloc = pytest.importorskip("tracemalloc")
+    tracemalloc.start()
+    try:
+        results = [build(i) for i in range(COUNT)]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size / float(COUNT), results
+
+
+@benchmark
+def test_metric_footprint():
+    request = MetricsArg(metrics=[
+        snap.Metric(namespace=("acme", "sk8", str(i)), config={"int": 1}).pb
+        for i in range(COUNT)])
+    wrapped, _ = _footprint(lambda i: snap.Metric(pb=request.metrics[i]))
+    created, _ = _footprint(lambda i: snap.Metric(
+        namespace=("acme", "sk8", str(i)), description="some description", unit="B"))
+    print("\n{:.0f} bytes per wrapped metric, {:.0f} bytes per new metric".format(
+        wrapped, created))
+
+
+def _has_field_data(pb):
+    """Looks up the data of a metric checking each field of the oneof"""
+    for field in ("int32_data", "int64_data", "uint32_data", "uint64_data",
+                  "float64_data", "float32_data", "string_data", "bool_data",
+                  "bytes_data"):
+        if pb.HasField(field):
+            return getattr(pb, field)
+    return None
+
+
+@benchmark
+def test_data_getter_speed():
+    values = [True, 1, 1.5, "str"]
+    metrics = [snap.Metric(data=values[i % len(values)]) for i in range(1000)]
+
+    def get():
+        for m in metrics:
+            m.data
+
+    def get_has_field():
+        for m in metrics:
+            _has_field_data(m.pb)
+    oneof = min(timeit.repeat(get, number=10, repeat=3))
+    has_field = min(timeit.repeat(get_has_field, number=10, repeat=3))
+    print("\n{:.0f}ns per get, {:.0f}ns with HasField".format(
+        oneof / 10000 * 1e9, has_field / 10000 * 1e9))
+
+
+@benchmark
+def test_config_decoder_speed():
+    config = {"user": "john", "port": 911, "rate": .5, "enabled": True}
+    request = MetricsArg(metrics=[
+        snap.Metric(namespace=("acme", "sk8", str(i)), config=config).pb
+        for i in range(1000)])
+
+    def decode_each():
+        for m in request.metrics:
+            _entries(m.Config)
+
+    def decode_once():
+        configs = _ConfigDecoder()
+        for m in request.metrics:
+            configs.config_map(m.Config)["user"]
+    each = min(timeit.repeat(decode_each, number=10, repeat=3))
+    once = min(timeit.repeat(decode_once, number=10, repeat=3))
+    print("\n{:.0f}ns per config decoded once per request, {:.0f}ns decoded per metric".format(
+        once / 10000 * 1e9, each / 10000 * 1e9))
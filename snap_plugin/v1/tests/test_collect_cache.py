@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.collect_cache import _CollectCache
+from snap_plugin.v1.plugin_pb2 import MetricsReply
+
+
+class _Collect(object):
+    """Collects every requested metric with data 42 counting the calls"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, metrics):
+        self.calls.append(len(metrics))
+        time.sleep(self.delay)
+        return MetricsReply(metrics=[snap.Metric(
+            namespace=[e.Value.replace("*", "host0") for e in m.Namespace], data=42).pb
+            for m in metrics])
+
+
+def _requested(*namespaces, **config):
+    return [snap.Metric(namespace=ns, config=config).pb for ns in namespaces]
+
+
+def test_hits():
+    cache = _CollectCache()
+    collect = _Collect()
+    reply = cache.collect(_requested(("a", "b"), ("a", "*", "c")), 10, collect)
+    assert [m.Namespace[1].Value for m in reply.metrics] == ["b", "host0"]
+    # cached metrics are served and only the new ones collected
+    reply = cache.collect(_requested(("a", "*", "c"), ("a", "d")), 10, collect)
+    assert [m.Namespace[1].Value for m in reply.metrics] == ["host0", "d"]
+    assert collect.calls == [2, 1]
+    assert (cache.hits, cache.misses) == (1, 3)
+    # the config is part of the key
+    cache.collect(_requested(("a", "b"), foo="bar"), 10, collect)
+    assert collect.calls == [2, 1, 1]
+
+
+def test_configs():
+    cache = _CollectCache()
+    calls = []
+
+    def collect(metrics):
+        # collected metrics keep the config of the requested ones
+        calls.append(len(metrics))
+        reply = MetricsReply()
+        for m in metrics:
+            reply.metrics.add().CopyFrom(m)
+            reply.metrics[-1].string_data = m.Config.StringMap["foo"]
+        return reply
+    requested = _requested(("a", "b"), foo="a") + _requested(("a", "b"), foo="b")
+    reply = cache.collect(requested, 10, collect)
+    assert [m.string_data for m in reply.metrics] == ["a", "b"]
+    reply = cache.collect(_requested(("a", "b"), foo="b"), 10, collect)
+    assert [m.string_data for m in reply.metrics] == ["b"]
+    assert calls == [2]
+    # metrics that can't be told apart by their config are not cached
+    cache = _CollectCache()
+    collect = _Collect()
+    cache.collect(requested, 10, collect)
+    reply = cache.collect(_requested(("a", "b"), foo="b"), 10, collect)
+    assert len(reply.metrics) == 1
+    assert collect.calls == [2, 1]
+
+
+def test_ttl():
+    cache = _CollectCache()
+    collect = _Collect()
+    cache.collect(_requested(("a", "b")), .1, collect)
+    cache.collect(_requested(("a", "b")), .1, collect)
+    time.sleep(.2)
+    cache.collect(_requested(("a", "b")), .1, collect)
+    assert collect.calls == [1, 1]
+
+
+def test_single_flight():
+    cache = _CollectCache()
+    collect = _Collect(delay=.3)
+    replies = []
+    threads = [threading.Thread(target=lambda: replies.append(
+        cache.collect(_requested(("a", "b")), 10, collect))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert collect.calls == [1]
+    assert [r.metrics[0].int64_data for r in replies] == [42] * 5
+
+
+def test_errors_not_cached():
+    cache = _CollectCache()
+
+    def fail(metrics):
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        cache.collect(_requested(("a", "b")), 10, fail)
+    reply = cache.collect(_requested(("a", "b")), 10, lambda metrics: MetricsReply(error="boom"))
+    assert reply.error == "boom"
+    collect = _Collect()
+    cache.collect(_requested(("a", "b")), 10, collect)
+    assert collect.calls == [1]
@@ -17,6 +17,7 @@
 
 import json
 import sys
+import threading
 import time
 from builtins import int as bigint
 
@@ -129,6 +130,30 @@ def test_diagnostics(capsys, caplog):
     assert len(errors) > 0
 
 
+
+class BatchCollector(MockCollector):
+    """Mock collector relying on the MetricBatch API"""
+
+    def __init__(self, name, ver):
+        super(BatchCollector, self).__init__(name, ver)
+        self.meta.batch = True
+
+    def collect(self, metrics):
+        metrics.stamp()
+        metrics.assign([42] * len(metrics), "int64")
+        return metrics
+
+
+def test_diagnostics_batch(capsys):
+    sys.argv = ["", "--config", '{"database": "123", "password": "321", "user": "admin"}']
+    col = BatchCollector("MyCollector", 99)
+    col.start_plugin()
+    out, _ = capsys.readouterr()
+    # the collector is given a MetricBatch as it is over gRPC
+    fields = [tuple(line.split()) for line in out.split("\n")]
+    assert ("/acme/sk8/matix", "integer", "42") in fields
+
+
 def test_collect(collector_client):
     now = time.time()
     metric = snap.Metric(
@@ -205,3 +230,75 @@ def test_get_config_policy(collector_client):
     reply = collector_client.GetConfigPolicy(Empty())
     assert reply.error == ""
     assert reply.string_policy["acme.sk8.matix"].rules["password"].default == "grace"
+
+
+def test_catalog_cache():
+    from snap_plugin.v1.get_metrictypes_arg import GetMetricTypesArg
+    sys.stdout = ThreadPrinter()
+    sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
+    col = MockCollector("MyCollector", 99)
+    col.meta.catalog_cache_ttl = 0
+    calls = []
+    update_catalog = col.update_catalog
+    col.update_catalog = lambda config: calls.append(config) or update_catalog(config)
+    col.start()
+    t_end = time.time() + 5
+    # wait for our collector to print its preamble
+    while len(sys.stdout.lines) == 0 and time.time() < t_end:
+        time.sleep(.1)
+    resp = json.loads(sys.stdout.lines[0])
+    client = CollectorStub(
+        grpc.insecure_channel(resp["ListenAddress"]))
+    for _ in range(3):
+        reply = client.GetMetricTypes(GetMetricTypesArg(config={"int": 1, "str": "a"}).pb)
+        assert reply.error == ''
+        assert reply.metrics[0].Version == 99
+    assert len(calls) == 1
+    # replies are cached by config
+    client.GetMetricTypes(GetMetricTypesArg(config={"int": 2, "str": "a"}).pb)
+    assert len(calls) == 2
+    col.invalidate_catalog()
+    client.GetMetricTypes(GetMetricTypesArg(config={"int": 1, "str": "a"}).pb)
+    assert len(calls) == 3
+    col.stop()
+
+
+class BlockingCollector(MockCollector):
+    """Mock collector whose collect calls wait to be released"""
+
+    def __init__(self, name, ver):
+        super(BlockingCollector, self).__init__(name, ver)
+        self.collecting = threading.Event()
+        self.release = threading.Event()
+
+    def collect(self, metrics):
+        self.collecting.set()
+        self.release.wait(5)
+        return super(BlockingCollector, self).collect(metrics)
+
+
+def test_rpc_concurrency_limits():
+    sys.stdout = ThreadPrinter()
+    sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
+    col = BlockingCollector("MyCollector", 99)
+    col.meta.rpc_concurrency_limits = {"CollectMetrics": 1}
+    col.start()
+    t_end = time.time() + 5
+    # wait for our collector to print its preamble
+    while len(sys.stdout.lines) == 0 and time.time() < t_end:
+        time.sleep(.1)
+    resp = json.loads(sys.stdout.lines[0])
+    client = CollectorStub(
+        grpc.insecure_channel(resp["ListenAddress"]))
+    arg = MetricsArg(snap.Metric(namespace=("acme", "sk8", "matix"), config={"int": 1})).pb
+    pending = client.CollectMetrics.future(arg)
+    assert col.collecting.wait(5)
+    # the second concurrent call is rejected, other RPCs are served
+    with pytest.raises(grpc.RpcError) as err:
+        client.CollectMetrics(arg)
+    assert err.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert client.Ping(Empty()).error == ''
+    col.release.set()
+    assert pending.result().error == ''
+    assert client.CollectMetrics(arg).error == ''
+    col.stop()
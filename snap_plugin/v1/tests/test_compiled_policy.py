@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.compiled_policy import _CompiledPolicy
+from snap_plugin.v1.metrics_arg import MetricsArg
+from snap_plugin.v1.plugin_pb2 import ConfigMap as PbConfigMap
+
+
+def _policy():
+    return snap.ConfigPolicy(
+        [
+            ("intel", "procfs"),
+            [
+                ("interval", snap.IntegerRule(default=10, minimum=1, maximum=60)),
+                ("ratio", snap.FloatRule(default=.5)),
+                ("verbose", snap.BoolRule(default=True)),
+                ("user", snap.StringRule(required=True)),
+            ]
+        ],
+        [
+            ("intel", "procfs", "cpu"),
+            [
+                ("interval", snap.IntegerRule(default=1)),
+            ]
+        ],
+    )
+
+
+class PolicyCollector(snap.Collector):
+
+    def collect(self, metrics):
+        return metrics
+
+    def update_catalog(self, config):
+        return []
+
+    def get_config_policy(self):
+        return _policy()
+
+
+class TestCompiledPolicy(object):
+
+    def test_defaults(self):
+        policy = _CompiledPolicy(_policy())
+        metric = snap.Metric(namespace=("intel", "procfs", "mem"), config={"user": "root"})
+        policy.apply([metric.pb])
+        assert dict(metric.config.items()) == {
+            "user": "root", "interval": 10, "ratio": .5, "verbose": True}
+        # the most specific rule applies
+        metric = snap.Metric(namespace=("intel", "procfs", "cpu"), config={"user": "root"})
+        policy.apply([metric.pb])
+        assert metric.config["interval"] == 1
+        # other namespaces are left alone
+        metric = snap.Metric(namespace=("intel", "psutil"))
+        policy.apply([metric.pb])
+        assert len(metric.config) == 0
+
+    def test_coercion(self):
+        policy = _CompiledPolicy(_policy())
+        metric = snap.Metric(namespace=("intel", "procfs", "mem"),
+                             config={"user": 0, "interval": "20", "ratio": 1, "verbose": "false"})
+        policy.apply([metric.pb])
+        assert metric.pb.Config.StringMap["user"] == "0"
+        assert metric.pb.Config.IntMap["interval"] == 20
+        assert metric.pb.Config.FloatMap["ratio"] == 1.0
+        assert metric.pb.Config.BoolMap["verbose"] is False
+        assert "interval" not in metric.pb.Config.StringMap
+
+    def test_errors(self):
+        policy = _CompiledPolicy(_policy())
+        metrics = [
+            snap.Metric(namespace=("intel", "procfs", "mem"), config={"interval": 100}).pb,
+            snap.Metric(namespace=("intel", "procfs", "load"), config={"user": "root", "ratio": "x"}).pb,
+        ]
+        with pytest.raises(ValueError) as err:
+            policy.apply(metrics)
+        # every error is reported at once
+        lines = str(err.value).splitlines()
+        assert len(lines) == 3
+        assert "intel/procfs/mem: config key 'user' is required" in lines
+        assert any("greater than the maximum 60" in line for line in lines)
+        assert any("'ratio'" in line for line in lines)
+
+    def test_root_namespace(self):
+        policy = _CompiledPolicy(snap.ConfigPolicy(
+            [None, [("host", snap.StringRule(default="localhost"))]]))
+        config = PbConfigMap()
+        policy.apply(config=config)
+        assert config.StringMap["host"] == "localhost"
+
+
+def test_collect_applies_policy():
+    col = PolicyCollector("policy", 1, apply_config_policy=True)
+    reply = col.proxy.CollectMetrics(MetricsArg(
+        snap.Metric(namespace=("intel", "procfs", "mem"), config={"user": "root"})).pb, None)
+    assert reply.error == ''
+    assert reply.metrics[0].Config.IntMap["interval"] == 10
+    reply = col.proxy.CollectMetrics(MetricsArg(
+        snap.Metric(namespace=("intel", "procfs", "mem"))).pb, None)
+    assert "config key 'user' is required" in reply.error
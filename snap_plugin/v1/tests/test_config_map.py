@@ -18,6 +18,9 @@
 import pytest
 
 from snap_plugin.v1.config_map import ConfigMap
+from snap_plugin.v1.metric import Metric
+from snap_plugin.v1.metric_batch import _wrap_metrics
+from snap_plugin.v1.metrics_arg import MetricsArg
 
 
 class TestConfigMap(object):
@@ -156,3 +159,45 @@ class TestConfigMap(object):
                         ("float", 1.1))
         (key, value) = cfg.popitem()
         assert len(cfg) == 3
+
+    def test_cached_entries(self):
+        cfg = ConfigMap(int=1, string="asdf")
+        assert cfg["int"] == 1
+        entries = cfg._dict
+        assert cfg["string"] == "asdf"
+        assert cfg._dict is entries
+        # writes drop the cached entries
+        cfg["int"] = 2
+        assert cfg["int"] == 2
+        del cfg["string"]
+        assert "string" not in cfg
+        assert dict(cfg.items()) == {"int": 2}
+        cfg.clear()
+        assert len(cfg) == 0
+
+    def test_cached_entries_pb(self):
+        cfg = ConfigMap(int=1)
+        assert cfg["int"] == 1
+        # changes made to the message are seen by the next reads
+        cfg.pb.IntMap["int"] = 2
+        assert cfg["int"] == 2
+        cfg.IntMap["int"] = 3
+        assert cfg["int"] == 3
+        m = Metric(config={"int": 1})
+        assert m.config["int"] == 1
+        m.pb.Config.IntMap["int"] = 2
+        assert m.config["int"] == 2
+
+    def test_decoder(self):
+        metrics = MetricsArg(*[Metric(namespace=("a", str(i)), config={"int": i % 2})
+                               for i in range(4)]).pb.metrics
+        wrapped = _wrap_metrics(metrics, False)
+        assert [m.config["int"] for m in wrapped] == [0, 1, 0, 1]
+        # identical configs share their decoded entries
+        assert wrapped[0].config._dict is wrapped[2].config._dict
+        assert wrapped[0].config._dict is not wrapped[1].config._dict
+        # a write only affects the written config
+        wrapped[0].config["int"] = 5
+        assert wrapped[0].config["int"] == 5
+        assert wrapped[2].config["int"] == 0
+        assert metrics[0].Config.IntMap["int"] == 5
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from snap_plugin.v1.histogram import _Histogram
+
+
+def test_histogram():
+    hist = _Histogram(bounds=(.1, 1))
+    for value in (.05, .1, .5, 2, 3):
+        hist.observe(value)
+    assert hist.count == 5
+    assert hist.sum == 5.65
+    assert hist.buckets() == [(.1, 2), (1, 3), (float('inf'), 5)]
@@ -22,6 +22,7 @@ import pytest
 from past.builtins import basestring
 
 from snap_plugin.v1 import ConfigMap, Metric, NamespaceElement
+from snap_plugin.v1.plugin_pb2 import MetricsArg
 
 
 class TestMetric(object):
@@ -67,6 +68,22 @@ class TestMetric(object):
                 m.config["int"] == 1)
         assert m.timestamp == 0
 
+    def test_timestamp(self):
+        # the default timestamp is the time the metric is created
+        before = time.time()
+        m = Metric()
+        assert before <= m.timestamp <= time.time()
+        assert m.pb.LastAdvertisedTime == m.pb.Timestamp
+        m.timestamp_ns = 1500000000123456789
+        assert m.timestamp_ns == 1500000000123456789
+        assert (m.pb.Timestamp.sec, m.pb.Timestamp.nsec) == (1500000000, 123456789)
+        assert m.timestamp == 1500000000.1234567
+        # wrapping a received metric leaves its timestamp alone
+        pb = Metric(timestamp=100.5).pb
+        m = Metric(pb=pb)
+        assert m.timestamp == 100.5
+        assert (pb.Timestamp.sec, pb.Timestamp.nsec) == (100, 500000000)
+
     def test_metric_attrs(self):
         m = Metric()
         now = time.time()
@@ -152,3 +169,52 @@ class TestMetric(object):
         # verify an error is not raised
         # https://github.com/intelsdi-x/snap-plugin-lib-py/issues/12
         repr(m.config)
+
+    def test_typed_setters(self):
+        m = Metric()
+        m.set_int32(1)
+        assert m.pb.WhichOneof("data") == "int32_data"
+        m.set_uint64(2 ** 63)
+        assert m.data == 2 ** 63
+        m.set_float32(.5)
+        assert m.data_type == "float"
+        m.set_data(b"raw", "bytes")
+        assert m.pb.bytes_data == b"raw"
+        with pytest.raises(ValueError):
+            m.set_data(1, "int8")
+
+    def test_wrapper_lazy(self):
+        request = MetricsArg(metrics=[
+            Metric(namespace=("acme", "sk8", str(i)), config={"int": 1}).pb
+            for i in range(10)])
+        m = Metric(pb=request.metrics[0])
+        # the wrappers of the config, namespace and timestamp are only
+        # created when accessed
+        assert m._config_map is None
+        assert m._namespace_list is None
+        assert m._timestamp_time is None
+        assert m.config["int"] == 1
+        assert m.namespace[2].value == "0"
+
+    def test_wrappers_slots(self):
+        m = Metric(namespace=("acme", "sk8", "0"), config={"int": 1})
+        # the wrappers use __slots__, they don't carry a __dict__
+        wrappers = [m, m.namespace, m.namespace[0], m.config, m._timestamp]
+        for wrapper in wrappers:
+            assert not hasattr(wrapper, "__dict__"), type(wrapper).__name__
+
+    def test_data_getter(self):
+        values = [True, 1, 1.5, "str", b"bytes"]
+        metrics = [Metric() for _ in values]
+        for m, value in zip(metrics, values):
+            if isinstance(value, bytes) and not isinstance(value, str):
+                m.set_bytes(value)
+            else:
+                m.data = value
+        # the data is read from the field set in the oneof
+        assert [m.data for m in metrics] == values
+        assert [m.data_type for m in metrics[:4]] == ["bool", "integer", "float", "string"]
+        assert Metric().data is None
+        metrics[0].data = 2
+        assert metrics[0].data == 2
+        assert metrics[0].pb.WhichOneof("data") == "int64_data"
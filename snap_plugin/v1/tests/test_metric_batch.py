@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.metrics_arg import MetricsArg
+
+from .mock_plugins import MockCollector
+
+
+def _metrics_arg(count):
+    return MetricsArg(*[
+        snap.Metric(namespace=("acme", "sk8", "metric{}".format(i)),
+                    config={"int64": True})
+        for i in range(count)
+    ]).pb
+
+
+class TestMetricBatch(object):
+
+    def test_sequence(self):
+        arg = _metrics_arg(3)
+        batch = snap.MetricBatch(arg.metrics)
+        assert len(batch) == 3
+        assert batch[1].namespace[2].value == "metric1"
+        assert batch[-1].namespace[2].value == "metric2"
+        assert [m.namespace[2].value for m in batch[:2]] == ["metric0", "metric1"]
+        assert [m.namespace[2].value for m in batch] == ["metric0", "metric1", "metric2"]
+        assert batch.pb is arg.metrics
+
+    def test_writes_through(self):
+        arg = _metrics_arg(2)
+        batch = snap.MetricBatch(arg.metrics)
+        for metric in batch:
+            metric.data = 7
+        assert [m.int64_data for m in arg.metrics] == [7, 7]
+
+    def test_append(self):
+        arg = _metrics_arg(1)
+        batch = snap.MetricBatch(arg.metrics)
+        batch.append(snap.Metric(namespace=("acme", "new"), data=1.5))
+        batch.add().data = "added"
+        assert len(arg.metrics) == 3
+        assert arg.metrics[1].float64_data == 1.5
+        assert arg.metrics[2].string_data == "added"
+
+    def test_assign(self):
+        arg = _metrics_arg(3)
+        batch = snap.MetricBatch(arg.metrics)
+        batch.assign([1, 2, 3], dtype="uint32")
+        assert [m.uint32_data for m in arg.metrics] == [1, 2, 3]
+        assert [m.data_type for m in batch] == ["integer"] * 3
+        batch.assign([.5, 1.5, 2.5], dtype="float32")
+        assert [m.WhichOneof("data") for m in arg.metrics] == ["float32_data"] * 3
+        # without dtype the type of each value is used
+        batch.assign([True, 1, "a"])
+        assert [m.data for m in batch] == [True, 1, "a"]
+        with pytest.raises(ValueError):
+            batch.assign([1, 2])
+        with pytest.raises(ValueError):
+            batch.assign([1, 2, 3], dtype="int8")
+
+    def test_assign_numpy(self):
+        np = pytest.importorskip("numpy")
+        arg = _metrics_arg(3)
+        batch = snap.MetricBatch(arg.metrics)
+        batch.assign(np.arange(3, dtype=np.int32))
+        assert [m.int32_data for m in arg.metrics] == [0, 1, 2]
+        batch.assign(np.ones(3), dtype="float64")
+        assert [m.float64_data for m in arg.metrics] == [1.0] * 3
+
+    def test_columns(self):
+        arg = _metrics_arg(4)
+        for i, pb in enumerate(arg.metrics):
+            pb.int64_data = i
+            pb.Timestamp.sec = 100 + i
+            pb.Timestamp.nsec = 5
+            pb.Tags["host"] = "h{}".format(i % 2)
+        arg.metrics[3].Namespace[2].Value = "metric0"
+        arg.metrics[2].string_data = "str"
+        columns = snap.MetricBatch(arg.metrics).to_columns()
+        assert list(columns.value[:2]) == [0, 1]
+        assert columns.value[2] != columns.value[2]
+        assert list(columns.sec) == [100, 101, 102, 103]
+        assert list(columns.nsec) == [5] * 4
+        assert list(columns.namespace_id) == [0, 1, 2, 0]
+        assert columns.namespaces[2] == ("acme", "sk8", "metric2")
+        assert list(columns.tags_id) == [0, 1, 0, 1]
+        assert columns.tags == [{"host": "h0"}, {"host": "h1"}]
+
+        batch = snap.MetricBatch.from_columns(columns._replace(value=[1.5, 2.5, 3.5, 4.5]))
+        assert len(batch) == 4
+        assert [m.Timestamp.sec for m in batch.pb] == [100, 101, 102, 103]
+        assert [m.data for m in batch] == [1.5, 2.5, 3.5, 4.5]
+        assert [m.namespace[2].value for m in batch] == ["metric0", "metric1", "metric2", "metric0"]
+        assert batch[1].tags["host"] == "h1"
+
+    def test_columns_round_trip(self):
+        metrics = []
+        for i in range(3):
+            metric = snap.Metric(namespace=("acme", "sk8"), version=2, unit="B",
+                                 description="desc", config={"int64": i % 2},
+                                 data=i, timestamp=100 + i)
+            metric.namespace.add_dynamic_element("host", "host name")
+            metric.namespace[2].value = "h{}".format(i)
+            metrics.append(metric)
+        arg = MetricsArg(*metrics).pb
+        columns = snap.MetricBatch(arg.metrics).to_columns()
+        assert list(columns.meta_id) == [0, 1, 0]
+        batch = snap.MetricBatch.from_columns(columns._replace(value=[0, 1, 2]), "int64")
+        for metric, pb in zip(batch, arg.metrics):
+            assert metric.pb == pb
+            assert metric.namespace[2].name == "host"
+            assert metric.namespace[2].description == "host name"
+
+        # columns without metadata are initialised as a new metric is
+        columns = columns._replace(meta_id=None, metas=None)
+        metric = snap.MetricBatch.from_columns(columns)[0]
+        assert metric.version == snap.Metric().version
+        assert metric.pb.LastAdvertisedTime == metric.pb.Timestamp
+        assert metric.namespace[2].name == ""
+
+    def test_stamp(self):
+        arg = _metrics_arg(3)
+        batch = snap.MetricBatch(arg.metrics)
+        metric = snap.Metric(pb=arg.metrics[0])
+        metric.timestamp = 100.5
+        batch.stamp(1500000000123456789)
+        # the time set before isn't read back once the batch is stamped
+        assert metric.timestamp == 1500000000.1234567
+        assert [(m.Timestamp.sec, m.Timestamp.nsec) for m in arg.metrics] == [(1500000000, 123456789)] * 3
+        assert batch[0].timestamp_ns == 1500000000123456789
+        # a single clock read stamps every metric
+        batch.stamp()
+        assert len(set(m.timestamp_ns for m in batch)) == 1
+        assert batch[0].timestamp_ns > 1500000000123456789
+
+
+def test_process_batch():
+    from .mock_plugins import MockProcessor
+    from snap_plugin.v1.pub_proc_arg import _ProcessArg
+    proc = MockProcessor("MyProcessor", 1)
+    proc.meta.batch = True
+    seen = []
+    process = proc.process
+    proc.process = lambda metrics, config: seen.append(metrics) or process(metrics, config)
+    reply = proc.proxy.Process(_ProcessArg(metrics=[snap.Metric(namespace=("acme", "m"))]).pb, None)
+    assert reply.error == ''
+    assert isinstance(seen[0], snap.MetricBatch)
+
+
+def test_collect_batch():
+    col = MockCollector("MyCollector", 1)
+    col.meta.batch = True
+    reply = col.proxy.CollectMetrics(_metrics_arg(5), None)
+    assert reply.error == ''
+    assert len(reply.metrics) == 5
+    assert all(m.int64_data == 99 and m.Version == 2 for m in reply.metrics)
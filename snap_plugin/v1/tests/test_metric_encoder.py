@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.metrics_arg import MetricsArg
+
+
+def _metrics():
+    raw = snap.Metric(namespace=("intel", "raw"))
+    raw.set_bytes(b"\x00\xff")
+    return [
+        snap.Metric(namespace=("intel", "procfs", "load"), version=2, tags={"host": "nöde"},
+                    unit="%", data=0.5),
+        snap.Metric(namespace=("intel", "procfs", "load"), data=7),
+        raw,
+        snap.Metric(namespace=("intel", "nan"), data=float("nan")),
+        snap.Metric(namespace=("intel", "text"), data='say "hi"'),
+        snap.Metric(namespace=("intel", "none")),
+    ]
+
+
+class TestMetricEncoder(object):
+
+    def test_json(self):
+        metrics = _metrics()
+        metrics[0].timestamp_ns = 1500000000123456789
+        lines = snap.MetricEncoder().encode_batch(metrics)
+        assert all(line.endswith(b"\n") and line.count(b"\n") == 1 for line in lines)
+        objects = [json.loads(line.decode("ascii")) for line in lines]
+        assert objects[0] == {
+            "namespace": ["intel", "procfs", "load"], "version": 2,
+            "timestamp": 1500000000123456789, "tags": {"host": "nöde"},
+            "unit": "%", "description": "", "data": 0.5}
+        assert [o["data"] for o in objects[1:]] == [7, "AP8=", "NaN", 'say "hi"', None]
+
+    def test_batch(self):
+        arg = MetricsArg(*_metrics()).pb
+        encoder = snap.MetricEncoder()
+        assert encoder.encode_batch(snap.MetricBatch(arg.metrics)) == \
+            [encoder.encode(pb) for pb in arg.metrics]
+
+    def test_binary(self):
+        metrics = _metrics() + [snap.Metric(namespace=("big",), data="x" * 300)]
+        encoder = snap.MetricEncoder("binary")
+        data = b"".join(encoder.encode_batch(metrics))
+        decoded = encoder.decode(data)
+        assert [m.pb.SerializeToString() for m in decoded] == [m.pb.SerializeToString() for m in metrics]
+        with pytest.raises(ValueError):
+            encoder.decode(data[:-1])
+
+    def test_format(self):
+        with pytest.raises(ValueError):
+            snap.MetricEncoder("xml")
+        with pytest.raises(ValueError):
+            snap.MetricEncoder().decode(b"")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+from snap_plugin.v1 import OverflowPolicy
+from snap_plugin.v1.metrics_buffer import _MetricsBuffer
+from snap_plugin.v1.stream_collector_proxy import queue
+
+
+def _drain(buf):
+    items = []
+    while len(buf) > 0:
+        items.append(buf.get(timeout=0))
+    return items
+
+
+class TestMetricsBuffer(object):
+
+    def test_get_timeout(self):
+        buf = _MetricsBuffer(2)
+        start = time.time()
+        with pytest.raises(queue.Empty):
+            buf.get(timeout=.2)
+        assert time.time() - start >= .2
+
+    def test_block(self):
+        buf = _MetricsBuffer(2, OverflowPolicy.block)
+        buf.put(1)
+        buf.put(2)
+        producer = threading.Thread(target=buf.put, args=(3,))
+        producer.start()
+        time.sleep(.1)
+        # producer waits for room in the buffer
+        assert producer.is_alive()
+        assert buf.get() == 1
+        producer.join(1)
+        assert not producer.is_alive()
+        assert _drain(buf) == [2, 3]
+        assert buf.dropped == 0
+
+    def test_close_releases_producer(self):
+        buf = _MetricsBuffer(1, OverflowPolicy.block)
+        buf.put(1)
+        producer = threading.Thread(target=buf.put, args=(2,))
+        producer.start()
+        buf.close()
+        producer.join(1)
+        assert not producer.is_alive()
+        assert buf.closed
+        assert buf.dropped == 1
+
+    def test_drop_oldest(self):
+        buf = _MetricsBuffer(3, OverflowPolicy.drop_oldest)
+        for i in range(5):
+            buf.put(i)
+        assert _drain(buf) == [2, 3, 4]
+        assert buf.dropped == 2
+
+    def test_drop_newest(self):
+        buf = _MetricsBuffer(3, OverflowPolicy.drop_newest)
+        for i in range(5):
+            buf.put(i)
+        assert _drain(buf) == [0, 1, 2]
+        assert buf.dropped == 2
+
+    def test_sample(self):
+        buf = _MetricsBuffer(10, OverflowPolicy.sample)
+        for i in range(1000):
+            buf.put(i)
+        items = _drain(buf)
+        assert len(items) == 10
+        assert buf.dropped == 990
+        # a uniform sample shouldn't be made of the first metrics only
+        assert max(items) >= 10
+
+    def test_capacity(self):
+        with pytest.raises(ValueError):
+            _MetricsBuffer(0)
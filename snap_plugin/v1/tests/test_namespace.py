@@ -16,6 +16,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import snap_plugin.v1 as snap
 from snap_plugin.v1.namespace import Namespace
 from snap_plugin.v1.namespace_element import NamespaceElement
 from snap_plugin.v1.plugin_pb2 import Metric
@@ -60,3 +61,34 @@ def test_namespace():
     assert len(ns3) == 2
     assert ns3[0].value == "runc"
     assert ns3[1].value == "libcontainer"
+
+
+def test_namespace_key():
+    ns = Namespace(Metric().Namespace, "intel", "procfs", "cpu")
+    assert ns.key == ("intel", "procfs", "cpu")
+    assert repr(ns) == "/intel/procfs/cpu"
+    assert ns.join(".") == "intel.procfs.cpu"
+    assert ns == Namespace(Metric().Namespace, "intel", "procfs", "cpu")
+    assert ns == ("intel", "procfs", "cpu")
+    assert ns != Namespace(Metric().Namespace, "intel", "procfs")
+    assert {ns: 1}[("intel", "procfs", "cpu")] == 1
+
+    # the cached key and rendering follow changes
+    ns[2].value = "mem/free"
+    assert ns.key == ("intel", "procfs", "mem/free")
+    assert repr(ns) == "|intel|procfs|mem/free"
+    ns.pop()
+    ns.add_dynamic_element("cpu-id", "cpu id")
+    assert repr(ns) == "/intel/procfs/*"
+    del ns[0]
+    assert ns.key == ("procfs", "*")
+
+
+def test_namespace_cache_pb():
+    metric = snap.Metric(namespace=("a", "b"))
+    assert str(metric.namespace) == "/a/b"
+    assert str(snap.Metric().namespace) == ""
+    # changes made through the metric's message reset the cached key
+    metric.pb.Namespace.add(Value="c")
+    assert metric.namespace_key == ("a", "b", "c")
+    assert str(metric.namespace) == "/a/b/c"
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from snap_plugin.v1 import Metric, NamespaceElement, NamespaceIndex
+
+
+def test_lookup():
+    index = NamespaceIndex()
+    index.add(("intel", "procfs", "**"), "procfs")
+    index.add(("intel", "procfs", "*", "load"), "load")
+    index.add(("intel", "procfs", "cpu", "load"), "cpu load")
+    index.add([NamespaceElement(value="intel"), NamespaceElement(value="**"),
+               NamespaceElement(value="free")], "free")
+    assert len(index) == 4
+
+    assert index.lookup(("intel", "procfs", "cpu", "load")) == "cpu load"
+    assert index.match(("intel", "procfs", "cpu", "load")) == ["cpu load", "load", "procfs"]
+    assert index.lookup(("intel", "procfs", "mem", "load")) == "load"
+    assert index.lookup(("intel", "procfs")) == "procfs"
+    assert index.match(("intel", "procfs", "mem", "free")) == ["procfs", "free"]
+    assert index.lookup(("intel", "free")) == "free"
+    assert index.lookup(("intel", "psutil", "load")) is None
+    assert index.lookup(("acme",), default=0) == 0
+
+
+def test_lookup_namespace():
+    index = NamespaceIndex()
+    index.add(("intel", "**", "**", "load"), "load")
+    index.add(("intel", "*", "load"), "dynamic load")
+    metric = Metric(namespace=("intel", "cpu", "load"))
+    # a pattern matching in several ways is returned once
+    assert index.match(metric.namespace) == ["dynamic load", "load"]
@@ -81,3 +81,109 @@ def test_standalone(capsys, caplog):
     assert caplog.records[0].levelno == 40
 
     col.standalone_server.shutdown()
+
+
+def test_server_before_start():
+    sys.argv = ["", '{}', "--max-workers", "7"]
+    col = MockCollector("MyCollector", 1)
+    # the server is available before the plugin is started
+    server = col.server
+    assert col._server_options == (10, None, ())
+    col._parse_args()
+    # and replaced as the flags change its worker pool
+    assert col.server is not server
+    assert col._server_options == (7, None, ())
+    sys.argv = ["", '{}']
+    col = MockCollector("MyCollector", 1)
+    server = col.server
+    col._parse_args()
+    assert col.server is server
+
+
+def test_max_workers():
+    sys.argv = ["", '{}']
+    col = MockCollector("MyCollector", 1)
+    col._parse_args()
+    assert col.server is not None
+    assert col._get_max_workers() == 10
+
+    col.meta.concurrency_count = 20
+    assert col._get_max_workers() == 20
+
+    col.meta.max_workers = "auto"
+    assert col._get_max_workers() == 20
+    col.meta.concurrency_count = 1
+    assert 5 <= col._get_max_workers() <= 32
+
+    sys.argv = ["", "--max-workers", "15", "--max-concurrent-rpcs", "100", '{}']
+    col = MockCollector("MyCollector", 1)
+    col._parse_args()
+    assert col.meta.max_workers == "15"
+    assert col.meta.max_concurrent_rpcs == "100"
+    assert col._get_max_workers() == 15
+
+
+
+def test_max_concurrent_rpcs_unsupported(monkeypatch):
+    import grpc
+    server = grpc.server
+
+    def old_server(executor):
+        return server(executor)
+    # grpcio releases whose server doesn't accept maximum_concurrent_rpcs
+    monkeypatch.setattr(grpc, "server", old_server)
+    sys.argv = ["", "--max-concurrent-rpcs", "100", '{}']
+    col = MockCollector("MyCollector", 1)
+    col._parse_args()
+    assert col.server is not None
+    assert col._server_options[1] == 100
+
+def test_rpc_concurrency_limits():
+    sys.argv = ["", "--rpc-concurrency-limits", "Ping=1, CollectMetrics=4", '{}']
+    col = MockCollector("MyCollector", 1)
+    col._parse_args()
+    assert col._server_options[2] == (("CollectMetrics", 4), ("Ping", 1))
+
+    col.meta.rpc_concurrency_limits = {"GetMetricTypes": 2}
+    assert col._get_rpc_concurrency_limits() == (("GetMetricTypes", 2),)
+    col.meta.rpc_concurrency_limits = "Ping"
+    assert col._get_rpc_concurrency_limits() == ()
+
+
+def test_config_policy_cache():
+    from snap_plugin.v1.plugin_pb2 import GetConfigPolicyReply
+    sys.argv = ["", '{}']
+    col = MockCollector("MyCollector", 1)
+    col._parse_args()
+    calls = []
+    get_config_policy = col.get_config_policy
+    col.get_config_policy = lambda: calls.append(1) or get_config_policy()
+    # the reply is serialized once
+    replies = [col.proxy.GetConfigPolicy(None, None) for _ in range(3)]
+    assert len(calls) == 1
+    assert replies[0] is replies[2]
+    reply = GetConfigPolicyReply.FromString(replies[0])
+    assert reply.string_policy["acme.sk8.matix"].rules["user"].default == "kristy"
+
+    col.invalidate_config_policy()
+    col.proxy.GetConfigPolicy(None, None)
+    assert len(calls) == 2
+
+    col.meta.config_policy_cache = False
+    reply = col.proxy.GetConfigPolicy(None, None)
+    assert isinstance(reply, GetConfigPolicyReply)
+    assert len(calls) == 3
+
+
+def test_serialized_replies_unsupported(monkeypatch):
+    from snap_plugin.v1 import plugin_proxy
+    from snap_plugin.v1.plugin_pb2 import GetConfigPolicyReply
+    # grpc's method handlers can't be rewritten, the replies are messages
+    monkeypatch.setattr(plugin_proxy, "_SERIALIZED_REPLIES", False)
+    sys.argv = ["", '{}']
+    col = MockCollector("MyCollector", 1)
+    col._parse_args()
+    for _ in range(2):
+        reply = col.proxy.GetConfigPolicy(None, None)
+        assert isinstance(reply, GetConfigPolicyReply)
+        assert reply.string_policy["acme.sk8.matix"].rules["user"].default == "kristy"
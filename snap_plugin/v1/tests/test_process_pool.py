@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import signal
+import time
+
+import pytest
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.metrics_arg import MetricsArg
+from snap_plugin.v1.pub_proc_arg import _ProcessArg
+
+from .mock_plugins import MockCollector, MockProcessor
+
+
+class CrashingCollector(MockCollector):
+    """Collector whose worker processes die collecting"""
+
+    def collect(self, metrics):
+        os._exit(1)
+
+
+@pytest.fixture
+def collector():
+    col = MockCollector("MyCollector", 1)
+    col.meta.process_pool = 2
+    col._init_process_pool()
+    yield col
+    col._process_pool.shutdown()
+
+
+def _metrics(count, **config):
+    return [snap.Metric(namespace=("acme", "sk8", "metric{}".format(i)), config=config)
+            for i in range(count)]
+
+
+def test_collect(collector):
+    reply = collector.proxy.CollectMetrics(MetricsArg(*_metrics(5, int64=True)).pb, None)
+    assert reply.error == ''
+    assert [m.Namespace[2].Value for m in reply.metrics] == ["metric{}".format(i) for i in range(5)]
+    assert all(m.int64_data == 99 for m in reply.metrics)
+
+    reply = collector.proxy.CollectMetrics(MetricsArg().pb, None)
+    assert reply.error == ''
+    assert len(reply.metrics) == 0
+
+
+def test_collect_worker_crash(collector):
+    # kill a worker, the pool should be restarted and the request served
+    os.kill(collector._process_pool.pids[0], signal.SIGKILL)
+    time.sleep(.2)
+    reply = collector.proxy.CollectMetrics(MetricsArg(*_metrics(3)).pb, None)
+    assert reply.error == ''
+    assert len(reply.metrics) == 3
+
+
+def test_collect_worker_crash_retried():
+    col = CrashingCollector("MyCollector", 1)
+    col.meta.process_pool = 2
+    col._init_process_pool()
+    try:
+        # the request is retried once in a new pool and then reported
+        reply = col.proxy.CollectMetrics(MetricsArg(*_metrics(3)).pb, None)
+        assert reply.error.startswith("message: Worker process died serving the request")
+        assert len(reply.metrics) == 0
+    finally:
+        col._process_pool.shutdown()
+
+
+def test_process():
+    proc = MockProcessor("MyProcessor", 1)
+    proc.meta.process_pool = 3
+    proc._init_process_pool()
+    reply = proc.proxy.Process(
+        _ProcessArg(metrics=_metrics(7), config=snap.ConfigMap(foo="bar")).pb, None)
+    proc._process_pool.shutdown()
+    assert reply.error == ''
+    assert len(reply.metrics) == 7
+    assert all(m.Tags["foo"] == "bar" and m.Tags["processed"] == "true" for m in reply.metrics)
+
+
+class UnpicklableError(Exception):
+    """Error which can be pickled but not unpickled"""
+
+    def __init__(self, code, message):
+        super(UnpicklableError, self).__init__(message)
+
+
+def test_send_unpicklable():
+    # a result which can't be sent is replaced by an error so that the call
+    # waiting for it completes
+    import multiprocessing
+    from snap_plugin.v1.process_pool import _PoolServer
+    conn, server_conn = multiprocessing.Pipe()
+    server = _PoolServer(server_conn, None, 1)
+    server._send(1, UnpicklableError(2, "failed"))
+    request_id, result = conn.recv()
+    assert request_id == 1
+    assert isinstance(result, RuntimeError)
+    assert str(result) == "UnpicklableError: failed"
+
+    server._send(2, [lambda: None])
+    request_id, result = conn.recv()
+    assert request_id == 2
+    assert str(result).startswith("Result of the request could not be sent")
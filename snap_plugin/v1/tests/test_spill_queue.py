@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+
+from snap_plugin.v1.spill_queue import _SpillQueue
+from snap_plugin.v1.write_behind import _WriteBehind
+
+from .test_write_behind import _request, _Sink
+
+
+class TestSpillQueue(object):
+
+    def test_fifo(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir), segment_size=64)
+        records = [("record{}".format(i) * 3).encode() for i in range(10)]
+        for record in records:
+            assert queue.put(record)
+        assert len(queue) == 10
+        # records are spread over several segments
+        assert len(os.listdir(str(tmpdir))) > 1
+        read = []
+        while len(queue):
+            read.append(queue.peek())
+            queue.pop()
+        assert read == records
+        assert queue.peek() is None
+        # read segments are deleted
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_large_record(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir), segment_size=64)
+        queue.put(b"x" * 1000)
+        assert queue.peek() == b"x" * 1000
+
+    def test_max_size(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir), max_size=128, segment_size=64)
+        assert queue.put(b"a" * 40)
+        assert queue.put(b"b" * 40)
+        assert not queue.put(b"c" * 40)
+        assert len(queue) == 2
+
+    def test_put_front(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir), segment_size=64)
+        assert queue.put_front(b"c")
+        queue.put(b"d")
+        # before a segment's first record it gets a segment of its own
+        assert queue.put_front(b"b")
+        assert queue.put_front(b"a")
+        assert queue.peek() == b"a"
+        queue.pop()
+        queue.pop()
+        # the read space of a segment takes records put in front
+        assert queue.put_front(b"b")
+        queue.close()
+        queue = _SpillQueue(str(tmpdir), segment_size=64)
+        read = []
+        while len(queue):
+            read.append(queue.peek())
+            queue.pop()
+        assert read == [b"b", b"c", b"d"]
+
+    def test_reopen(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir), segment_size=64)
+        for i in range(6):
+            queue.put(b"record" + str(i).encode())
+        queue.pop()
+        queue.pop()
+        queue.close()
+        # unread records are kept across restarts
+        queue = _SpillQueue(str(tmpdir), segment_size=64)
+        assert len(queue) == 4
+        assert queue.peek() == b"record2"
+        queue.put(b"record6")
+        read = []
+        while len(queue):
+            read.append(queue.peek())
+            queue.pop()
+        assert read == [b"record" + str(i).encode() for i in range(2, 7)]
+
+    def test_reopen_empty_record(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir))
+        for record in (b"a", b"", b"c"):
+            queue.put(record)
+        queue.close()
+        queue = _SpillQueue(str(tmpdir))
+        assert len(queue) == 3
+        read = []
+        while len(queue):
+            read.append(queue.peek())
+            queue.pop()
+        assert read == [b"a", b"", b"c"]
+
+    def test_reopen_empty_segment(self, tmpdir):
+        queue = _SpillQueue(str(tmpdir))
+        queue.put(b"a")
+        queue.close()
+        # a segment file created but not truncated before a crash
+        open(os.path.join(str(tmpdir), "{:020d}.seg".format(1)), "w").close()
+        queue = _SpillQueue(str(tmpdir))
+        assert len(queue) == 1
+        assert queue.peek() == b"a"
+        queue.put(b"b")
+        queue.pop()
+        assert queue.peek() == b"b"
+
+
+class TestWriteBehindSpill(object):
+
+    def test_failed_flush(self, tmpdir):
+        sink = _Sink(failures=3)
+        wb = _WriteBehind(sink, flush_interval=0, retries=0, backoff=.05,
+                          spill=_SpillQueue(str(tmpdir)))
+        wb.put(_request(2, db="a"))
+        time.sleep(.1)
+        assert len(wb.spill) == 1
+        # while records are spilled the next requests follow them
+        wb.put(_request(1, db="b"))
+        t_end = time.time() + 5
+        while len(wb.spill) and time.time() < t_end:
+            time.sleep(.05)
+        wb.close()
+        assert sink.calls == [(2, {"db": "a"}), (1, {"db": "b"})]
+        assert wb.dropped == 0
+
+    def test_failed_flush_order(self, tmpdir):
+        sink = _Sink(failures=1, delay=.2)
+        wb = _WriteBehind(sink, flush_interval=0, retries=0,
+                          spill=_SpillQueue(str(tmpdir)))
+        wb.put(_request(2, db="a"))
+        time.sleep(.05)
+        # buffered while the first request is being flushed
+        wb.put(_request(1, db="b"))
+        time.sleep(.3)
+        # the buffered request follows the failed one in the spill queue
+        wb.put(_request(3, db="c"))
+        t_end = time.time() + 5
+        while (len(wb.spill) or len(wb)) and time.time() < t_end:
+            time.sleep(.05)
+        wb.close()
+        assert sink.calls == [(2, {"db": "a"}), (1, {"db": "b"}), (3, {"db": "c"})]
+
+    def test_overflow_order(self, tmpdir):
+        sink = _Sink()
+        wb = _WriteBehind(sink, capacity=2, flush_size=10, flush_interval=60,
+                          spill=_SpillQueue(str(tmpdir)))
+        wb.put(_request(2, db="a"))
+        # spilled as the buffer is full, the buffered request isn't due yet
+        wb.put(_request(2, db="b"))
+        t_end = time.time() + 5
+        while (len(wb.spill) or len(wb)) and time.time() < t_end:
+            time.sleep(.05)
+        wb.close()
+        # the buffered request is published before the spilled one
+        assert sink.calls == [(2, {"db": "a"}), (2, {"db": "b"})]
+
+    def test_failed_flush_spilled_order(self, tmpdir):
+        sink = _Sink(failures=1, delay=.2)
+        wb = _WriteBehind(sink, capacity=2, flush_size=2, flush_interval=0, retries=0,
+                          spill=_SpillQueue(str(tmpdir)))
+        wb.put(_request(2, db="a"))
+        time.sleep(.05)
+        # buffered while the first request is being flushed
+        wb.put(_request(2, db="b"))
+        # spilled as the buffer is full
+        wb.put(_request(2, db="c"))
+        assert len(wb.spill) == 1
+        t_end = time.time() + 5
+        while (len(wb.spill) or len(wb)) and time.time() < t_end:
+            time.sleep(.05)
+        wb.close()
+        # the failed flush and the buffered request are replayed before the
+        # newer spilled request
+        assert sink.calls == [(2, {"db": "a"}), (2, {"db": "b"}), (2, {"db": "c"})]
+
+    def test_backlog(self, tmpdir):
+        sink = _Sink(delay=.2)
+        wb = _WriteBehind(sink, capacity=2, flush_size=2, flush_interval=0,
+                          spill=_SpillQueue(str(tmpdir)))
+        start = time.time()
+        for _ in range(5):
+            wb.put(_request(2))
+        # requests don't wait for room in the buffer
+        assert time.time() - start < .2
+        t_end = time.time() + 5
+        while (len(wb.spill) or len(wb)) and time.time() < t_end:
+            time.sleep(.05)
+        wb.close()
+        assert sum(n for n, _ in sink.calls) == 10
+
+    def test_close_timeout(self, tmpdir):
+        sink = _Sink(delay=.3)
+        wb = _WriteBehind(sink, flush_size=2, flush_interval=0,
+                          spill=_SpillQueue(str(tmpdir)))
+        for _ in range(3):
+            wb.put(_request(2))
+        time.sleep(.1)
+        wb.close(.05)
+        # the requests left in the buffer are spilled for the next run
+        assert wb.dropped == 0
+        assert len(_SpillQueue(str(tmpdir))) == 2
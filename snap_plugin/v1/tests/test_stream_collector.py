@@ -17,16 +17,20 @@
 
 import json
 import sys
+import threading
 import time
 
 import grpc
 
 import snap_plugin.v1 as snap
+from snap_plugin.v1 import OverflowPolicy
 from snap_plugin.v1.collect_arg import CollectArg
+from snap_plugin.v1.metrics_buffer import _MetricsBuffer
 from snap_plugin.v1.plugin_pb2 import StreamCollectorStub, Empty
+from snap_plugin.v1.stream_collector_proxy import _StreamProducer
 from snap_plugin.v1.tests import ThreadPrinter
 
-from .mock_plugins import MockStreamCollector
+from .mock_plugins import MockGeneratorStreamCollector, MockStreamCollector
 
 
 def test_monitor():
@@ -70,6 +74,112 @@ def test_stream():
     col.stop()
 
 
+def test_stream_generator():
+    sys.stdout = ThreadPrinter()
+    sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
+    col = MockGeneratorStreamCollector("MyStreamCollector", 99)
+    col.start()
+    t_end = time.time() + 5
+    # wait for our collector to print its preamble
+    while len(sys.stdout.lines) == 0 and time.time() < t_end:
+        time.sleep(.1)
+    resp = json.loads(sys.stdout.lines[0])
+    client = StreamCollectorStub(
+        grpc.insecure_channel(resp["ListenAddress"]))
+    metric = snap.Metric(
+        namespace=[snap.NamespaceElement(value="intel"),
+                   snap.NamespaceElement(value="streaming"),
+                   snap.NamespaceElement(value="random"),
+                   snap.NamespaceElement(value="int")],
+        version=1)
+    metrics = client.StreamMetrics(iter([CollectArg(metric).pb]))
+    # yielded metrics are streamed as they become available
+    start = time.time()
+    for i in range(1, 4):
+        assert next(metrics).Metrics_Reply.metrics[0].int64_data == i
+    assert time.time() - start < 1
+    metrics.cancel()
+    # the generator is closed once the stream is stopped
+    assert col.closed.wait(2)
+    col.stop()
+
+
+def test_stream_fan_out():
+    col = MockGeneratorStreamCollector("MyStreamCollector", 99)
+    first = _stream(col, 0)
+    assert next(first).Metrics_Reply.metrics[0].int64_data == 1
+    # a second stream of the same metrics shares the running producer
+    second = _subscribe(col, 0)
+    data = next(second).Metrics_Reply.metrics[0].int64_data
+    assert data > 1
+    assert next(first).Metrics_Reply.metrics[0].int64_data <= data
+    assert len(col.proxy._producers) == 1
+    first.cancel()
+    assert next(second).Metrics_Reply.metrics[0].int64_data == data + 1
+    assert not col.closed.is_set()
+    # the producer stops with its last stream
+    second.cancel()
+    assert col.closed.wait(2)
+    assert len(col.proxy._producers) == 0
+    col.stop()
+
+
+def test_producer_overflow():
+    producer = _StreamProducer(())
+    slow = _MetricsBuffer(1, OverflowPolicy.block)
+    fast = _MetricsBuffer(1, OverflowPolicy.block)
+    dropping = _MetricsBuffer(1, OverflowPolicy.drop_newest)
+    for metrics_queue in (slow, fast, dropping):
+        producer.subscribe(metrics_queue)
+    producer.put(1)
+    assert fast.get(timeout=0) == 1
+    # the producer waits for room in every buffer with the block policy
+    putter = threading.Thread(target=producer.put, args=(2,))
+    putter.start()
+    time.sleep(.1)
+    assert putter.is_alive()
+    assert slow.get(timeout=0) == 1
+    putter.join(1)
+    assert not putter.is_alive()
+    assert (slow.get(timeout=0), fast.get(timeout=0)) == (2, 2)
+    assert (slow.dropped, fast.dropped, dropping.dropped) == (0, 0, 1)
+    # a removed subscriber doesn't hold the producer back
+    producer.put(3)
+    putter = threading.Thread(target=producer.put, args=(4,))
+    putter.start()
+    assert fast.get(timeout=1) == 3
+    time.sleep(.1)
+    assert putter.is_alive()
+    slow.close()
+    producer.unsubscribe(slow)
+    putter.join(1)
+    assert not putter.is_alive()
+    assert fast.get(timeout=0) == 4
+
+
+class _ActiveContext(object):
+    def is_active(self):
+        return True
+
+
+def test_stream_dropped_metrics():
+    col = MockStreamCollector("MyStreamCollector", 99)
+    col.meta.stream_overflow_policy = OverflowPolicy.drop_newest
+    metric = snap.Metric(namespace=("intel", "streaming", "random", "int"),
+                         config={"stream_delay": 0})
+    col_arg = CollectArg(metric).pb
+    col_arg.MaxMetricsBuffer = 2
+    stream = col.proxy.StreamMetrics(iter([col_arg]), _ActiveContext())
+    assert len(next(stream).Metrics_Reply.metrics) == 2
+    # the metrics streamed while the stream isn't read overflow its buffer
+    time.sleep(.2)
+    stream.close()
+    assert col.dropped_metrics > 0
+    dropped = col.dropped_metrics
+    time.sleep(.1)
+    assert col.dropped_metrics == dropped
+
+
 def test_stream_max_metrics_buffer():
     sys.stdout = ThreadPrinter()
     sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
@@ -102,6 +212,61 @@ def test_stream_max_metrics_buffer():
     col.stop()
 
 
+def _stream(col, max_metrics_buffer):
+    sys.stdout = ThreadPrinter()
+    sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
+    col.start()
+    t_end = time.time() + 5
+    # wait for our collector to print its preamble
+    while len(sys.stdout.lines) == 0 and time.time() < t_end:
+        time.sleep(.1)
+    return _subscribe(col, max_metrics_buffer)
+
+
+def _subscribe(col, max_metrics_buffer):
+    resp = json.loads(sys.stdout.lines[0])
+    client = StreamCollectorStub(
+        grpc.insecure_channel(resp["ListenAddress"]))
+    metric = snap.Metric(
+        namespace=[snap.NamespaceElement(value="intel"),
+                   snap.NamespaceElement(value="streaming"),
+                   snap.NamespaceElement(value="random"),
+                   snap.NamespaceElement(value="int")],
+        version=1)
+    col_arg = CollectArg(metric).pb
+    col_arg.MaxMetricsBuffer = max_metrics_buffer
+    return client.StreamMetrics(iter([col_arg]))
+
+
+def test_stream_max_latency():
+    col = MockStreamCollector("MyStreamCollector", 99)
+    col.meta.stream_max_latency = 1.2
+    metrics = _stream(col, 100)
+    # a trickle of one metric per second is sent 1.2s after the first one
+    # arrived instead of waiting for the buffer to fill
+    start_waiting_for_new_metric = time.time()
+    a = next(metrics)
+    retrieve_metric_time = time.time()
+    assert round(retrieve_metric_time - start_waiting_for_new_metric) == 2
+    assert len(a.Metrics_Reply.metrics) == 2
+    assert col.flush_latency.count == 1
+    assert 1.1 < col.flush_latency.sum < 1.3
+    col.stop()
+
+
+def test_stream_max_bytes():
+    col = MockStreamCollector("MyStreamCollector", 99)
+    col.meta.stream_max_bytes = 1
+    metrics = _stream(col, 100)
+    # every metric exceeds the byte-size threshold
+    start_waiting_for_new_metric = time.time()
+    a = next(metrics)
+    retrieve_metric_time = time.time()
+    assert round(retrieve_metric_time - start_waiting_for_new_metric) == 1
+    assert len(a.Metrics_Reply.metrics) == 1
+    col.stop()
+
+
 def test_stream_max_collect_duration():
     sys.stdout = ThreadPrinter()
     sys.argv = ["", '{"LogLevel": 1, "PingTimeoutDuration": 5000}']
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from snap_plugin.v1 import Metric
+from snap_plugin.v1.plugin_pb2 import Metric as PbMetric
+from snap_plugin.v1.string_table import _StringTable
+
+
+class TestStringTable(object):
+
+    def test_intern(self):
+        table = _StringTable()
+        value = table.intern("".join(["intel", "procfs"]))
+        assert table.intern("".join(["intel", "procfs"])) is value
+        assert table.key(["intel", "procfs"]) is table.key(("intel", "procfs"))
+        assert table.items_key({"b": "2", "a": "1"}) == (("a", "1"), ("b", "2"))
+
+    def test_max_size(self):
+        table = _StringTable(max_size=2)
+        table.intern("a")
+        table.intern("b")
+        table.intern("c")
+        assert len(table) == 1
+
+    def test_namespace_key(self):
+        pbs = []
+        for _ in range(2):
+            pb = PbMetric()
+            pb.Namespace.add(Value="intel")
+            pb.Namespace.add(Value="procfs")
+            pb.Tags["host"] = "node1"
+            pbs.append(pb)
+        # keys of metrics received by different requests are shared
+        m1, m2 = (Metric(pb=pb) for pb in pbs)
+        assert m1.namespace_key == ("intel", "procfs")
+        assert m1.namespace_key is m2.namespace_key
+        assert m1.namespace_key[0] is m2.namespace_key[0]
+        assert m1.tags_key is m2.tags_key
+        assert m1.tags_key == (("host", "node1"),)
+
+    def test_namespace_key_reset(self):
+        m = Metric(namespace=("intel", "procfs"))
+        assert m.namespace_key == ("intel", "procfs")
+        m.namespace.add_static_element("cpu")
+        assert m.namespace_key == ("intel", "procfs", "cpu")
+        m.namespace.pop()
+        assert m.namespace_key == ("intel", "procfs")
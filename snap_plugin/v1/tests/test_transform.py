@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.plugin_pb2 import MetricsReply, NamespaceElement, PubProcArg
+from snap_plugin.v1.pub_proc_arg import _ProcessArg
+
+from .mock_plugins import MockProcessor
+
+
+def _request(*namespaces):
+    return _ProcessArg(
+        metrics=[snap.Metric(namespace=ns, tags={"old": "x", "keep": "y"})
+                 for ns in namespaces],
+        config=snap.ConfigMap(foo="bar")).pb
+
+
+def _values(metric):
+    return tuple(e.Value for e in metric.Namespace)
+
+
+class TagProcessor(MockProcessor):
+
+    def get_transform(self, config):
+        return snap.Transform(add_tags={"foo": config["foo"]},
+                              remove_tags=["old"],
+                              include=[("acme", "*", "load")],
+                              rename={("acme",): ("intel", "acme"),
+                                      ("acme", "a"): ("x",)})
+
+
+def test_transform():
+    request = _request(("acme", "a", "load"), ("acme", "b", "cpu"),
+                       ("other", "a", "load"), ("acme", "b", "load", "1"))
+    metrics = snap.Transform(add_tags={"new": "z"},
+                   remove_tags=["old", "missing"],
+                   include=[("acme", "*", "load")],
+                   rename={("acme",): ("intel", "acme"),
+                           ("acme", "a"): ("x",)})._apply(request.Metrics)
+    assert [_values(m) for m in metrics] == [
+        ("x", "load"), ("intel", "acme", "b", "load", "1")]
+    for metric in metrics:
+        assert dict(metric.Tags) == {"keep": "y", "new": "z"}
+
+
+def _dynamic_request():
+    metric = snap.Metric(namespace=("acme",))
+    metric.namespace.add_dynamic_element("host", "host name")
+    metric.namespace.add_static_element("load")
+    return _ProcessArg(metrics=[metric]).pb
+
+
+def _elements(metric):
+    return [(e.Value, e.Name, e.Description) for e in metric.Namespace]
+
+
+def test_rename_same_length():
+    request = _dynamic_request()
+    request.Metrics[0].Namespace[1].Value = "h1"
+    metrics = snap.Transform(rename={("acme", "h1"): ("intel", "h2")})._apply(request.Metrics)
+    assert _elements(metrics[0]) == [("intel", "", ""), ("h2", "", ""), ("load", "", "")]
+    # the dynamic element following the prefix keeps its name
+    metrics = snap.Transform(rename={("intel",): ("acme",)})._apply(
+        _dynamic_request().Metrics)
+    assert _elements(metrics[0])[1] == ("*", "host", "host name")
+
+
+def test_rename_other_length():
+    request = _dynamic_request()
+    request.Metrics[0].Namespace[1].Value = "h1"
+    metrics = snap.Transform(rename={("acme", "h1"): ("intel",)})._apply(request.Metrics)
+    assert _elements(metrics[0]) == [("intel", "", ""), ("load", "", "")]
+    metrics = snap.Transform(rename={("acme",): ("intel", "acme")})._apply(
+        _dynamic_request().Metrics)
+    assert _elements(metrics[0]) == [("intel", "", ""), ("acme", "", ""),
+                                     ("*", "host", "host name"), ("load", "", "")]
+
+
+def test_include_large_batch():
+    count = 20000
+    request = PubProcArg()
+    for i in range(count):
+        request.Metrics.add().Namespace.extend(
+            NamespaceElement(Value=v) for v in ("acme", str(i), "load" if i % 2 else "cpu"))
+    start = time.time()
+    metrics = snap.Transform(include=[("acme", "*", "load")])._apply(request.Metrics)
+    assert time.time() - start < 5
+    assert len(metrics) == count // 2
+    assert [m.Namespace[1].Value for m in metrics[:3]] == ["1", "3", "5"]
+    # interleaved kept and dropped metrics are filtered in a single pass
+    # instead of deleting the dropped ones from the repeated field
+    assert len(request.Metrics) == count
+
+
+def test_process_reply():
+    proc = TagProcessor("MyProcessor", 1)
+    reply = proc.proxy.Process(_request(("acme", "a", "load"), ("acme", "b", "cpu")), None)
+    assert isinstance(reply, MetricsReply)
+    assert reply.error == ""
+    assert [_values(m) for m in reply.metrics] == [("x", "load")]
+    assert dict(reply.metrics[0].Tags) == {"keep": "y", "foo": "bar"}
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import snap_plugin.v1 as snap
+from snap_plugin.v1.pub_proc_arg import _PublishArg
+from snap_plugin.v1.write_behind import _WriteBehind
+
+
+def _request(count, **config):
+    return _PublishArg(metrics=[snap.Metric(namespace=("acme", str(i))) for i in range(count)],
+                       config=snap.ConfigMap(**config)).pb
+
+
+class _Sink(object):
+
+    def __init__(self, failures=0, delay=0):
+        self.calls = []
+        self.failures = failures
+        self.delay = delay
+        self.active = 0
+        self.overlapped = False
+
+    def __call__(self, metrics, config):
+        self.active += 1
+        self.overlapped = self.overlapped or self.active > 1
+        time.sleep(self.delay)
+        self.active -= 1
+        if self.failures:
+            self.failures -= 1
+            raise IOError("sink is down")
+        self.calls.append((len(metrics), dict(config.StringMap)))
+
+
+class TestWriteBehind(object):
+
+    def test_coalesce(self):
+        sink = _Sink()
+        wb = _WriteBehind(sink, flush_size=10, flush_interval=.2)
+        for _ in range(3):
+            wb.put(_request(2, db="a"))
+        wb.put(_request(1, db="b"))
+        wb.put(_request(1, db="a"))
+        time.sleep(.5)
+        # consecutive requests sharing a config are published together
+        assert sink.calls == [(6, {"db": "a"}), (1, {"db": "b"}), (1, {"db": "a"})]
+        assert len(wb) == 0
+        wb.close()
+
+    def test_flush_size(self):
+        sink = _Sink()
+        wb = _WriteBehind(sink, flush_size=4, flush_interval=60)
+        for _ in range(5):
+            wb.put(_request(2))
+        time.sleep(.2)
+        assert sink.calls == [(4, {}), (4, {})]
+        # closing flushes what is left
+        wb.close()
+        assert sink.calls[-1] == (2, {})
+
+    def test_retry(self):
+        sink = _Sink(failures=2)
+        wb = _WriteBehind(sink, flush_interval=0, retries=2, backoff=.05)
+        wb.put(_request(3))
+        wb.close()
+        assert sink.calls == [(3, {})]
+        assert wb.dropped == 0
+
+        sink = _Sink(failures=5)
+        wb = _WriteBehind(sink, flush_interval=0, retries=1, backoff=.05)
+        wb.put(_request(3))
+        time.sleep(.3)
+        # the dropped metrics are counted, not reported to the next request
+        assert wb.dropped == 3
+        wb.put(_request(1))
+        wb.close()
+        assert wb.dropped == 4
+
+    def test_close_timeout(self):
+        sink = _Sink(delay=.3)
+        wb = _WriteBehind(sink, flush_size=2, flush_interval=0)
+        for _ in range(3):
+            wb.put(_request(2))
+        time.sleep(.1)
+        wb.close(.05)
+        # the requests left in the buffer are dropped and counted
+        assert len(wb) == 0
+        assert wb.dropped == 4
+
+    def test_capacity(self):
+        sink = _Sink(delay=.1)
+        wb = _WriteBehind(sink, capacity=4, flush_size=4, flush_interval=0)
+        threads = [threading.Thread(target=wb.put, args=(_request(2),)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+            assert len(wb) <= 4
+        wb.close()
+        assert sum(n for n, _ in sink.calls) == 12
+        # the sink is never called concurrently
+        assert not sink.overlapped
+
+
+def test_publish_write_behind():
+    published = []
+
+    class Publisher(snap.Publisher):
+        def publish(self, metrics, config):
+            published.append(len(metrics))
+
+        def get_config_policy(self):
+            return snap.ConfigPolicy()
+
+    pub = Publisher("wb", 1, write_behind=True, write_behind_flush_interval=.1)
+    for _ in range(3):
+        assert pub.proxy.Publish(_request(2), None).error == ""
+    pub.proxy.close()
+    assert published == [6]
+
+
+def test_publish_write_behind_dropped():
+    class Publisher(snap.Publisher):
+        def publish(self, metrics, config):
+            raise IOError("sink is down")
+
+        def get_config_policy(self):
+            return snap.ConfigPolicy()
+
+    pub = Publisher("wb", 1, write_behind=True, write_behind_flush_interval=0,
+                    write_behind_retries=0)
+    assert pub.proxy.Publish(_request(2), None).error == ""
+    time.sleep(.2)
+    # a request following dropped metrics isn't failed
+    assert pub.proxy.Publish(_request(1), None).error == ""
+    pub.proxy.close()
+    assert pub.proxy.write_behind.dropped == 3
@@ -19,28 +19,60 @@ import time
 
 from snap_plugin.v1.plugin_pb2 import Time as PbTime
 
+_NS = 10 ** 9
+
+try:
+    _time_ns = time.time_ns
+except AttributeError:
+    # python < 3.7
+    def _time_ns():
+        return int(time.time() * _NS)
+
+
+def _set_time(pb, time):
+    """Sets a Time (pb) to a time in seconds since Epoch"""
+    pb.sec = int(time)
+    pb.nsec = int((time - pb.sec) * _NS)
+
+
+def _set_time_ns(pb, time_ns):
+    """Sets a Time (pb) to a time in nanoseconds since Epoch"""
+    pb.sec, pb.nsec = divmod(time_ns, _NS)
+
 
 class Timestamp(object):
-    """Represents time in seconds since Epoch
+    """Represents time since Epoch
 
     Args:
-        time (:obj:`float`): time in seconds since Epoch
+        time (:obj:`float`): time in seconds since Epoch, defaults to now
+        pb (:obj:`plugin_pb2.Time`): wrapped time, the timestamp writes the
+            time it is created with to it
 
     Note:
         In most cases you shouldn't need to instantiate this class directly as
         the getter and setter on Metric automatically convert a `time.time()`
         into a :py:class:`~snap_plugin.v1.timestamp.Timestamp`.
     """
-    def __init__(self, time=time.time(), pb=PbTime):
-        self._pb = pb
-        self._time = time
-        self._pb.sec = int(self._time)
-        self._pb.nsec = int((self._time - self._pb.sec) * 10 ** 9)
+    __slots__ = ("_pb", "_time")
+
+    def __init__(self, time=None, pb=None):
+        self._pb = PbTime() if pb is None else pb
+        if time is None:
+            self.set_ns(_time_ns())
+        else:
+            self.set(time)
+
+    @classmethod
+    def _from_pb(cls, pb):
+        """Returns a Timestamp wrapping a Time (pb) without changing it"""
+        timestamp = cls.__new__(cls)
+        timestamp._pb = pb
+        timestamp._time = None
+        return timestamp
 
     def __getattr__(self, attr):
-        if attr in self.__dict__:
-            # this object has it
-            return getattr(self, attr)
+        if attr in Timestamp.__slots__:
+            raise AttributeError(attr)
         # proxy to the wrapped object
         return getattr(self._pb, attr)
 
@@ -51,7 +83,21 @@ class Timestamp(object):
         Returns:
             :obj:`float`
         """
-        return self._time
+        pb = self._pb
+        # the time set is only read back while the pb holds it, the pb may
+        # have been written directly since (e.g. by MetricBatch.stamp)
+        if self._time is not None and self._time[1:] == (pb.sec, pb.nsec):
+            return self._time[0]
+        return pb.sec + pb.nsec / 1e9
+
+    @property
+    def time_ns(self):
+        """Gets time in nanoseconds since Epoch
+
+        Returns:
+            :obj:`int`
+        """
+        return self._pb.sec * _NS + self._pb.nsec
 
     def set(self, time):
         """Sets time in seconds since Epoch
@@ -62,6 +108,19 @@ class Timestamp(object):
         Returns:
             None
         """
-        self._time = time
-        self._pb.sec = int(self._time)
-        self._pb.nsec = int((self._time - self._pb.sec) * 10 ** 9)
+        # the float is kept with the pb's fields so it is read back unchanged
+        _set_time(self._pb, time)
+        self._time = (time, self._pb.sec, self._pb.nsec)
+
+    def set_ns(self, time_ns):
+        """Sets time in nanoseconds since Epoch without loss of precision
+
+        Args:
+            time_ns (:obj:`int`): time in nanoseconds since Epoch (see
+                time.time_ns())
+
+        Returns:
+            None
+        """
+        self._time = None
+        _set_time_ns(self._pb, time_ns)
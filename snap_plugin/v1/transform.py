@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Declarative transforms of the metrics of a processor request.
+
+A processor whose processing is limited to filtering metrics by namespace,
+renaming namespaces and adding or removing tags can return a
+:py:class:`Transform` from
+:py:meth:`~snap_plugin.v1.processor.Processor.get_transform`.  The transform
+is applied to the request's metrics (pb) in place and the metrics kept are
+replied, without wrapping them in :py:class:`~snap_plugin.v1.metric.Metric`.
+"""
+
+from .namespace_index import NamespaceIndex
+from .plugin_pb2 import NamespaceElement
+from .string_table import _namespace_key
+
+
+class Transform(object):
+    """Bulk transform of the metrics processed by a processor.
+
+    The steps of the transform are applied in the following order:
+
+        - include: only the metrics whose namespace starts with one of the
+          prefixes are kept, the elements of a prefix being static or '*'
+        - rename: the longest prefix of a namespace found in the mapping is
+          replaced by the new prefix
+        - remove_tags: the tags are removed from the metrics
+        - add_tags: the tags are added to the metrics, replacing existing
+          values
+
+    Args:
+        add_tags (:obj:`dict`): tags added to the metrics
+        remove_tags (:obj:`list` of :obj:`str`): tags removed from the metrics
+        include (:obj:`list` of :obj:`tuple`): namespace prefixes of the
+            metrics kept, None keeps all the metrics
+        rename (:obj:`dict`): new namespace prefix (:obj:`tuple` of
+            :obj:`str`) by namespace prefix (:obj:`tuple` of :obj:`str`)
+
+    Example:
+    ::
+        def get_transform(self, config):
+            return snap.Transform(
+                add_tags={"instance-id": config["instance-id"]},
+                include=[("intel", "procfs")])
+
+    """
+
+    def __init__(self, add_tags=None, remove_tags=(), include=None, rename=None):
+        self.add_tags = dict(add_tags or {})
+        self.remove_tags = tuple(remove_tags)
+        self._include = None
+        self._rename = None
+        if include is not None:
+            self._include = NamespaceIndex()
+            for prefix in include:
+                self._include.add(tuple(prefix) + ("**",), True)
+        if rename:
+            self._rename = NamespaceIndex()
+            for prefix, new_prefix in rename.items():
+                self._rename.add(tuple(prefix) + ("**",),
+                                 (len(prefix), tuple(new_prefix)))
+
+    def _apply(self, metrics):
+        """Applies the transform to metrics (repeated Metric pb) in place and
+        returns the list of the metrics kept"""
+        if self._include is not None:
+            # a single pass, deleting from the repeated field is linear
+            match = self._include.match
+            metrics = [m for m in metrics if match(_namespace_key(m.Namespace))]
+        for metric in metrics:
+            if self._rename is not None:
+                found = self._rename.lookup(_namespace_key(metric.Namespace))
+                if found is not None:
+                    _rename(metric.Namespace, *found)
+            for tag in self.remove_tags:
+                if tag in metric.Tags:
+                    del metric.Tags[tag]
+            if self.add_tags:
+                metric.Tags.update(self.add_tags)
+        return list(metrics)
+
+
+def _rename(namespace, length, new_prefix):
+    """Replaces the first elements (length) of a namespace (pb) by new_prefix.
+
+    The elements of new_prefix are static, the elements following the prefix
+    keep their name and description.
+    """
+    if length == len(new_prefix):
+        for element, value in zip(namespace, new_prefix):
+            element.Clear()
+            element.Value = value
+        return
+    rest = [NamespaceElement(Value=e.Value, Name=e.Name, Description=e.Description)
+            for e in namespace[length:]]
+    del namespace[:]
+    namespace.extend([NamespaceElement(Value=value) for value in new_prefix] + rest)
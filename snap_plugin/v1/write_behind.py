@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Write-behind buffer between the Publish calls and the publisher's sink.
+
+Publish requests are acknowledged once they are buffered and a single
+flusher thread publishes them in the background, coalescing consecutive
+requests sharing a config into larger calls of the plugin's `publish`.
+
+With a spill queue the requests arriving while the buffer is full and the
+metrics of failed flushes, followed by the requests buffered after them,
+are written to disk, as serialized PubProcArg, and replayed in order once
+the sink accepts metrics again.  A failed flush is spilled in front of the
+records spilled while it was in flight, which are newer.
+"""
+
+import collections
+import logging
+import threading
+import time
+import traceback
+
+from .config_map import _config_key
+from .plugin_pb2 import MetricsArg, PubProcArg
+
+LOG = logging.getLogger(__name__)
+
+# maximum number of seconds between two attempts to replay a spilled record
+_MAX_BACKOFF = 30
+
+
+class _WriteBehind(object):
+    """Buffers published metrics and flushes them from a background thread.
+
+    Args:
+        flush (:obj:`callable`): called with a repeated field of metrics and
+            a config map (pb) to publish them, only ever from the flusher
+            thread
+        capacity (:obj:`int`): maximum number of buffered metrics, `put`
+            blocks while the buffer is full unless the request is spilled
+        flush_size (:obj:`int`): number of buffered metrics triggering a flush
+        flush_interval (:obj:`float`): maximum number of seconds a request
+            waits in the buffer before it is flushed
+        retries (:obj:`int`): number of times a failed flush is retried
+        backoff (:obj:`float`): seconds before the first retry, doubled for
+            every other retry
+        spill (:py:class:`snap_plugin.v1.spill_queue._SpillQueue`): queue the
+            requests which don't fit in the buffer and the failed flushes
+            are spilled to, None blocks and drops them instead
+
+    """
+
+    def __init__(self, flush, capacity=10000, flush_size=1000, flush_interval=1.0,
+                 retries=3, backoff=.5, spill=None):
+        if capacity < 1:
+            raise ValueError("Buffer capacity should be at least 1 (given={})".format(capacity))
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.spill = spill
+        # number of metrics dropped by failed flushes or on close
+        self.dropped = 0
+        self._flush = flush
+        # buffered (time, config key, request) tuples
+        self._requests = collections.deque()
+        self._size = 0
+        self._closed = False
+        # serializes the writes to the spill queue with its closing, kept
+        # apart from the buffer's lock so puts don't wait for the disk
+        self._spill_lock = threading.Lock()
+        self._spill_closed = False
+        # time before which spilled records are not replayed
+        self._replay_at = 0
+        self._replay_backoff = backoff
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        return self._size
+
+    def put(self, request):
+        """Buffers a PublishArg (pb), spilling it or waiting while the buffer
+        is full.
+
+        The request is acknowledged once buffered, metrics dropped by a later
+        flush are logged and counted by :py:attr:`dropped`.
+        """
+        size = len(request.Metrics)
+        key = _config_key(request.Config)
+        spill = self.spill is not None
+        while True:
+            with self._cond:
+                # a request larger than the buffer is let in once it is empty
+                while True:
+                    if self._closed:
+                        raise RuntimeError("The publisher is stopping")
+                    # once requests are spilled the next ones follow them so
+                    # they are published in order
+                    if spill and (len(self.spill) or self._full(size)):
+                        break
+                    if not self._full(size):
+                        self._requests.append((time.time(), key, request))
+                        self._size += size
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait()
+            if self._spill(request.SerializeToString()):
+                with self._cond:
+                    self._cond.notify_all()
+                return
+            LOG.warning("Spill queue is full")
+            spill = False
+
+    def _full(self, size):
+        return self._size and self._size + size > self.capacity
+
+    def _spill(self, data):
+        """Appends a serialized PubProcArg to the spill queue.
+
+        Returns:
+            :obj:`bool`: False when there is no spill queue, it is full or
+            already closed
+        """
+        if self.spill is None:
+            return False
+        with self._spill_lock:
+            return not self._spill_closed and self.spill.put(data)
+
+    def _spill_failed(self, data):
+        """Spills the serialized PubProcArg of a failed flush and the buffered
+        requests in front of the spilled records, which are newer, so they
+        are replayed in order.
+
+        Puts spill behind them as the spill queue isn't empty anymore.  The
+        requests which don't fit in the spill queue stay in the buffer.
+
+        Returns:
+            :obj:`bool`: False when the failed flush wasn't spilled
+        """
+        if self.spill is None:
+            return False
+        with self._spill_lock:
+            if self._spill_closed:
+                return False
+            with self._cond:
+                requests = collections.deque(self._requests)
+                self._requests.clear()
+                self._size = 0
+            # the newest first as each is put in front of the previous ones
+            while requests and self.spill.put_front(requests[-1][2].SerializeToString()):
+                requests.pop()
+            spilled = self.spill.put_front(data)
+            with self._cond:
+                if requests:
+                    LOG.warning("Spill queue is full, {} buffered requests are published "
+                                "before the spilled ones".format(len(requests)))
+                    self._requests.extendleft(reversed(requests))
+                    self._size += sum(len(r.Metrics) for _, _, r in requests)
+                self._cond.notify_all()
+        return spilled
+
+    def close(self, timeout=None):
+        """Flushes the buffered requests and stops the flusher thread, the
+        spilled records are kept for the next run.
+
+        The requests still buffered when the timeout expires are spilled, or
+        dropped without a spill queue.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            requests = [r for _, _, r in self._requests]
+            self._requests.clear()
+            self._size = 0
+            self._cond.notify_all()
+        for request in requests:
+            if self._spill(request.SerializeToString()):
+                LOG.warning("Spilled {} metrics which were not published before closing".format(
+                    len(request.Metrics)))
+                continue
+            LOG.error("Dropping {} metrics which were not published before closing".format(
+                len(request.Metrics)))
+            with self._cond:
+                self.dropped += len(request.Metrics)
+        if self.spill is not None:
+            with self._spill_lock:
+                self._spill_closed = True
+                self.spill.close()
+
+    def _take(self):
+        """Waits for requests to flush and removes them from the buffer.
+
+        Returns:
+            :obj:`tuple`: the list of PublishArg (pb) sharing the same config
+            to flush, empty when the buffer is closed and empty, and whether
+            it is a spilled request being replayed, which stays in the spill
+            queue until it is published
+        """
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    wait = None
+                    replay = self.spill is not None and len(self.spill)
+                    if self._requests:
+                        wait = self._requests[0][0] + self.flush_interval - now
+                        # the buffered requests are flushed before the spilled
+                        # records are replayed, a request spilled while the
+                        # buffer was full is newer than them
+                        if self._closed or replay or self._size >= self.flush_size or wait <= 0:
+                            break
+                    elif self._closed:
+                        return [], False
+                    elif replay:
+                        if self._replay_at <= now:
+                            break
+                        wait = self._replay_at - now
+                    self._cond.wait(wait)
+                if self._requests:
+                    requests = []
+                    size = 0
+                    key = self._requests[0][1]
+                    while self._requests and self._requests[0][1] == key and (
+                            not requests or size + len(self._requests[0][2].Metrics) <= self.flush_size):
+                        request = self._requests.popleft()[2]
+                        requests.append(request)
+                        size += len(request.Metrics)
+                    self._size -= size
+                    self._cond.notify_all()
+                    return requests, False
+            # read outside the buffer's lock so puts don't wait for the disk
+            data = self._peek()
+            if data is not None:
+                return [PubProcArg.FromString(data)], True
+
+    def _peek(self):
+        """Returns the oldest spilled record, None when the spill queue is
+        empty or closed"""
+        with self._spill_lock:
+            if self._spill_closed or not len(self.spill):
+                return None
+            return self.spill.peek()
+
+    def _run(self):
+        while True:
+            requests, spilled = self._take()
+            if not requests:
+                return
+            if len(requests) == 1:
+                metrics = requests[0].Metrics
+            else:
+                metrics = MetricsArg().metrics
+                for request in requests:
+                    metrics.extend(request.Metrics)
+            if spilled:
+                self._replay(metrics, requests[0].Config)
+            else:
+                self._publish(metrics, requests[0].Config)
+
+    def _publish(self, metrics, config):
+        """Publishes metrics retrying failed attempts with an exponential
+        backoff, once the retries are exhausted the metrics are spilled or
+        dropped"""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self._flush(metrics, config)
+                return
+            except Exception as err:
+                error = err
+                LOG.debug(traceback.format_exc())
+                LOG.warning("Publishing {} metrics failed (attempt {}/{}): {}".format(
+                    len(metrics), attempt + 1, self.retries + 1, err))
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        if self._spill_failed(PubProcArg(Metrics=metrics, Config=config).SerializeToString()):
+            LOG.warning("Spilled {} metrics which could not be published".format(len(metrics)))
+            return
+        LOG.error("Dropping {} metrics which could not be published: {}".format(len(metrics), error))
+        with self._cond:
+            self.dropped += len(metrics)
+
+    def _replay(self, metrics, config):
+        """Publishes the oldest spilled record, removing it from the spill
+        queue on success and delaying the next attempt otherwise"""
+        try:
+            self._flush(metrics, config)
+        except Exception as err:
+            LOG.warning("Replaying {} spilled metrics failed, retrying in {}s: {}".format(
+                len(metrics), self._replay_backoff, err))
+            with self._cond:
+                self._replay_at = time.time() + self._replay_backoff
+                self._replay_backoff = min(self._replay_backoff * 2, _MAX_BACKOFF)
+            return
+        with self._spill_lock:
+            if not self._spill_closed:
+                self.spill.pop()
+        with self._cond:
+            self._replay_backoff = self.backoff
+            self._cond.notify_all()